@@ -1,27 +1,63 @@
-from flask import Flask, request, session, jsonify
+from flask import Flask, g, request, session, jsonify, has_request_context
 from flask_cors import CORS
 import psycopg2
-import bcrypt
 from dotenv import load_dotenv
+import logging
 import os
+import time
 from psycopg2.extras import RealDictCursor
-from helper.generate_token import generate_refresh_token, decode_token, generate_access_token
+from helper.generate_token import generate_refresh_token, generate_access_token, decode_token
+from helper.db_pool import get_pool, pool_stats
+from helper.audit_writer import get_audit_writer, audit_stats
+from helper.flight_search import (
+    SearchParamError, build_search_query, parse_passengers, parse_search_date, resolve_city_names
+)
+from helper.search_engine import get_search_engine, search_engine_stats
+from helper.search_cache import get_search_cache, search_cache_stats
+from helper.city_index import get_city_index, city_index_stats
+from helper.password_hashing import HasherBusy, password_hash, password_matches, hasher_stats
+from helper.auth_context import (
+    access_claims, bearer_claims, get_role_cache, role_cache_stats,
+)
+from helper.cache_backend import cache_backend_stats
+from helper.change_feed import RESET as CHANGE_FEED_RESET, change_feed_stats, get_change_feed, publish
+from helper.booking_listing import (
+    BookingListParamError, build_bookings_query, fetch_bookings_page, parse_booking_filters, parse_page_size,
+)
+from helper.booking_engine import (
+    BookingFailed, CascadeIncomplete, book_seats, cancel_and_refund_booking, cancel_flight_bookings,
+    parse_seat_count,
+)
+from helper.seat_inventory import SEATS_AVAILABLE_SQL, release_hold, set_seat_buckets
+from helper.seat_holds import create_hold, get_hold_sweeper, hold_sweeper_stats, hold_ttl
+from helper.idempotency import IdempotencyError, claim_key, store_response
+from helper.dashboard_stats import rebuild_dashboard_stats, read_dashboard_stats
+from helper.geo import route_cache_stats, route_estimate
+from helper.migrations import LATEST_VERSION, schema_version
+from helper.log import REQUEST_LOGGER, configure_logging, logging_stats
+from helper.metrics import render_metrics, request_finished, request_started
+from helper.flight_import import FlightImporter, ImportFormatError, detect_format, read_records
+from helper.streaming import stream_format, stream_query
+from helper.json_provider import make_json_provider
+from helper.rowset import fetch_rowset
+from helper.http_cache import cached_representation, get_response_cache, response_cache_stats
 
 
 import jwt
-from datetime import datetime, timedelta
-import requests
+from datetime import datetime, timedelta, timezone
 import json
 
 
 load_dotenv()
+configure_logging()
+log = logging.getLogger("app")
+request_log = logging.getLogger(REQUEST_LOGGER)
 
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "MY_SECRET_KEY")
-
-
-API_KEY = os.getenv("API_KEY")
+app.json = make_json_provider(app, os.getenv("JSON_PROVIDER", "fast").lower(),
+                              datetime_format=os.getenv("JSON_DATETIME_FORMAT", "http").lower())
 
 
 frontend_origins = [
@@ -36,8 +72,8 @@ CORS(
     app,
     supports_credentials=True,
     resources={r"/*": {"origins": frontend_origins}},
-    expose_headers=["Set-Cookie"],
-    allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["Set-Cookie", "Idempotent-Replayed"],
+    allow_headers=["Content-Type", "Authorization", "Idempotency-Key"],
     methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"]
 )
 
@@ -45,85 +81,187 @@ JWT_ALGORITHM = "HS256"
 JWT_EXP_DELTA_MINUTES = 60
 
 
-def ensure_admin_columns():
-    """Ensure admin-related columns exist in login_users table"""
+def log_audit(user_email, action, details, status="SUCCESS", resource_type=None, resource_id=None):
+    """Queue an audit event; the background writer batches it into audit_logs"""
     try:
-        db = database_connection()
-        cursor = db.cursor()
-        
-        # Add role column if it doesn't exist
-        cursor.execute("""
-            ALTER TABLE login_users 
-            ADD COLUMN IF NOT EXISTS role VARCHAR(20) DEFAULT 'user'
-        """)
-        
-        # Add permissions column if it doesn't exist
-        cursor.execute("""
-            ALTER TABLE login_users 
-            ADD COLUMN IF NOT EXISTS permissions JSONB DEFAULT '[]'::jsonb
-        """)
-        
-        # Add last_login column if it doesn't exist
-        cursor.execute("""
-            ALTER TABLE login_users 
-            ADD COLUMN IF NOT EXISTS last_login TIMESTAMP NULL
-        """)
-        
-        # Add status column if it doesn't exist
-        cursor.execute("""
-            ALTER TABLE login_users 
-            ADD COLUMN IF NOT EXISTS status VARCHAR(16) DEFAULT 'active'
-        """)
-        
-        # Add created_at column if it doesn't exist
-        cursor.execute("""
-            ALTER TABLE login_users 
-            ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW()
-        """)
-        
-        db.commit()
-        cursor.close()
-        db.close()
+        ip_address = request.remote_addr if has_request_context() else "SYSTEM"
+        get_audit_writer(database_connection).submit((
+            datetime.now(timezone.utc), user_email, action, details,
+            ip_address, status, resource_type, resource_id
+        ))
     except Exception as e:
-        print(f"Error ensuring admin columns: {e}")
-        try:
-            db.rollback()
-        except Exception:
-            pass
-        try:
-            cursor.close()
-        except Exception:
-            pass
-        try:
-            db.close()
-        except Exception:
-            pass
+        log.error("Error logging audit: %s", e)
+
+
+def invalidate_routes(routes):
+    """Drop cached searches for (departure_city_code, arrival_city_code, day) routes"""
+    cache = get_search_cache()
+    for departure, arrival, day in routes:
+        cache.invalidate(departure, arrival, day)
+
+
+def refresh_flights(flight_ids):
+    get_response_cache().invalidate("flights")
+    engine = get_search_engine(database_connection)
+    if engine is not None:
+        engine.refresh_flights(flight_ids)
+
+
+def reload_flights():
+    get_response_cache().invalidate("flights")
+    engine = get_search_engine(database_connection)
+    if engine is not None:
+        engine.reload_async()
+
+
+def flight_routes(flights):
+    """(departure_city_code, arrival_city_code, day) of each flight row"""
+    routes = []
+    for flight in flights:
+        departure = flight.get('departure_datetime')
+        day = departure.date() if hasattr(departure, 'date') else None
+        routes.append((flight.get('departure_city_code'), flight.get('arrival_city_code'), day))
+    return routes
+
+
+def route_ids(routes):
+    return ("|".join(str(part or '') for part in route) for route in routes)
+
+
+def flights_changed(*flights):
+    """Tell search structures in this and every other worker that these flight rows were written.
+
+    Each flight is a mapping with at least flight_id, departure_city_code,
+    arrival_city_code and departure_datetime.
+    """
+    try:
+        routes = flight_routes(flights)
+        flight_ids = [flight.get('flight_id') for flight in flights]
+        invalidate_routes(routes)
+        refresh_flights(flight_ids)
+        publish("route", *route_ids(routes))
+        publish("flight", *(flight_id for flight_id in flight_ids if flight_id is not None))
+    except Exception as e:
+        log.error("Error refreshing flight search caches: %s", e)
+
+
+def flights_bulk_changed(flights):
+    """flights_changed for bulk writes (imports).
+
+    Cached searches are dropped once per distinct route, or all at once past
+    BULK_ROUTE_INVALIDATION_LIMIT routes, and every worker reloads its
+    flight engine instead of refreshing the rows one by one.
+    """
+    try:
+        routes = set(flight_routes(flights))
+        if len(routes) > int(os.getenv('BULK_ROUTE_INVALIDATION_LIMIT', 1000)):
+            get_search_cache().clear()
+            publish("route", CHANGE_FEED_RESET)
+        else:
+            invalidate_routes(routes)
+            publish("route", *route_ids(routes))
+        reload_flights()
+        publish("flight", CHANGE_FEED_RESET)
+    except Exception as e:
+        log.error("Error refreshing flight search caches: %s", e)
+
+
+def users_changed(*emails):
+    """Drop cached roles of these login_users emails (all of them when none are given), in every worker"""
+    if emails:
+        get_role_cache().invalidate(*emails)
+        publish("user", *emails)
+    else:
+        get_role_cache().clear()
+        publish("user", CHANGE_FEED_RESET)
+
+
+def apply_route_changes(ids):
+    if CHANGE_FEED_RESET in ids:
+        get_search_cache().clear()
+        return
+    routes = []
+    for route in ids:
+        departure, arrival, day = route.split("|")
+        routes.append((departure or None, arrival or None, datetime.strptime(day, '%Y-%m-%d').date() if day else None))
+    invalidate_routes(routes)
+
+
+def apply_flight_changes(ids):
+    if CHANGE_FEED_RESET in ids:
+        reload_flights()
+    else:
+        refresh_flights(ids)
+
+
+def apply_user_changes(ids):
+    if CHANGE_FEED_RESET in ids:
+        get_role_cache().clear()
+    else:
+        get_role_cache().invalidate(*ids)
+
+
+def flush_caches():
+    """Forget everything cached from the database; used when change notifications may have been missed"""
+    get_search_cache().clear()
+    reload_flights()
+    get_role_cache().clear()
+
+
+def release_expired_seats(flight_id):
+    """Return a flight's expired holds in a committed transaction of their own (see take_seats)"""
+    sweeper = get_hold_sweeper(database_connection, on_release=flights_changed, release_connect=dedicated_connection)
+    return sweeper.release_flight(flight_id)
+
+
+def idempotent_replay(replay):
+    """Send back the stored response of an already executed Idempotency-Key"""
+    response = app.response_class(replay.body, status=replay.status_code, mimetype=app.json.mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim_idempotency_key(cursor, scope, endpoint, payload):
+    """Claim the request's Idempotency-Key, if any; see helper.idempotency.claim_key"""
+    key = request.headers.get('Idempotency-Key')
+    if key is None:
+        return None, None
+    return key, claim_key(cursor, scope, endpoint, key, payload)
+
 
-def ensure_audit_logs_table():
-    """Create audit_logs table if it doesn't exist"""
+def database_connection():
+    """Borrow a connection from the process-wide pool; close() returns it"""
+    try:
+        return get_pool().getconn()
+    except psycopg2.Error as e:
+        log.error("Database connection failed: %s", e, extra={
+            "db_host": os.getenv('DB_HOST'), "db_user": os.getenv('DB_USER'), "db_name": os.getenv('DB_NAME')
+        })
+        raise
+
+
+def dedicated_connection():
+    """Connection kept out of the pool (change feed LISTEN, hold releases during bookings)"""
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        dbname=os.getenv('DB_NAME'),
+        connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', 10)),
+    )
+
+
+def check_schema_version():
+    """Read the migrated schema version; DDL is applied by ``python -m helper.migrations``"""
     try:
         db = database_connection()
         cursor = db.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP DEFAULT NOW(),
-                user_email VARCHAR(255),
-                action VARCHAR(100),
-                details TEXT,
-                ip_address VARCHAR(45),
-                status VARCHAR(20),
-                resource_type VARCHAR(50),
-                resource_id VARCHAR(100)
-            );
-        """)
-        db.commit()
+        version = schema_version(cursor)
+        db.rollback()
     except Exception as e:
-        print(f"Error creating audit_logs table: {e}")
-        try:
-            db.rollback()
-        except Exception:
-            pass
+        log.warning("Could not read the database schema version: %s. "
+                    "The API will still run, but database-dependent features may not work", e)
+        return None
     finally:
         try:
             cursor.close()
@@ -133,50 +271,58 @@ def ensure_audit_logs_table():
             db.close()
         except Exception:
             pass
+    if version < LATEST_VERSION:
+        log.warning("Database schema is at version %s, this code expects %s. "
+                    "Run `python -m helper.migrations` from backend/", version, LATEST_VERSION)
+    return version
 
-def log_audit(user_email, action, details, status="SUCCESS", resource_type=None, resource_id=None):
-    """Helper function to log audit events"""
-    try:
-        ip_address = request.remote_addr if request else "SYSTEM"
-        db = database_connection()
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO audit_logs (user_email, action, details, ip_address, status, resource_type, resource_id)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (user_email, action, details, ip_address, status, resource_type, resource_id))
-        db.commit()
-        cursor.close()
-        db.close()
-    except Exception as e:
-        print(f"Error logging audit: {e}")
-
-
-def database_connection():
-    try:
-        return psycopg2.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            dbname=os.getenv('DB_NAME')
-        )
-    except psycopg2.Error as e:
-        print(f"Database connection failed: {e}")
-        print(f"Attempting to connect to: host={os.getenv('DB_HOST')}, user={os.getenv('DB_USER')}, db={os.getenv('DB_NAME')}")
-        raise
 
+SCHEMA_VERSION = check_schema_version()
 
 try:
-    ensure_admin_columns()
-    ensure_audit_logs_table()
-    print("Database tables initialized successfully")
+    get_city_index(database_connection).load()
 except Exception as e:
-    print(f"Warning: Could not initialize database tables: {e}")
-    print("The API will still run, but database-dependent features may not work")
+    log.warning("City index not loaded at startup, it will load on first search: %s", e)
+
+
+def start_background_jobs():
+    """Start this process's hold sweeper and change feed listener, once per pid"""
+    get_hold_sweeper(database_connection, on_release=flights_changed, release_connect=dedicated_connection)
+    get_change_feed(dedicated_connection, on_reset=flush_caches, subscriptions=(
+        ("route", apply_route_changes),
+        ("flight", apply_flight_changes),
+        ("user", apply_user_changes),
+    ))
+
+
+# Listen from boot, not from the first request, so an idle worker's caches
+# still hear about writes made through other workers
+start_background_jobs()
 
 @app.route('/', methods=['GET'])
 def root():
     return jsonify({"message": "Flight Booking System API", "status": "running"}), 200
 
+def runtime_stats():
+    """Per-worker statistics of the pools, caches and background writers"""
+    return {
+        "pool": pool_stats(),
+        "audit": audit_stats(),
+        "search_engine": search_engine_stats(),
+        "search_cache": search_cache_stats(),
+        "city_index": city_index_stats(),
+        "password_hashing": hasher_stats(),
+        "role_cache": role_cache_stats(),
+        "cache_backend": cache_backend_stats(),
+        "change_feed": change_feed_stats(),
+        "responses": response_cache_stats(),
+        "seat_holds": hold_sweeper_stats(),
+        "route_estimates": route_cache_stats(),
+        "schema": {"version": SCHEMA_VERSION, "expected": LATEST_VERSION},
+        "logging": logging_stats(),
+    }
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint to verify database connectivity"""
@@ -187,9 +333,9 @@ def health_check():
         cursor.fetchone()
         cursor.close()
         db.close()
-        return jsonify({"status": "healthy", "database": "connected"}), 200
+        return jsonify({"status": "healthy", "database": "connected", **runtime_stats()}), 200
     except Exception as e:
-        return jsonify({"status": "unhealthy", "database": "disconnected", "error": str(e)}), 500
+        return jsonify({"status": "unhealthy", "database": "disconnected", "error": str(e), **runtime_stats()}), 500
 
 
 
@@ -201,6 +347,27 @@ def get_cookie_settings():
     return secure_cookie, samesite_cookie, domain_cookie
 
 
+def is_superadmin(email):
+    """Role check on a short-lived connection, so routes can hash passwords without holding one"""
+    db = database_connection()
+    try:
+        cursor = db.cursor(cursor_factory=RealDictCursor)
+        try:
+            return get_role_cache().role_for(cursor, email) == 'superadmin'
+        finally:
+            cursor.close()
+    finally:
+        db.close()
+
+
+@app.errorhandler(HasherBusy)
+def hasher_busy_response(e):
+    """Shed load fast when the bcrypt pool is saturated"""
+    response = jsonify({"message": "Server is busy, please retry shortly", "status": "error"})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+
 @app.route('/signup', methods=['POST'])
 def signup():
     if not request.is_json:
@@ -219,7 +386,7 @@ def signup():
         return jsonify({"message": "Passwords do not match", "status": "error", "user": None}), 400
 
     try:
-        hashword = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        hashword = password_hash(password)
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
 
@@ -286,28 +453,35 @@ def login():
         cursor = db.cursor(cursor_factory=RealDictCursor)
         cursor.execute("SELECT hash_password,role,email,first_name,last_name FROM login_users WHERE email = %s", (email,))
         user = cursor.fetchone()
+        # The bcrypt check can queue for seconds; it must not hold a pool slot meanwhile
+        cursor.close()
+        db.close()
         
         if not user:
             log_audit(email, "LOGIN", "Login attempt - user not found", "FAILED", "AUTH", email)
             return jsonify({"message": "User not found"}), 404
 
-        hash_password = user['hash_password'].encode('utf-8') if isinstance(user['hash_password'], str) else user['hash_password']
-        
-        if not bcrypt.checkpw(password.encode('utf-8'), hash_password):
+        if not password_matches(password, user['hash_password']):
             log_audit(email, "LOGIN", "Login attempt - incorrect password", "FAILED", "AUTH", email)
             return jsonify({"message": "Incorrect password"}), 404
 
         role = user.get('role','user')
 
       
-        try:
-            cursor.execute("""
-                UPDATE login_users SET last_login = NOW()
-                WHERE email = %s AND role IN ('admin','superadmin')
-            """, (email,))
-            db.commit()
-        except Exception:
-            db.rollback()
+        if role in ('admin', 'superadmin'):
+            try:
+                db = database_connection()
+                cursor = db.cursor()
+                cursor.execute("UPDATE login_users SET last_login = NOW() WHERE email = %s", (email,))
+                db.commit()
+            except Exception:
+                if 'db' in locals():
+                    db.rollback()
+            finally:
+                if 'cursor' in locals():
+                    cursor.close()
+                if 'db' in locals():
+                    db.close()
         
         # Log successful login
         log_audit(email, "LOGIN", f"User logged in successfully - Role: {role}", "SUCCESS", "AUTH", email)
@@ -346,6 +520,8 @@ def login():
                             )
         return response
 
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         return jsonify({"message": "Database error", "error": str(e)}), 500
     finally:
@@ -422,6 +598,7 @@ def api_cancel_booking():
 
 
 @app.route('/api/packages', methods=['GET'])
+@cached_representation("packages")
 def api_get_packages():
     """API endpoint for travel packages"""
     try:
@@ -472,6 +649,7 @@ def api_get_packages():
 
 
 @app.route('/api/car-rentals', methods=['GET'])
+@cached_representation("car_rentals")
 def api_get_car_rentals():
     """API endpoint for car rentals"""
     try:
@@ -597,7 +775,7 @@ def me():
     if not access_token:
         return jsonify({"message": "No token", "user": None}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid token", "user": None}), 401
 
@@ -645,7 +823,7 @@ def create_flight():
     if not access_token:
         return jsonify({"message":"No Token"}),401
     
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
     
@@ -708,58 +886,15 @@ def create_flight():
         airline_id = airline["airline_id"]
 
         
-        if API_KEY and API_KEY != "YOUR_OPENROUTESERVICE_API_KEY_HERE":
-            
-            headers = {
-                'Authorization': API_KEY,
-                'Content-Type': 'application/json'
-            }
-
-            body = {
-                "coordinates": [
-                [departure_city["longitude"],departure_city["latitude"]],      
-                [arrival_city["longitude"],arrival_city["latitude"]]
-                ]
-            }
-            
-            try:
-                api_response = requests.post(
-                    'https://api.openrouteservice.org/v2/directions/driving-car',
-                    json=body,
-                    headers=headers,
-                    timeout=10
-                )
-
-                api_data = api_response.json()
-                
-                
-                if 'routes' not in api_data or not api_data['routes']:
-            
-                    if isinstance(api_data.get('error'), dict):
-                        error_msg = api_data['error'].get('message', 'Failed to calculate route')
-                    elif isinstance(api_data.get('error'), str):
-                        error_msg = api_data['error']
-                    else:
-                        error_msg = str(api_data)
-                    print(f"OpenRouteService API Error: {api_data}")
-                    
-                    flight_distance = 1000.0
-                    flight_duration = 2.0
-                else:
-                    distance_meters = api_data['routes'][0]['summary']['distance']
-                    duration_seconds = api_data['routes'][0]['summary']['duration']
-                    flight_distance = round(distance_meters/1000,2)
-                    flight_duration = round(duration_seconds/3600,2)
-            except Exception as e:
-                print(f"Error calling OpenRouteService API: {e}")
-                
-                flight_distance = 1000.0
-                flight_duration = 2.0
-        else:
-            
-            print("API_KEY not configured, using estimated distance/duration")
+        estimate = route_estimate(departure_city["longitude"], departure_city["latitude"],
+                                  arrival_city["longitude"], arrival_city["latitude"])
+        if estimate is None:
+            log.warning("City coordinates missing, using estimated distance/duration",
+                        extra={"flight_id": data["flight_id"]})
             flight_distance = 1000.0
             flight_duration = 2.0
+        else:
+            flight_distance, flight_duration = estimate
 
 
         cursor.execute("SELECT flight_id FROM flights WHERE flight_id = %s", (data["flight_id"],))
@@ -823,6 +958,7 @@ def create_flight():
             ))
         new_flight = cursor.fetchone()
         db.commit()
+        flights_changed(new_flight)
         
         # Log audit
         log_audit(
@@ -850,12 +986,99 @@ def create_flight():
 
 
 
+@app.route('/admin/flights/import', methods=['POST'])
+def import_flights():
+    """Bulk-create flights from a CSV or NDJSON upload - Admin only
+
+    The upload is either a multipart ``file`` field or the raw request body.
+    Invalid rows are reported by line and skipped; ``atomic=true`` imports
+    nothing unless every row is valid, ``dry_run=true`` only validates.
+    """
+    access_token = request.cookies.get('access_token')
+    if not access_token:
+        return jsonify({"message": "No Token"}), 401
+
+    decoded = access_claims()
+    if not decoded:
+        return jsonify({"message": "Invalid or expired token"}), 401
+
+    if decoded.get("role") not in ["admin", "superadmin"]:
+        return jsonify({"message": "Forbidden: Admins only"}), 403
+
+    upload = request.files.get('file')
+    filename = upload.filename if upload else request.args.get('filename')
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    atomic = request.args.get('atomic', '').lower() in ('1', 'true', 'yes')
+    try:
+        fmt = detect_format(request.args.get('format'), filename,
+                            upload.content_type if upload else request.content_type)
+        records = read_records(upload.stream if upload else request.stream, fmt)
+    except ImportFormatError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        db = database_connection()
+        cursor = db.cursor(cursor_factory=RealDictCursor)
+        importer = FlightImporter(cursor)
+        try:
+            importer.stage(records)
+        except ImportFormatError as e:
+            db.rollback()
+            return jsonify({"message": str(e), **importer.report(0)}), 400
+        except psycopg2.DataError as e:
+            db.rollback()
+            return jsonify({"message": importer.describe_copy_error(e), **importer.report(0)}), 422
+
+        if dry_run or (atomic and importer.rejected):
+            inserted = []
+            db.rollback()
+        else:
+            inserted = importer.merge()
+            db.commit()
+        report = importer.report(len(inserted))
+        if inserted:
+            flights_bulk_changed(inserted)
+
+        if not dry_run:
+            log_audit(
+                decoded.get('email'),
+                "IMPORT_FLIGHTS",
+                f"Imported {report['imported']} of {report['rows']} flights from {filename or fmt + ' upload'}"
+                f", {report['rejected']} rejected",
+                "SUCCESS" if inserted else "FAILED",
+                "FLIGHT",
+                None
+            )
+
+        if dry_run:
+            return jsonify({"message": "Upload validated", "dry_run": True, **report}), 200
+        if not inserted:
+            return jsonify({"message": "No flights imported", **report}), 422
+        return jsonify({"message": "Flights imported", **report}), 201
+
+    except Exception as e:
+        if 'db' in locals():
+            db.rollback()
+        log_audit(decoded.get('email'), "IMPORT_FLIGHTS", f"Failed to import flights: {str(e)}", "FAILED", "FLIGHT", None)
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'db' in locals(): db.close()
+
+
+@app.route('/api/admin/flights/import', methods=['POST'])
+def api_import_flights():
+    """API version of the bulk flight import endpoint"""
+    return import_flights()
+
+
 @app.route('/superadmin/create_admin',methods=['POST'])
 def create_1admin():
     access_token = request.cookies.get('access_token')
     if not access_token:
         return jsonify({"message":"Invalid or expired token "})
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
         
@@ -873,6 +1096,7 @@ def create_1admin():
         return jsonify({"message": "All fields are required"}), 400
 
     try:
+        hash_password = password_hash(password)
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
         
@@ -880,21 +1104,23 @@ def create_1admin():
         if cursor.fetchone():
             return jsonify({"message":"Account already exists"}),409
         
-        hash_password = bcrypt.hashpw(password.encode('UTF-8'),bcrypt.gensalt()).decode('UTF-8')
-        
         cursor.execute("""
             INSERT INTO login_users (first_name, last_name, email, hash_password, role)
             VALUES (%s, %s, %s, %s, %s)
         """, (firstname, lastname, email, hash_password, "admin"))
         db.commit()
+        users_changed(email)
         
         # Log audit
         log_audit(decoded.get('email'), "CREATE_ADMIN", f"Created admin account for {email}", "SUCCESS", "USER", email)
         
         return jsonify({"message": "Admin created successfully"}), 201
                 
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e :
-        db.rollback()
+        if 'db' in locals():
+            db.rollback()
         return jsonify({"error":  str((e))}),500
     finally:
         if 'cursor' in locals():
@@ -908,7 +1134,7 @@ def delete_admin():
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
 
@@ -939,6 +1165,7 @@ def delete_admin():
         
         cursor.execute("DELETE FROM login_users WHERE email = %s", (email,))
         db.commit()
+        users_changed(email)
 
         # Log audit
         log_audit(decoded.get('email'), "DELETE_ADMIN", f"Deleted admin account {email}", "SUCCESS", "USER", email)
@@ -962,7 +1189,7 @@ def delete_admin():
 def test_booking():
     """Test booking endpoint without authentication for debugging"""
     data = request.get_json()
-    print(f"TEST BOOKING - Received data: {data}")
+    log.debug("Test booking received", extra={"data": data})
     
     # Simple validation
     required_fields = ['flight_id', 'first_name', 'last_name', 'payment_method', 'payment_amount']
@@ -979,19 +1206,11 @@ def api_health():
 
 @app.route('/bookflight', methods=['POST'])
 def book_flight():
-    print(f"BOOKING REQUEST - Started booking request")
-    print(f"BOOKING REQUEST - Headers: {dict(request.headers)}")
-    print(f"BOOKING REQUEST - Cookies: {request.cookies}")
-    print(f"BOOKING REQUEST - Method: {request.method}")
-    print(f"BOOKING REQUEST - URL: {request.url}")
-    print(f"BOOKING REQUEST - Data: {request.get_data()}")
-    
     access_token = request.cookies.get('access_token')
     if not access_token:
-        print(f"BOOKING ERROR - No access token found")
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
 
@@ -1012,9 +1231,9 @@ def book_flight():
     meal_preference = data.get('meal_preference', 'Standard')
     payment_method = data.get('payment_method')
     payment_amount = data.get('payment_amount')
+    hold_token = data.get('hold_token')
 
-    # Log booking attempt for audit
-    print(f"BOOKING ATTEMPT - User: {user_email}, Flight: {flight_id}, Amount: {payment_amount}")
+    log.debug("Booking attempt", extra={"user": user_email, "flight_id": flight_id, "amount": payment_amount})
     
     missing_fields = []
     if not first_name: missing_fields.append("first_name")
@@ -1028,78 +1247,46 @@ def book_flight():
 
     user_name = f"{first_name} {last_name}"
 
+    try:
+        num_seats = None if hold_token else parse_seat_count(num_seats)
+    except BookingFailed as e:
+        return jsonify(e.to_dict()), e.http_status
+
     try:
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
 
-        
-        cursor.execute("SELECT flight_id, seats_available, departure_city_code, arrival_city_code, price FROM flights WHERE flight_id = %s", (flight_id,))
-        flight = cursor.fetchone()
-        if not flight:
-            return jsonify({"message": "Flight not found"}), 404
-
-
-    
-        cursor.execute("""
-            INSERT INTO bookings (user_name, user_email, flight_id, city_origin, city_destination, price, booking_date, status)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW(), %s)
-            RETURNING booking_id, *
-        """, (
-            user_name,
-            user_email or email,
-            flight_id,
-            flight["departure_city_code"],
-            flight["arrival_city_code"],
-            payment_amount,
-            "confirmed"
-        ))
-
-        booking = cursor.fetchone()
-        booking_id = booking['booking_id']
+        try:
+            idempotency_key, replay = claim_idempotency_key(cursor, user_email, 'bookflight', data)
+        except IdempotencyError as e:
+            db.rollback()
+            return jsonify({"message": e.message}), e.http_status
+        if replay is not None:
+            db.rollback()
+            return idempotent_replay(replay)
 
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS flight_payments (
-                payment_id SERIAL PRIMARY KEY,
-                booking_id INTEGER,
-                user_email VARCHAR(255),
-                amount DECIMAL(10, 2) NOT NULL,
-                payment_method VARCHAR(50) NOT NULL,
-                payment_status VARCHAR(20) DEFAULT 'pending',
-                payment_date TIMESTAMP DEFAULT NOW()
+        try:
+            booking, payment, flight = book_seats(
+                cursor, flight_id, num_seats, user_name, user_email or email,
+                payment_amount, payment_method, payer_email=user_email, hold_token=hold_token,
+                release_expired=release_expired_seats
             )
-        """)
-        
-
-        cursor.execute("""
-            INSERT INTO flight_payments (booking_id, user_email, amount, payment_method, payment_status, payment_date)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-            RETURNING payment_id, *
-        """, (
-            booking_id,
-            user_email,
-            payment_amount,
-            payment_method,
-            'completed'  
-        ))
-
-        payment = cursor.fetchone()
-        
-        
-        cursor.execute("""
-            UPDATE flights 
-            SET seats_available = seats_available - %s 
-            WHERE flight_id = %s AND seats_available >= %s
-        """, (num_seats, flight_id, num_seats))
-        
-        if cursor.rowcount == 0:
+        except BookingFailed as e:
             db.rollback()
-            return jsonify({"message": "Not enough seats available"}), 400
-            
-        db.commit()
+            log_audit(user_email, "CREATE_BOOKING", f"Booking refused for flight {flight_id}: {e.reason}", "FAILED", "BOOKING", flight_id)
+            return jsonify(e.to_dict()), e.http_status
 
+        booking_id = booking['booking_id']
+        body = app.json.dumps({
+            "message": "Flight booked successfully", 
+            "booking": booking,
+            "payment": payment
+        })
+        if idempotency_key is not None:
+            store_response(cursor, user_email, 'bookflight', idempotency_key, 201, body)
+        db.commit()
+        flights_changed(flight)
 
-        
         log_audit(
             user_email, 
             "CREATE_BOOKING", 
@@ -1109,17 +1296,10 @@ def book_flight():
             str(booking_id)
         )
 
-        return jsonify({
-            "message": "Flight booked successfully", 
-            "booking": booking,
-            "payment": payment
-        }), 201
+        return app.response_class(body, status=201, mimetype=app.json.mimetype)
 
     except Exception as e:
-        print(f"BOOKING ERROR - {str(e)}")
-        print(f"BOOKING ERROR - Error type: {type(e).__name__}")
-        import traceback
-        print(f"BOOKING ERROR - Traceback: {traceback.format_exc()}")
+        log.exception("Booking failed", extra={"user": user_email, "flight_id": flight_id})
         db.rollback()
         log_audit(user_email, "CREATE_BOOKING", f"Failed to book flight: {str(e)}", "FAILED", "BOOKING", flight_id)
         return jsonify({"message": "Booking failed", "error": str(e), "details": str(type(e).__name__)}), 500
@@ -1131,13 +1311,117 @@ def book_flight():
             db.close()
 
 
+@app.route('/holds', methods=['POST'])
+def create_seat_hold():
+    """Hold seats on a flight while the user pays; redeem with /bookflight hold_token"""
+    access_token = request.cookies.get('access_token')
+    if not access_token:
+        return jsonify({"message": "No Token"}), 401
+
+    decoded = access_claims()
+    if not decoded:
+        return jsonify({"message": "Invalid or expired token"}), 401
+
+    user_email = decoded.get('email')
+    if not user_email:
+        return jsonify({"message": "Invalid token data"}), 401
+
+    data = request.get_json() or {}
+    flight_id = data.get('flight_id')
+    if not flight_id:
+        return jsonify({"message": "Required fields missing: flight_id"}), 400
+
+    try:
+        num_seats = parse_seat_count(data.get('num_seats', 1))
+        ttl = hold_ttl(data.get('ttl'))
+    except BookingFailed as e:
+        return jsonify(e.to_dict()), e.http_status
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        db = database_connection()
+        cursor = db.cursor(cursor_factory=RealDictCursor)
+        try:
+            hold = create_hold(cursor, flight_id, num_seats, user_email, ttl,
+                               release_expired=release_expired_seats)
+        except BookingFailed as e:
+            db.rollback()
+            return jsonify(e.to_dict()), e.http_status
+        db.commit()
+        flights_changed(hold)
+
+        return jsonify({
+            "message": "Seats held",
+            "hold_token": hold['hold_token'],
+            "flight_id": hold['flight_id'],
+            "num_seats": hold['seats'],
+            "expires_at": hold['expires_at'],
+            "ttl": ttl
+        }), 201
+
+    except Exception as e:
+        if 'db' in locals():
+            db.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'db' in locals(): db.close()
+
+
+@app.route('/holds/<hold_token>', methods=['DELETE'])
+def release_seat_hold(hold_token):
+    """Give held seats back before the hold expires"""
+    access_token = request.cookies.get('access_token')
+    if not access_token:
+        return jsonify({"message": "No Token"}), 401
+
+    decoded = access_claims()
+    if not decoded:
+        return jsonify({"message": "Invalid or expired token"}), 401
+
+    try:
+        db = database_connection()
+        cursor = db.cursor(cursor_factory=RealDictCursor)
+        released = release_hold(cursor, hold_token, decoded.get('email'))
+        if released is None:
+            db.rollback()
+            return jsonify({"message": "Seat hold not found or already used"}), 404
+        db.commit()
+        flights_changed(released)
+        return jsonify({"message": "Seat hold released", "flight_id": released['flight_id'],
+                        "num_seats": released['seats']}), 200
+
+    except Exception as e:
+        if 'db' in locals():
+            db.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'db' in locals(): db.close()
+
+
+@app.route('/api/holds', methods=['POST'])
+def api_create_seat_hold():
+    """API version of create seat hold endpoint"""
+    return create_seat_hold()
+
+
+@app.route('/api/holds/<hold_token>', methods=['DELETE'])
+def api_release_seat_hold(hold_token):
+    """API version of release seat hold endpoint"""
+    return release_seat_hold(hold_token)
+
+
 @app.route('/mybookings', methods=['GET'])
 def my_bookings():
     access_token = request.cookies.get('access_token')
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
 
@@ -1178,7 +1462,7 @@ def all_bookings():
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -1187,29 +1471,18 @@ def all_bookings():
         return jsonify({"message": "Access denied"}), 403
 
     try:
-        db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute("""
-            SELECT b.booking_id, b.user_email, b.user_name, b.flight_id, 
-                   f.departure_city_code, f.arrival_city_code, f.departure_datetime, 
-                   f.airline, b.status, b.booking_date, b.price,
-                   fp.amount as payment_amount, fp.payment_method, fp.payment_status
-            FROM bookings b
-            JOIN flights f ON b.flight_id = f.flight_id
-            LEFT JOIN flight_payments fp ON b.booking_id = fp.booking_id
-            ORDER BY b.booking_date DESC
-        """)
-        bookings = cursor.fetchall()
-        
-        print(f"ADMIN BOOKINGS - Total bookings found: {len(bookings)}")
-        for booking in bookings:
-            print(f"ADMIN BOOKINGS - Booking {booking['booking_id']}: status={booking['status']}, user={booking['user_email']}")
-        
-        cancelled_bookings = [b for b in bookings if b['status'] == 'cancelled']
-        print(f"ADMIN BOOKINGS - Cancelled bookings: {len(cancelled_bookings)}")
+        filters = parse_booking_filters(request.args)
+        if request.args.get('format') == 'ndjson':
+            return stream_bookings(filters)
+        limit = parse_page_size(request.args.get('limit'))
+    except BookingListParamError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify({"bookings": bookings}), 200
+    try:
+        db = database_connection()
+        cursor = db.cursor()
+        bookings, next_cursor = fetch_bookings_page(cursor, filters, limit)
+        return jsonify({"bookings": bookings, "next_cursor": next_cursor, "limit": limit}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1219,6 +1492,17 @@ def all_bookings():
         if 'db' in locals(): db.close()
 
 
+def stream_bookings(filters):
+    """Stream every matching booking as NDJSON from a server-side cursor"""
+    query, params = build_bookings_query(filters)
+    try:
+        db = database_connection()
+        return stream_query(db, query, params, name='admin_bookings_export', fmt='ndjson',
+                            batch_size=int(os.getenv('BOOKINGS_STREAM_BATCH', 2000)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/admin/bookings', methods=['GET'])
 def api_all_bookings():
     """API version of admin bookings endpoint"""
@@ -1228,44 +1512,33 @@ def api_all_bookings():
 @app.route('/api/debug/bookings', methods=['GET'])
 def debug_bookings():
     """Debug endpoint to check bookings in database"""
+    status_counts = {}
+
+    def count_status(booking):
+        status_counts[booking['status']] = status_counts.get(booking['status'], 0) + 1
+        return booking
+
     try:
         db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        
-        # Get all bookings with their status
-        cursor.execute("SELECT booking_id, user_email, status, booking_date FROM bookings ORDER BY booking_date DESC")
-        bookings = cursor.fetchall()
-        
-        # Count by status
-        status_counts = {}
-        for booking in bookings:
-            status = booking['status']
-            status_counts[status] = status_counts.get(status, 0) + 1
-        
-        return jsonify({
-            "total_bookings": len(bookings),
-            "status_counts": status_counts,
-            "bookings": [dict(b) for b in bookings]
-        }), 200
-        
+        # Counts are only known once every booking has been sent, so they follow the list
+        return stream_query(
+            db, "SELECT booking_id, user_email, status, booking_date FROM bookings ORDER BY booking_date DESC",
+            name='debug_bookings', key='bookings', transform=count_status,
+            trailer=lambda: {"total_bookings": sum(status_counts.values()), "status_counts": status_counts},
+            fmt=stream_format(request.args),
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if 'cursor' in locals(): cursor.close()
-        if 'db' in locals(): db.close()
 
 
 @app.route('/cancelbooking', methods=['POST'])
 def cancel_booking():
-    print(f"CANCEL BOOKING - Request received")
     access_token = request.cookies.get('access_token')
     if not access_token:
-        print(f"CANCEL BOOKING - No access token")
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
-        print(f"CANCEL BOOKING - Invalid token")
         return jsonify({"message": "Invalid or expired token"}), 401
 
     user_email = decoded.get('email')
@@ -1273,7 +1546,7 @@ def cancel_booking():
     data = request.get_json()
     booking_id = data.get("booking_id")
     
-    print(f"CANCEL BOOKING - User: {user_email}, Role: {user_role}, Booking ID: {booking_id}")
+    log.debug("Cancel booking", extra={"user": user_email, "role": user_role, "booking_id": booking_id})
 
     if not booking_id:
         return jsonify({"message": "Booking ID is required"}), 400
@@ -1282,7 +1555,15 @@ def cancel_booking():
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
 
-        
+        try:
+            idempotency_key, replay = claim_idempotency_key(cursor, user_email, 'cancelbooking', data)
+        except IdempotencyError as e:
+            db.rollback()
+            return jsonify({"message": e.message}), e.http_status
+        if replay is not None:
+            db.rollback()
+            return idempotent_replay(replay)
+
         if user_role in ['admin', 'superadmin']:
             
             cursor.execute("SELECT * FROM bookings WHERE booking_id = %s", (booking_id,))
@@ -1295,13 +1576,19 @@ def cancel_booking():
         if not booking:
             return jsonify({"message": "Booking not found"}), 404
 
-        cursor.execute("UPDATE bookings SET status = %s WHERE booking_id = %s RETURNING *",
-                        ("cancelled", booking_id))
-        updated = cursor.fetchone()
+        # Seats go back to the flight and the payment is refunded in the
+        # same statement as the status change
+        cancelled = cancel_and_refund_booking(cursor, booking_id)
+        if cancelled is None:
+            db.rollback()
+            return jsonify({"message": "Booking already cancelled", "booking": booking}), 200
+        updated, refund, flight = cancelled
+        body = app.json.dumps({"message": "Booking cancelled", "booking": updated, "refund": refund})
+        if idempotency_key is not None:
+            store_response(cursor, user_email, 'cancelbooking', idempotency_key, 200, body)
         db.commit()
+        flights_changed(flight)
 
-
-    
         log_audit(
             user_email, 
             "CANCEL_BOOKING", 
@@ -1311,7 +1598,7 @@ def cancel_booking():
             str(booking_id)
         )
 
-        return jsonify({"message": "Booking cancelled", "booking": updated}), 200
+        return app.response_class(body, status=200, mimetype=app.json.mimetype)
 
     except Exception as e:
         db.rollback()
@@ -1331,7 +1618,7 @@ def userdetails():
     if not access_token:
         return jsonify({"message":"No Token was returned"}),401
         
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message":"No Token was returned"}),401
         
@@ -1369,7 +1656,7 @@ def user_history():
     if not access_token:
         return jsonify({"message": "No token provided"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
 
@@ -1406,18 +1693,20 @@ def user_history():
 
 
 @app.route('/flights', methods=['GET'])
+@cached_representation("flights", ttl=float(os.getenv("HTTP_CACHE_FLIGHTS_TTL", 30)))
 def get_all_flights_public():
     """Get all active flights - Public endpoint"""
     try:
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
 
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT flight_id, trip_type, airline, departure_city_code, arrival_city_code,
-                   departure_datetime, return_datetime as arrival_datetime, price, cabin_class, seats_available,
+                   departure_datetime, return_datetime as arrival_datetime, price, cabin_class,
+                   {SEATS_AVAILABLE_SQL} as seats_available,
                    flight_status, flight_duration, flight_distance, origin_country, destination_country
-            FROM flights
-            WHERE flight_status IN ('active', 'scheduled') AND seats_available > 0
+            FROM flights f
+            WHERE flight_status IN ('active', 'scheduled') AND {SEATS_AVAILABLE_SQL} > 0
             ORDER BY departure_datetime ASC
             LIMIT 50
         """)
@@ -1467,103 +1756,87 @@ def debug_flights():
     """Get all flights for debugging"""
     try:
         db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
+        return stream_query(db, """
             SELECT flight_id, departure_city_code, arrival_city_code, 
                    departure_datetime, price, seats_available, flight_status
             FROM flights 
             ORDER BY flight_id ASC
-        """)
-        flights = cursor.fetchall()
-        cursor.close()
-        db.close()
-        return jsonify(flights), 200
+        """, name='debug_flights', fmt=stream_format(request.args))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/flights/search', methods=['GET'])
-def search_flights():
-    origin = request.args.get('origin')
-    destination = request.args.get('destination')
-    date = request.args.get('date')  
-    trip_type = request.args.get('trip_type')
-    cabin = request.args.get('cabin')
-    passengers = request.args.get('passengers', '1')
-
-    query = """
-        SELECT DISTINCT f.flight_id, f.trip_type, f.airline, f.departure_city_code, f.arrival_city_code,
-               f.departure_datetime, f.return_datetime as arrival_datetime, f.price, f.cabin_class, f.seats_available, 
-               f.flight_status, f.flight_duration, f.flight_distance, f.gate, f.terminal,
-               f.origin_country, f.destination_country,
-               dc.country as departure_country, ac.country as arrival_country
-        FROM flights f
-        LEFT JOIN cities dc ON f.departure_city_code = dc.city_name
-        LEFT JOIN cities ac ON f.arrival_city_code = ac.city_name
-        WHERE f.seats_available > 0 AND f.flight_status IN ('active', 'Scheduled')
-    """
-    params = []
+def run_flight_search(origin, destination, day_range, trip_type, cabin, passengers):
+    """Resolve cities and run the search; returns (flights, origins, destinations)"""
+    engine = get_search_engine(database_connection)
+    if engine is not None:
+        origins = engine.resolve_city_names(origin) if origin else None
+        destinations = engine.resolve_city_names(destination) if destination else None
+        if origins == [] or destinations == []:
+            return [], origins, destinations
+        return engine.search(origins, destinations, day_range, trip_type, cabin, passengers), origins, destinations
 
-    if origin:
-        
-        query += " AND (f.departure_city_code ILIKE %s OR dc.city_name ILIKE %s)"
-        params.append(f"%{origin}%")
-        params.append(f"%{origin}%")
+    try:
+        db = database_connection()
+        cursor = db.cursor()
 
-    if destination:
-        
-        query += " AND (f.arrival_city_code ILIKE %s OR ac.city_name ILIKE %s)"
-        params.append(f"%{destination}%")
-        params.append(f"%{destination}%")
+        # Resolve free text to exact stored city values so the flights
+        # lookup can use the (departure, arrival, departure_datetime) index
+        origins = resolve_city_names(cursor, origin) if origin else None
+        destinations = resolve_city_names(cursor, destination) if destination else None
+        if origins == [] or destinations == []:
+            return [], origins, destinations
 
-    if date:
-        query += " AND DATE(departure_datetime) = %s"
-        params.append(date)
+        query, params = build_search_query(origins, destinations, day_range, trip_type, cabin, passengers)
 
-    if trip_type:
-        query += " AND trip_type ILIKE %s"
-        params.append(trip_type)
+        cursor.execute(query, params)
+        flights = fetch_rowset(cursor)
 
-    if cabin:
-        query += " AND cabin_class ILIKE %s"
-        params.append(cabin)
+        log.debug("Flight search returned %d flights", len(flights), extra={"params": params})
+        return flights, origins, destinations
+
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'db' in locals():
+            db.close()
 
-    if passengers:
-        query += " AND seats_available >= %s"
-        params.append(int(passengers))
 
-    query += " ORDER BY departure_datetime ASC"
+@app.route('/flights/search', methods=['GET'])
+def search_flights():
+    origin = (request.args.get('origin') or '').strip()
+    destination = (request.args.get('destination') or '').strip()
+    date = (request.args.get('date') or '').strip()
+    trip_type = request.args.get('trip_type')
+    cabin = request.args.get('cabin')
 
     try:
-        db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
+        day_range = parse_search_date(date) if date else None
+        passengers = parse_passengers(request.args.get('passengers', '1'))
+    except SearchParamError as e:
+        return jsonify({"error": str(e)}), 400
 
-        
-        print(f"DEBUG SEARCH - Query: {query}")
-        print(f"DEBUG SEARCH - Params: {params}")
-        
-        cursor.execute(query, tuple(params))
-        flights = cursor.fetchall()
-
-        print(f"DEBUG SEARCH - Found {len(flights)} flights")
+    cache = get_search_cache()
+    cache_key = cache.make_key(origin, destination, date, trip_type, cabin, passengers)
+    payload = cache.get(cache_key)
+    if payload is not None:
+        return app.response_class(payload, status=200, mimetype=app.json.mimetype)
 
-    
-        if not flights:
-            return jsonify([]), 200
-        
-        return jsonify(flights), 200
-        
+    try:
+        since = cache.epoch()
+        flights, origins, destinations = run_flight_search(origin, destination, day_range, trip_type, cabin, passengers)
+        payload = (app.json.dumps(flights) + "\n").encode('utf-8')
+        if origins != [] and destinations != []:
+            day = day_range[0].date() if day_range else None
+            cache.put(cache_key, payload, origins, destinations, day, since)
+        return app.response_class(payload, status=200, mimetype=app.json.mimetype)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'db' in locals():
-            db.close()
-
 
 @app.route('/cities/search', methods=['GET'])
+@cached_representation("cities", ttl=float(os.getenv("HTTP_CACHE_CITIES_TTL", 60)),
+                       version=lambda: get_city_index(database_connection).version)
 def search_cities():
     """Search cities by name for autocomplete"""
     search_query = request.args.get('q', '').strip()
@@ -1572,36 +1845,29 @@ def search_cities():
         return jsonify([]), 200
     
     try:
-        db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        
-        cursor.execute("""
-            SELECT DISTINCT city_name, country
-            FROM cities
-            WHERE city_name ILIKE %s
-            ORDER BY city_name
-            LIMIT 10
-        """, (f"%{search_query}%",))
-        
-        cities = cursor.fetchall()
-        
-        # Format the response
-        city_list = [{"city": city["city_name"], "country": city["country"]} for city in cities]
-        
+        # Served from the in-memory prefix index; no database round trip
+        city_list = get_city_index(database_connection).search(search_query, limit=10)
         return jsonify(city_list), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'db' in locals():
-            db.close()
 
 
 
 
+def user_summary(user):
+    """A login_users row as listed by GET /users"""
+    return {
+        'id': user['id'],
+        'name': f"{user['first_name']} {user['last_name']}",
+        'email': user['email'],
+        'role': user['role'],
+        'status': user.get('status', 'active'),
+        'permissions': user.get('permissions', []),
+        'lastLogin': user.get('last_login')
+    }
+
+
 @app.route('/users', methods=['GET'])
 def get_all_users():
     """Get all users - SuperAdmin only"""
@@ -1611,8 +1877,7 @@ def get_all_users():
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
         
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
@@ -1621,14 +1886,13 @@ def get_all_users():
         email = decoded.get('email')
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'superadmin':
+        if get_role_cache().role_for(cursor, email) != 'superadmin':
+            cursor.close()
+            db.close()
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
-        
-        #
-        cursor.execute("""
+        cursor.close()
+
+        return stream_query(db, """
             SELECT id, first_name, last_name, email, role, status, permissions, last_login
             FROM login_users
             ORDER BY 
@@ -1639,26 +1903,7 @@ def get_all_users():
                     ELSE 4
                 END,
                 id DESC
-        """)
-        users = cursor.fetchall()
-        
-        cursor.close()
-        db.close()
-        
-        
-        users_list = []
-        for user in users:
-            users_list.append({
-                'id': user['id'],
-                'name': f"{user['first_name']} {user['last_name']}",
-                'email': user['email'],
-                'role': user['role'],
-                'status': user.get('status', 'active'),
-                'permissions': user.get('permissions', []),
-                'lastLogin': user.get('last_login')
-            })
-        
-        return jsonify(users_list), 200
+        """, name='all_users', transform=user_summary, fmt=stream_format(request.args))
         
     except Exception as e:
         return jsonify({"message": f"Error fetching users: {str(e)}"}), 500
@@ -1672,20 +1917,14 @@ def create_user():
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
         
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
         
        
         email = decoded.get('email')
-        db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'superadmin':
+        if not is_superadmin(email):
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
         
         
@@ -1702,7 +1941,9 @@ def create_user():
         if role not in ['user', 'admin', 'superadmin']:
             return jsonify({"message": "Invalid role"}), 400
         
-        
+        hash_password = password_hash(password)
+        db = database_connection()
+        cursor = db.cursor(cursor_factory=RealDictCursor)
         cursor.execute("SELECT email FROM login_users WHERE email = %s", (email_new,))
         if cursor.fetchone():
             return jsonify({"message": "Email already exists"}), 409
@@ -1713,9 +1954,6 @@ def create_user():
         last_name = name_parts[1] if len(name_parts) > 1 else ''
         
         
-        hash_password = bcrypt.hashpw(password.encode('UTF-8'), bcrypt.gensalt()).decode('UTF-8')
-        
-        
         cursor.execute("""
             INSERT INTO login_users (first_name, last_name, email, hash_password, role)
             VALUES (%s, %s, %s, %s, %s)
@@ -1724,6 +1962,7 @@ def create_user():
         
         new_user = cursor.fetchone()
         db.commit()
+        users_changed(email_new)
         
         cursor.close()
         db.close()
@@ -1738,6 +1977,8 @@ def create_user():
             'lastLogin': new_user.get('last_login')
         }), 201
         
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         return jsonify({"message": f"Error creating user: {str(e)}"}), 500
 
@@ -1750,20 +1991,14 @@ def update_user(user_id):
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
         
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
         
         
         email = decoded.get('email')
-        db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'superadmin':
+        if not is_superadmin(email):
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
         
 
@@ -1780,7 +2015,9 @@ def update_user(user_id):
         if role and role not in ['user', 'admin', 'superadmin']:
             return jsonify({"message": "Invalid role"}), 400
         
-        
+        hash_password = password_hash(password) if password else None
+        db = database_connection()
+        cursor = db.cursor(cursor_factory=RealDictCursor)
         cursor.execute("SELECT id FROM login_users WHERE id = %s", (user_id,))
         if not cursor.fetchone():
             return jsonify({"message": "User not found"}), 404
@@ -1799,8 +2036,7 @@ def update_user(user_id):
         update_fields = ["first_name = %s", "last_name = %s", "email = %s"]
         update_values = [first_name, last_name, email_new]
         
-        if password:
-            hash_password = bcrypt.hashpw(password.encode('UTF-8'), bcrypt.gensalt()).decode('UTF-8')
+        if hash_password:
             update_fields.append("hash_password = %s")
             update_values.append(hash_password)
         
@@ -1820,6 +2056,7 @@ def update_user(user_id):
         
         updated_user = cursor.fetchone()
         db.commit()
+        users_changed()
         
         cursor.close()
         db.close()
@@ -1834,6 +2071,8 @@ def update_user(user_id):
             'lastLogin': updated_user.get('last_login')
         }), 200
         
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         return jsonify({"message": f"Error updating user: {str(e)}"}), 500
 
@@ -1846,8 +2085,7 @@ def delete_user(user_id):
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
         
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
@@ -1856,10 +2094,7 @@ def delete_user(user_id):
         email = decoded.get('email')
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'superadmin':
+        if get_role_cache().role_for(cursor, email) != 'superadmin':
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
         
         
@@ -1871,6 +2106,7 @@ def delete_user(user_id):
         
         cursor.execute("DELETE FROM login_users WHERE id = %s", (user_id,))
         db.commit()
+        users_changed(user_to_delete['email'])
         
         cursor.close()
         db.close()
@@ -1889,8 +2125,7 @@ def update_user_role(user_id):
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
         
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
@@ -1899,10 +2134,7 @@ def update_user_role(user_id):
         email = decoded.get('email')
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'superadmin':
+        if get_role_cache().role_for(cursor, email) != 'superadmin':
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
         
         
@@ -1928,6 +2160,7 @@ def update_user_role(user_id):
         
         updated_user = cursor.fetchone()
         db.commit()
+        users_changed(updated_user['email'])
         
         cursor.close()
         db.close()
@@ -1951,16 +2184,13 @@ def list_admins():
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
         email = decoded.get('email')
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        me = cursor.fetchone()
-        if not me or me['role'] != 'superadmin':
+        if get_role_cache().role_for(cursor, email) != 'superadmin':
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
 
         cursor.execute("""
@@ -1992,16 +2222,11 @@ def create_admin():
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
         email = decoded.get('email')
-        db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        me = cursor.fetchone()
-        if not me or me['role'] != 'superadmin':
+        if not is_superadmin(email):
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
 
         data = request.get_json()
@@ -2012,6 +2237,9 @@ def create_admin():
         if not all([name, email_new, password]):
             return jsonify({"message": "Name, email and password are required"}), 400
 
+        hash_password = password_hash(password)
+        db = database_connection()
+        cursor = db.cursor(cursor_factory=RealDictCursor)
         cursor.execute("SELECT 1 FROM login_users WHERE email=%s", (email_new,))
         if cursor.fetchone():
             return jsonify({"message": "Email already exists"}), 409
@@ -2019,7 +2247,6 @@ def create_admin():
         name_parts = name.split(' ', 1)
         first_name = name_parts[0]
         last_name = name_parts[1] if len(name_parts) > 1 else ''
-        hash_password = bcrypt.hashpw(password.encode('UTF-8'), bcrypt.gensalt()).decode('UTF-8')
 
         cursor.execute("""
             INSERT INTO login_users (first_name, last_name, email, hash_password, role, permissions, status)
@@ -2028,6 +2255,7 @@ def create_admin():
         """, (first_name, last_name, email_new, hash_password, json.dumps(permissions)))
         new_admin = cursor.fetchone()
         db.commit()
+        users_changed(email_new)
         cursor.close(); db.close()
         return jsonify({
             'id': new_admin['id'],
@@ -2037,6 +2265,8 @@ def create_admin():
             'status': new_admin.get('status','active'),
             'lastLogin': new_admin.get('last_login')
         }), 201
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         return jsonify({"message": f"Error creating admin: {str(e)}"}), 500
 
@@ -2047,16 +2277,13 @@ def toggle_admin_status(admin_id):
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
         email = decoded.get('email')
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        me = cursor.fetchone()
-        if not me or me['role'] != 'superadmin':
+        if get_role_cache().role_for(cursor, email) != 'superadmin':
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
 
         cursor.execute("SELECT status FROM login_users WHERE id=%s AND role='admin'", (admin_id,))
@@ -2069,6 +2296,7 @@ def toggle_admin_status(admin_id):
             RETURNING id, first_name, last_name, email, permissions, status, last_login
         """, (new_status, admin_id))
         updated = cursor.fetchone(); db.commit(); cursor.close(); db.close()
+        users_changed(updated['email'])
         return jsonify({
             'id': updated['id'],
             'name': f"{updated['first_name']} {updated['last_name']}",
@@ -2087,16 +2315,13 @@ def update_admin_permissions(admin_id):
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({"message": "No token provided"}), 401
-        token = auth_header.split(' ')[1]
-        decoded = decode_token(token)
+        decoded = bearer_claims()
         if not decoded:
             return jsonify({"message": "Invalid token"}), 401
         email = decoded.get('email')
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM login_users WHERE email = %s", (email,))
-        me = cursor.fetchone()
-        if not me or me['role'] != 'superadmin':
+        if get_role_cache().role_for(cursor, email) != 'superadmin':
             return jsonify({"message": "Unauthorized - SuperAdmin access required"}), 403
 
         data = request.get_json()
@@ -2108,6 +2333,7 @@ def update_admin_permissions(admin_id):
         updated = cursor.fetchone(); db.commit(); cursor.close(); db.close()
         if not updated:
             return jsonify({"message": "Admin not found"}), 404
+        users_changed(updated['email'])
         return jsonify({
             'id': updated['id'],
             'name': f"{updated['first_name']} {updated['last_name']}",
@@ -2123,127 +2349,63 @@ def update_admin_permissions(admin_id):
 @app.route('/admin/dashboard/stats', methods=['GET'])
 def admin_dashboard_stats():
     """Get dashboard statistics for admin"""
-    print(f"DASHBOARD STATS - Request received")
     access_token = request.cookies.get('access_token')
     if not access_token:
-        print(f"DASHBOARD STATS - No access token")
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
-        print(f"DASHBOARD STATS - Invalid token")
         return jsonify({"message": "Invalid or expired token"}), 401
 
     if decoded.get("role") not in ["admin", "superadmin"]:
-        print(f"DASHBOARD STATS - Forbidden role: {decoded.get('role')}")
         return jsonify({"message": "Forbidden: Admins only"}), 403
 
-    print(f"DASHBOARD STATS - Starting database queries")
     try:
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
+        stats = read_dashboard_stats(cursor)
+        cursor.close()
+        db.close()
 
-        # Total flights
-        try:
-            cursor.execute("SELECT COUNT(*) as count FROM flights")
-            total_flights = cursor.fetchone()['count']
-        except Exception as e:
-            print(f"Error fetching total flights: {e}")
-            total_flights = 0
-
-        # Total bookings
-        try:
-            cursor.execute("SELECT COUNT(*) as count FROM bookings")
-            total_bookings = cursor.fetchone()['count']
-        except Exception as e:
-            print(f"Error fetching total bookings: {e}")
-            total_bookings = 0
+        return jsonify(stats), 200
 
-        # Total revenue
-        try:
-            cursor.execute("SELECT SUM(price) as revenue FROM bookings WHERE status = 'confirmed'")
-            revenue_result = cursor.fetchone()
-            total_revenue = float(revenue_result['revenue']) if revenue_result and revenue_result['revenue'] else 0
-        except Exception as e:
-            print(f"Error fetching total revenue: {e}")
-            total_revenue = 0
-
-        # Cancelled bookings
-        try:
-            cursor.execute("SELECT COUNT(*) as count FROM bookings WHERE status = 'cancelled'")
-            cancelled_bookings = cursor.fetchone()['count']
-        except Exception as e:
-            print(f"Error fetching cancelled bookings: {e}")
-            cancelled_bookings = 0
+    except Exception as e:
+        log.exception("Dashboard stats error")
+        return jsonify({"error": str(e), "message": "Failed to load dashboard statistics"}), 500
 
-        # Upcoming flights
-        try:
-            cursor.execute("SELECT COUNT(*) as count FROM flights WHERE departure_datetime > NOW() AND flight_status = 'active'")
-            upcoming_flights = cursor.fetchone()['count']
-        except Exception as e:
-            print(f"Error fetching upcoming flights: {e}")
-            upcoming_flights = 0
 
-        # Bookings per route
-        try:
-            cursor.execute("""
-                SELECT city_origin, city_destination, COUNT(*) as count
-                FROM bookings
-                GROUP BY city_origin, city_destination
-                ORDER BY count DESC
-                LIMIT 10
-            """)
-            bookings_per_route = cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching bookings per route: {e}")
-            bookings_per_route = []
-
-        # Revenue per month
-        try:
-            cursor.execute("""
-                SELECT 
-                    TO_CHAR(booking_date, 'Mon YYYY') as month,
-                    SUM(price) as revenue
-                FROM bookings
-                WHERE status = 'confirmed'
-                GROUP BY TO_CHAR(booking_date, 'Mon YYYY'), DATE_TRUNC('month', booking_date)
-                ORDER BY DATE_TRUNC('month', booking_date)
-                LIMIT 12
-            """)
-            revenue_per_month = cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching revenue per month: {e}")
-            revenue_per_month = []
-
-        # Flight status distribution
-        try:
-            cursor.execute("""
-                SELECT flight_status, COUNT(*) as count
-                FROM flights
-                GROUP BY flight_status
-            """)
-            flight_status_dist = cursor.fetchall()
-        except Exception as e:
-            print(f"Error fetching flight status distribution: {e}")
-            flight_status_dist = []
+@app.route('/admin/dashboard/stats/rebuild', methods=['POST'])
+def admin_rebuild_dashboard_stats():
+    """Recompute the dashboard summary tables from bookings and flights - SuperAdmin only"""
+    access_token = request.cookies.get('access_token')
+    if not access_token:
+        return jsonify({"message": "No Token"}), 401
 
-        cursor.close()
-        db.close()
+    decoded = access_claims()
+    if not decoded:
+        return jsonify({"message": "Invalid or expired token"}), 401
 
-        return jsonify({
-            "totalFlights": total_flights,
-            "totalBookings": total_bookings,
-            "totalRevenue": total_revenue,
-            "cancelledBookings": cancelled_bookings,
-            "upcomingFlights": upcoming_flights,
-            "bookingsPerRoute": bookings_per_route,
-            "revenuePerMonth": revenue_per_month,
-            "flightStatusDistribution": flight_status_dist
-        }), 200
+    if decoded.get("role") != "superadmin":
+        return jsonify({"message": "Access denied - SuperAdmin only"}), 403
 
+    try:
+        db = database_connection()
+        cursor = db.cursor(cursor_factory=RealDictCursor)
+        rebuild_dashboard_stats(cursor)
+        db.commit()
+        stats = read_dashboard_stats(cursor)
+        log_audit(decoded.get('email'), "REBUILD_DASHBOARD_STATS", "Rebuilt dashboard summary tables", "SUCCESS", "DASHBOARD")
+        return jsonify({"message": "Dashboard statistics rebuilt", "stats": stats}), 200
     except Exception as e:
-        print(f"Dashboard stats error: {str(e)}")
-        return jsonify({"error": str(e), "message": "Failed to load dashboard statistics"}), 500
+        log.exception("Dashboard stats rebuild error")
+        if 'db' in locals():
+            db.rollback()
+        return jsonify({"error": str(e), "message": "Failed to rebuild dashboard statistics"}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'db' in locals():
+            db.close()
 
 
 @app.route('/api/admin/dashboard/stats', methods=['GET'])
@@ -2260,7 +2422,7 @@ def api_get_all_users():
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -2310,7 +2472,7 @@ def api_create_user():
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -2333,6 +2495,9 @@ def api_create_user():
         first_name = name_parts[0]
         last_name = name_parts[1] if len(name_parts) > 1 else ''
 
+        # Hash before taking a connection: bcrypt may queue
+        hashed_password = password_hash(password)
+
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
         
@@ -2341,9 +2506,6 @@ def api_create_user():
         if cursor.fetchone():
             return jsonify({"message": "User with this email already exists"}), 400
 
-        # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
         # Insert new user
         cursor.execute("""
             INSERT INTO login_users (first_name, last_name, email, hash_password, role, status)
@@ -2353,6 +2515,7 @@ def api_create_user():
         
         new_user = cursor.fetchone()
         db.commit()
+        users_changed(email)
         
         # Format response
         response_user = {
@@ -2366,6 +2529,8 @@ def api_create_user():
         
         return jsonify(response_user), 201
 
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         if 'db' in locals():
             db.rollback()
@@ -2382,7 +2547,7 @@ def api_update_user(user_id):
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -2405,6 +2570,9 @@ def api_update_user(user_id):
         first_name = name_parts[0]
         last_name = name_parts[1] if len(name_parts) > 1 else ''
 
+        # Hash before taking a connection: bcrypt may queue
+        hashed_password = password_hash(password) if password else None
+
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
         
@@ -2414,8 +2582,7 @@ def api_update_user(user_id):
             return jsonify({"message": "User not found"}), 404
 
         # Update user
-        if password:
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        if hashed_password:
             cursor.execute("""
                 UPDATE login_users 
                 SET first_name = %s, last_name = %s, email = %s, hash_password = %s, role = %s
@@ -2432,6 +2599,7 @@ def api_update_user(user_id):
         
         updated_user = cursor.fetchone()
         db.commit()
+        users_changed()
         
         # Format response
         response_user = {
@@ -2445,6 +2613,8 @@ def api_update_user(user_id):
         
         return jsonify(response_user), 200
 
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         if 'db' in locals():
             db.rollback()
@@ -2461,7 +2631,7 @@ def api_delete_user(user_id):
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -2481,6 +2651,7 @@ def api_delete_user(user_id):
         # Delete user
         cursor.execute("DELETE FROM login_users WHERE id = %s", (user_id,))
         db.commit()
+        users_changed()
         
         return jsonify({"message": "User deleted successfully"}), 200
 
@@ -2500,7 +2671,7 @@ def api_update_user_role(user_id):
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -2531,6 +2702,7 @@ def api_update_user_role(user_id):
             return jsonify({"message": "User not found"}), 404
             
         db.commit()
+        users_changed(updated_user['email'])
         
         # Format response
         response_user = {
@@ -2561,7 +2733,7 @@ def api_list_admins():
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -2592,7 +2764,7 @@ def api_list_admins():
                     import json
                     permissions = json.loads(permissions)
                 except Exception as e:
-                    print(f"Error parsing permissions for admin {admin['id']}: {e}")
+                    log.warning("Error parsing permissions for admin %s: %s", admin['id'], e)
                     permissions = []
             elif permissions is None:
                 permissions = []
@@ -2627,7 +2799,7 @@ def api_create_admin():
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -2650,6 +2822,9 @@ def api_create_admin():
         first_name = name_parts[0]
         last_name = name_parts[1] if len(name_parts) > 1 else ''
 
+        # Hash before taking a connection: bcrypt may queue
+        hashed_password = password_hash(password)
+
         db = database_connection()
         cursor = db.cursor(cursor_factory=RealDictCursor)
         
@@ -2658,9 +2833,6 @@ def api_create_admin():
         if cursor.fetchone():
             return jsonify({"message": "User with this email already exists"}), 400
 
-        # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
         # Convert permissions to JSON
         import json
         permissions_json = json.dumps(permissions)
@@ -2674,6 +2846,7 @@ def api_create_admin():
         
         new_admin = cursor.fetchone()
         db.commit()
+        users_changed(email)
         
         # Format response
         response_admin = {
@@ -2689,6 +2862,8 @@ def api_create_admin():
         
         return jsonify(response_admin), 201
 
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         if 'db' in locals():
             db.rollback()
@@ -2705,7 +2880,7 @@ def api_toggle_admin_status(admin_id):
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid Token"}), 401
 
@@ -2736,6 +2911,7 @@ def api_toggle_admin_status(admin_id):
         
         updated_admin = cursor.fetchone()
         db.commit()
+        users_changed(updated_admin['email'])
         
         # Parse permissions
         permissions = updated_admin['permissions'] if updated_admin['permissions'] else []
@@ -2776,7 +2952,7 @@ def get_all_flights():
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
 
@@ -2785,21 +2961,14 @@ def get_all_flights():
 
     try:
         db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute("""
+        return stream_query(db, f"""
             SELECT flight_id, trip_type, airline, departure_city_code, arrival_city_code,
-                   departure_datetime, return_datetime as arrival_datetime, price, cabin_class, seats_available,
+                   departure_datetime, return_datetime as arrival_datetime, price, cabin_class,
+                   {SEATS_AVAILABLE_SQL} as seats_available, seat_buckets,
                    flight_status, flight_duration, origin_country, destination_country
-            FROM flights
+            FROM flights f
             ORDER BY departure_datetime DESC
-        """)
-        flights = cursor.fetchall()
-
-        cursor.close()
-        db.close()
-
-        return jsonify(flights), 200
+        """, name='admin_flights', fmt=stream_format(request.args))
 
     except Exception as e:
         return jsonify({"error": str(e), "message": "Failed to load flights"}), 500
@@ -2812,7 +2981,7 @@ def update_flight_status(flight_id):
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
 
@@ -2834,7 +3003,7 @@ def update_flight_status(flight_id):
             UPDATE flights
             SET flight_status = %s
             WHERE flight_id = %s
-            RETURNING flight_id, flight_status
+            RETURNING flight_id, flight_status, departure_city_code, arrival_city_code, departure_datetime
         """, (new_status, flight_id))
 
         updated_flight = cursor.fetchone()
@@ -2843,29 +3012,125 @@ def update_flight_status(flight_id):
             return jsonify({"message": "Flight not found"}), 404
 
         db.commit()
-        cursor.close()
-        db.close()
+
+        # New bookings are refused once the status is committed; cancel the
+        # existing ones in batches (re-running this repairs a partial cascade)
+        cascade = None
+        if new_status == 'cancelled':
+            try:
+                cascade = cancel_flight_bookings(db, cursor, flight_id,
+                                                 batch_size=int(os.getenv('CANCEL_CASCADE_BATCH', 500)))
+            except CascadeIncomplete as e:
+                log.exception("Booking cascade for cancelled flight stopped", extra={"flight_id": flight_id})
+                flights_changed(updated_flight)
+                log_audit(
+                    decoded.get('email'),
+                    "UPDATE_FLIGHT_STATUS",
+                    f"Changed flight {flight_id} status to {new_status}; cascade stopped after "
+                    f"{e.totals['bookings']} bookings: {e.__cause__}",
+                    "FAILED",
+                    "FLIGHT",
+                    flight_id
+                )
+                return jsonify({
+                    "status": "partial_cascade",
+                    "message": "Flight status updated, but not all of its bookings were cancelled; re-run to finish",
+                    "flight": updated_flight,
+                    "cancelled_bookings": e.totals,
+                    "error": str(e.__cause__)
+                }), 500
+        flights_changed(updated_flight)
 
         # Log audit
         log_audit(
             decoded.get('email'),
             "UPDATE_FLIGHT_STATUS",
-            f"Changed flight {flight_id} status to {new_status}",
+            f"Changed flight {flight_id} status to {new_status}"
+            + (f"; cancelled {cascade['bookings']} bookings, refunded {cascade['payments']} payments" if cascade else ""),
             "SUCCESS",
             "FLIGHT",
             flight_id
         )
 
-        return jsonify({
+        response = {
             "message": "Flight status updated successfully",
             "flight": updated_flight
+        }
+        if cascade is not None:
+            response["cancelled_bookings"] = cascade
+        return jsonify(response), 200
+
+    except Exception as e:
+        if 'db' in locals():
+            db.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'db' in locals(): db.close()
+
+
+@app.route('/admin/flights/<flight_id>/seat-buckets', methods=['PUT'])
+def update_flight_seat_buckets(flight_id):
+    """Split a flight's free seats into buckets for high-concurrency sales - Admin only"""
+    access_token = request.cookies.get('access_token')
+    if not access_token:
+        return jsonify({"message": "No Token"}), 401
+
+    decoded = access_claims()
+    if not decoded:
+        return jsonify({"message": "Invalid or expired token"}), 401
+
+    if decoded.get("role") not in ["admin", "superadmin"]:
+        return jsonify({"message": "Forbidden: Admins only"}), 403
+
+    data = request.get_json() or {}
+    try:
+        buckets = int(data.get('buckets'))
+    except (TypeError, ValueError):
+        return jsonify({"message": "buckets must be a whole number"}), 400
+    if buckets < 0:
+        return jsonify({"message": "buckets must be 0 or more"}), 400
+
+    try:
+        db = database_connection()
+        cursor = db.cursor(cursor_factory=RealDictCursor)
+        seats_available = set_seat_buckets(cursor, flight_id, buckets)
+        if seats_available is None:
+            db.rollback()
+            return jsonify({"message": "Flight not found"}), 404
+        cursor.execute("SELECT seat_buckets FROM flights WHERE flight_id = %s", (flight_id,))
+        seat_buckets = cursor.fetchone()['seat_buckets']
+        db.commit()
+
+        log_audit(
+            decoded.get('email'),
+            "UPDATE_FLIGHT_SEAT_BUCKETS",
+            f"Set flight {flight_id} to {seat_buckets} seat buckets",
+            "SUCCESS",
+            "FLIGHT",
+            flight_id
+        )
+
+        return jsonify({
+            "message": "Seat buckets updated",
+            "flight_id": flight_id,
+            "seat_buckets": seat_buckets,
+            "seats_available": seats_available
         }), 200
 
     except Exception as e:
+        if 'db' in locals():
+            db.rollback()
         return jsonify({"error": str(e)}), 500
 
+    finally:
+        if 'cursor' in locals(): cursor.close()
+        if 'db' in locals(): db.close()
+
 
 @app.route('/hotels', methods=['GET'])
+@cached_representation("hotels")
 def get_hotels():
     """Get hotels with dummy data - Public endpoint"""
     # Dummy hotel data
@@ -3002,7 +3267,7 @@ def get_audit_logs():
     if not access_token:
         return jsonify({"message": "No Token"}), 401
 
-    decoded = decode_token(access_token)
+    decoded = access_claims()
     if not decoded:
         return jsonify({"message": "Invalid or expired token"}), 401
 
@@ -3017,9 +3282,6 @@ def get_audit_logs():
         date_to = request.args.get('dateTo', '')
         limit = request.args.get('limit', '100')
 
-        db = database_connection()
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-
         # Build query with filters
         query = "SELECT * FROM audit_logs WHERE 1=1"
         params = []
@@ -3043,13 +3305,8 @@ def get_audit_logs():
         query += " ORDER BY timestamp DESC LIMIT %s"
         params.append(int(limit))
 
-        cursor.execute(query, tuple(params))
-        logs = cursor.fetchall()
-
-        cursor.close()
-        db.close()
-
-        return jsonify(logs), 200
+        db = database_connection()
+        return stream_query(db, query, tuple(params), name='audit_logs', fmt=stream_format(request.args))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -3061,9 +3318,43 @@ def api_get_audit_logs():
     return get_audit_logs()
 
 
+# Threads do not survive fork(): under gunicorn --preload the jobs started at
+# import belong to the master, so each worker starts its own on its first request
+app.before_request(start_background_jobs)
+
 @app.before_request
-def log_request():
-    print(f"REQUEST - {request.method} {request.path} from {request.remote_addr}")
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    request_started(g.metrics_endpoint)
+
+@app.after_request
+def log_request(response):
+    # Sampled by the app.requests logger; 5xx responses are always written
+    g.response_status = response.status_code
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    request_log.log(
+        logging.WARNING if response.status_code >= 500 else logging.INFO,
+        "%s %s %s", request.method, request.path, response.status_code,
+        extra={"duration_ms": round(elapsed * 1000, 2), "remote_addr": request.remote_addr}
+    )
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    # Runs after streamed responses finish and after unhandled errors too
+    if 'metrics_endpoint' not in g:
+        return
+    request_finished(g.metrics_endpoint, request.method, g.get('response_status', 500),
+                     time.perf_counter() - g.request_started)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of every worker; needs ``Authorization: Bearer $METRICS_TOKEN`` when that is set"""
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return jsonify({"message": "Unauthorized"}), 401
+    return app.response_class(render_metrics(), status=200, mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,202 @@
+"""Race hundreds of clients for the last seats of one flight.
+
+Creates an isolated ``bench_booking`` schema holding one flight with
+--seats seats, then lets --clients threads (each with its own connection)
+book --per-booking seats at once, first with the legacy multi-statement
+flow, then with ``helper.booking_engine.book_seats`` against the flights
+row and finally against --buckets seat buckets. Reports bookings
+made, seats sold (never more than --seats), refusals by reason, wall time
+and latency percentiles.
+
+    cd backend && python -m benchmarks.bench_booking_race --clients 300 --seats 50
+
+Uses the DB_* settings from .env. The schema is dropped afterwards unless
+--keep is given.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from helper.booking_engine import BookingFailed, book_seats  # noqa: E402
+from helper.migrations import BOOKING_TABLES_SQL, SEAT_INVENTORY_SQL  # noqa: E402
+from helper.seat_inventory import SEATS_AVAILABLE_SQL, set_seat_buckets  # noqa: E402
+
+
+SCHEMA = "bench_booking"
+FLIGHT_ID = "BENCH1"
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        dbname=os.getenv('DB_NAME'),
+        options=f"-c search_path={SCHEMA}"
+    )
+
+
+def setup(cursor):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute("""
+        CREATE TABLE flights (
+            flight_id VARCHAR(20) PRIMARY KEY, departure_city_code VARCHAR(100),
+            arrival_city_code VARCHAR(100), departure_datetime TIMESTAMP,
+            price NUMERIC(10, 2), seats_available INTEGER, flight_status VARCHAR(20)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE bookings (
+            booking_id SERIAL PRIMARY KEY, user_name VARCHAR(255), user_email VARCHAR(255),
+            flight_id VARCHAR(20), city_origin VARCHAR(255), city_destination VARCHAR(255),
+            price NUMERIC(10, 2), booking_date TIMESTAMP, status VARCHAR(20)
+        )
+    """)
+    for ddl in SEAT_INVENTORY_SQL + BOOKING_TABLES_SQL:
+        cursor.execute(ddl)
+
+
+def reset(cursor, seats, buckets=0):
+    cursor.execute("TRUNCATE bookings, flight_payments, flight_seat_buckets RESTART IDENTITY")
+    cursor.execute("DELETE FROM flights")
+    cursor.execute("""
+        INSERT INTO flights (flight_id, departure_city_code, arrival_city_code, departure_datetime,
+                             price, seats_available, flight_status)
+        VALUES (%s, 'Accra', 'London', NOW() + interval '7 days', 420, %s, 'active')
+    """, (FLIGHT_ID, seats))
+    if buckets:
+        set_seat_buckets(cursor, FLIGHT_ID, buckets)
+
+
+def legacy_book(cursor, seats, client):
+    """The pre-engine flow: read, insert booking, DDL, insert payment, then decrement"""
+    cursor.execute("SELECT flight_id, seats_available, departure_city_code, arrival_city_code, departure_datetime, price FROM flights WHERE flight_id = %s", (FLIGHT_ID,))
+    flight = cursor.fetchone()
+    cursor.execute("""
+        INSERT INTO bookings (user_name, user_email, flight_id, city_origin, city_destination, price, booking_date, status)
+        VALUES (%s, %s, %s, %s, %s, %s, NOW(), 'confirmed')
+        RETURNING booking_id, *
+    """, (f"Client {client}", f"client{client}@bench", FLIGHT_ID,
+          flight["departure_city_code"], flight["arrival_city_code"], 420))
+    booking_id = cursor.fetchone()['booking_id']
+    cursor.execute(BOOKING_TABLES_SQL[2])
+    cursor.execute("""
+        INSERT INTO flight_payments (booking_id, user_email, amount, payment_method, payment_status, payment_date)
+        VALUES (%s, %s, %s, 'card', 'completed', NOW())
+    """, (booking_id, f"client{client}@bench", 420))
+    cursor.execute("""
+        UPDATE flights SET seats_available = seats_available - %s
+        WHERE flight_id = %s AND seats_available >= %s
+    """, (seats, FLIGHT_ID, seats))
+    if cursor.rowcount == 0:
+        raise BookingFailed("insufficient_seats", "Not enough seats available")
+
+
+def engine_book(cursor, seats, client):
+    book_seats(cursor, FLIGHT_ID, seats, f"Client {client}", f"client{client}@bench", 420, 'card')
+
+
+def race(book, clients, seats):
+    connections = [connect() for _ in range(clients)]
+    barrier = threading.Barrier(clients)
+    latencies, outcomes = [], Counter()
+    lock = threading.Lock()
+
+    def worker(i):
+        db = connections[i]
+        cursor = db.cursor(cursor_factory=RealDictCursor)
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            book(cursor, seats, i)
+            db.commit()
+            outcome = "booked"
+        except BookingFailed as e:
+            db.rollback()
+            outcome = e.reason
+        except psycopg2.Error as e:
+            db.rollback()
+            outcome = type(e).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+        cursor.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    for db in connections:
+        db.close()
+    return latencies, outcomes, wall
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        "p50": pick(0.50) * 1000, "p95": pick(0.95) * 1000, "p99": pick(0.99) * 1000,
+        "mean": statistics.mean(samples) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--seats', type=int, default=50)
+    parser.add_argument('--per-booking', type=int, default=1)
+    parser.add_argument('--buckets', type=int, default=16, help='seat buckets for the bucketed run')
+    parser.add_argument('--keep', action='store_true', help='keep the bench_booking schema')
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+    db = connect()
+    cursor = db.cursor(cursor_factory=RealDictCursor)
+    try:
+        setup(cursor)
+        db.commit()
+        print(f"{args.clients} clients racing for {args.seats} seats ({args.per_booking} per booking)\n")
+        print(f"{'flow':<9}{'booked':>8}{'sold':>6}{'left':>6}{'wall s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  refusals")
+        flows = (("legacy", legacy_book, 0), ("engine", engine_book, 0), ("buckets", engine_book, args.buckets))
+        for name, book, buckets in flows:
+            reset(cursor, args.seats, buckets)
+            db.commit()
+            latencies, outcomes, wall = race(book, args.clients, args.per_booking)
+            cursor.execute(f"SELECT {SEATS_AVAILABLE_SQL} AS seats_available FROM flights f WHERE flight_id = %s",
+                           (FLIGHT_ID,))
+            left = cursor.fetchone()['seats_available']
+            cursor.execute("SELECT COUNT(*) AS n FROM bookings")
+            booked = cursor.fetchone()['n']
+            db.commit()
+            stats = percentiles(latencies)
+            refusals = ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items()) if k != "booked")
+            print(f"{name:<9}{booked:>8}{args.seats - left:>6}{left:>6}{wall:>9.2f}"
+                  f"{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}  {refusals}")
+            if booked * args.per_booking != args.seats - left:
+                print(f"  !! {name}: bookings do not match seats sold")
+    finally:
+        db.rollback()
+        if not args.keep:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            db.commit()
+        cursor.close()
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
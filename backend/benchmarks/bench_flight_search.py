@@ -0,0 +1,168 @@
+"""Compare the legacy ILIKE flight search against the indexed search.
+
+Builds an isolated ``bench_search`` schema with synthetic cities and
+flights (1,000,000 by default), then times both query shapes for random
+origin/destination/date searches and prints latency percentiles.
+
+    cd backend && python -m benchmarks.bench_flight_search --flights 1000000 --queries 200
+
+Uses the DB_* settings from .env. The schema is dropped afterwards unless
+--keep is given.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from helper.flight_search import build_search_query, resolve_city_names  # noqa: E402
+from helper.migrations import SEAT_INVENTORY_SQL, apply_migration  # noqa: E402
+
+
+LEGACY_QUERY = """
+    SELECT DISTINCT f.flight_id, f.trip_type, f.airline, f.departure_city_code, f.arrival_city_code,
+           f.departure_datetime, f.return_datetime as arrival_datetime, f.price, f.cabin_class, f.seats_available,
+           f.flight_status, f.flight_duration, f.flight_distance, f.gate, f.terminal,
+           f.origin_country, f.destination_country,
+           dc.country as departure_country, ac.country as arrival_country
+    FROM flights f
+    LEFT JOIN cities dc ON f.departure_city_code = dc.city_name
+    LEFT JOIN cities ac ON f.arrival_city_code = ac.city_name
+    WHERE f.seats_available > 0 AND f.flight_status IN ('active', 'Scheduled')
+      AND (f.departure_city_code ILIKE %s OR dc.city_name ILIKE %s)
+      AND (f.arrival_city_code ILIKE %s OR ac.city_name ILIKE %s)
+      AND DATE(departure_datetime) = %s
+    ORDER BY departure_datetime ASC
+"""
+
+START_DAY = date(2025, 1, 1)
+DAYS = 365
+
+
+def setup(cursor, n_cities, n_flights):
+    cursor.execute("DROP SCHEMA IF EXISTS bench_search CASCADE")
+    cursor.execute("CREATE SCHEMA bench_search")
+    cursor.execute("SET search_path TO bench_search, public")
+    cursor.execute("""
+        CREATE TABLE cities (
+            city_id SERIAL PRIMARY KEY, city_name VARCHAR(100), country VARCHAR(100),
+            longitude NUMERIC, latitude NUMERIC
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO cities (city_name, country, longitude, latitude)
+        SELECT 'City' || g, 'Country' || (g %% 60), random() * 360 - 180, random() * 180 - 90
+        FROM generate_series(1, %s) g
+    """, (n_cities,))
+    cursor.execute("""
+        CREATE TABLE flights (
+            flight_id VARCHAR(20) PRIMARY KEY, trip_type VARCHAR(20), airline VARCHAR(100),
+            departure_city_code VARCHAR(100), arrival_city_code VARCHAR(100),
+            departure_datetime TIMESTAMP, return_datetime TIMESTAMP, price NUMERIC(10, 2),
+            cabin_class VARCHAR(20), seats_available INTEGER, flight_status VARCHAR(20),
+            flight_duration NUMERIC, flight_distance NUMERIC, gate VARCHAR(10), terminal VARCHAR(10),
+            origin_country VARCHAR(100), destination_country VARCHAR(100)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO flights
+        SELECT 'FL' || g,
+               CASE WHEN g %% 3 = 0 THEN 'round-trip' ELSE 'one-way' END,
+               'Airline' || (g %% 25),
+               'City' || (1 + (g * 7919) %% %(c)s),
+               'City' || (1 + (g * 104729) %% %(c)s),
+               %(start)s::timestamp + (random() * %(days)s) * interval '1 day',
+               NULL, (50 + random() * 1500)::numeric(10, 2),
+               (ARRAY['economy', 'business', 'first'])[1 + g %% 3],
+               (random() * 200)::int,
+               (ARRAY['active', 'Scheduled', 'cancelled', 'completed'])[1 + g %% 4],
+               random() * 12, random() * 9000, NULL, NULL, 'Country', 'Country'
+        FROM generate_series(1, %(n)s) g
+    """, {"c": n_cities, "n": n_flights, "start": START_DAY, "days": DAYS})
+    for ddl in SEAT_INVENTORY_SQL:
+        cursor.execute(ddl)
+    apply_migration(cursor, 3)  # search indexes
+    cursor.execute("ANALYZE cities")
+    cursor.execute("ANALYZE flights")
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        "p50": pick(0.50) * 1000, "p95": pick(0.95) * 1000, "p99": pick(0.99) * 1000,
+        "mean": statistics.mean(samples) * 1000,
+    }
+
+
+def run(cursor, searches):
+    legacy, indexed = [], []
+    for origin, destination, day in searches:
+        started = time.perf_counter()
+        cursor.execute(LEGACY_QUERY, (f"%{origin}%",) * 2 + (f"%{destination}%",) * 2 + (day,))
+        cursor.fetchall()
+        legacy.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        origins = resolve_city_names(cursor, origin)
+        destinations = resolve_city_names(cursor, destination)
+        start = day
+        query, params = build_search_query(origins, destinations, (start, start + timedelta(days=1)))
+        cursor.execute(query, params)
+        cursor.fetchall()
+        indexed.append(time.perf_counter() - started)
+    return percentiles(legacy), percentiles(indexed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flights', type=int, default=1_000_000)
+    parser.add_argument('--cities', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--keep', action='store_true', help='keep the bench_search schema')
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+    db = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        dbname=os.getenv('DB_NAME')
+    )
+    cursor = db.cursor(cursor_factory=RealDictCursor)
+    try:
+        print(f"Seeding {args.flights:,} flights across {args.cities} cities...")
+        started = time.perf_counter()
+        setup(cursor, args.cities, args.flights)
+        db.commit()
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(42)
+        searches = [
+            (f"City{rng.randint(1, args.cities)}", f"City{rng.randint(1, args.cities)}",
+             START_DAY + timedelta(days=rng.randrange(DAYS)))
+            for _ in range(args.queries)
+        ]
+        legacy, indexed = run(cursor, searches)
+        print(f"\n{'query':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+        for name, stats in (("legacy", legacy), ("indexed", indexed)):
+            print(f"{name:<10}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['mean']:>10.2f}")
+        print(f"\nspeedup (p50): {legacy['p50'] / indexed['p50']:.1f}x")
+    finally:
+        db.rollback()
+        if not args.keep:
+            cursor.execute("DROP SCHEMA IF EXISTS bench_search CASCADE")
+            db.commit()
+        cursor.close()
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Compare Flask's default JSON provider with helper.json_provider.
+
+Encodes synthetic payloads shaped like the /flights/search and
+/admin/bookings responses (same columns and value types as their queries)
+three ways:
+
+* default - RealDictRow per row (what RealDictCursor builds) + Flask's encoder
+* fast    - RealDictRow per row + FastJSONProvider
+* rowset  - row tuples from a plain cursor (RowSet) + FastJSONProvider
+
+The row-building time is included, since a RealDictCursor pays it on every
+fetch. Prints the time per payload and the speedup over the default.
+
+    cd backend && python -m benchmarks.bench_json_provider --rows 2000 --repeat 50
+
+No database is needed.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from psycopg2.extras import RealDictRow
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from helper.json_provider import FastJSONProvider, orjson  # noqa: E402
+from helper.rowset import RowSet  # noqa: E402
+
+
+SEARCH_COLUMNS = (
+    "flight_id", "trip_type", "airline", "departure_city_code", "arrival_city_code",
+    "departure_datetime", "arrival_datetime", "price", "cabin_class", "seats_available",
+    "flight_status", "flight_duration", "flight_distance", "gate", "terminal",
+    "origin_country", "destination_country", "departure_country", "arrival_country",
+)
+
+BOOKING_COLUMNS = (
+    "booking_id", "user_email", "user_name", "flight_id", "departure_city_code", "arrival_city_code",
+    "departure_datetime", "airline", "status", "booking_date", "price",
+    "payment_amount", "payment_method", "payment_status",
+)
+
+START = datetime(2025, 1, 1)
+
+
+def search_rows(rng, n):
+    rows = []
+    for i in range(n):
+        departure = START + timedelta(minutes=rng.randrange(525600))
+        rows.append((
+            f"FL{i}", rng.choice(("one-way", "round-trip")), f"Airline{rng.randrange(25)}",
+            "Accra", "London", departure, departure + timedelta(hours=7) if i % 3 == 0 else None,
+            Decimal(f"{rng.uniform(50, 1500):.2f}"), rng.choice(("economy", "business", "first")),
+            rng.randrange(1, 200), "active", Decimal(f"{rng.uniform(1, 12):.2f}"),
+            Decimal(f"{rng.uniform(100, 9000):.2f}"), None, None, "Ghana", "United Kingdom",
+            "Ghana", "United Kingdom",
+        ))
+    return rows
+
+
+def booking_rows(rng, n):
+    rows = []
+    for i in range(n):
+        price = Decimal(f"{rng.uniform(50, 1500):.2f}")
+        rows.append((
+            100000 + i, f"user{rng.randrange(5000)}@example.com", f"User {i}", f"FL{rng.randrange(10000)}",
+            "Accra", "London", START + timedelta(minutes=rng.randrange(525600)), f"Airline{rng.randrange(25)}",
+            rng.choice(("confirmed", "cancelled")), START + timedelta(seconds=rng.randrange(31536000)), price,
+            price, rng.choice(("card", "paypal", None)), rng.choice(("paid", "refunded", None)),
+        ))
+    return rows
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def compare(app, fast, columns, rows, repeat):
+    default = app.json
+
+    def default_path():
+        return default.dumps([RealDictRow(zip(columns, row)) for row in rows]).encode('utf-8')
+
+    def fast_path():
+        return fast.dumps_bytes([RealDictRow(zip(columns, row)) for row in rows])
+
+    def rowset_path():
+        return fast.dumps_bytes(RowSet(columns, rows))
+
+    return {name: timed(fn, repeat) for name, fn in
+            (("default", default_path), ("fast", fast_path), ("rowset", rowset_path))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--datetime-format', choices=('http', 'iso'), default='http')
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed; the fast provider falls back to the default encoder")
+    rng = random.Random(42)
+    app = Flask(__name__)
+    fast = FastJSONProvider(app, datetime_format=args.datetime_format)
+    payloads = (
+        ("search_flights", SEARCH_COLUMNS, search_rows(rng, args.rows)),
+        ("all_bookings", BOOKING_COLUMNS, booking_rows(rng, args.rows)),
+    )
+    print(f"{args.rows:,} rows per payload, median of {args.repeat} runs, datetimes as {args.datetime_format}\n")
+    print(f"{'payload':<16}{'default ms':>12}{'fast ms':>10}{'rowset ms':>11}{'speedup':>10}")
+    with app.app_context():
+        for name, columns, rows in payloads:
+            times = compare(app, fast, columns, rows, args.repeat)
+            print(f"{name:<16}{times['default']:>12.2f}{times['fast']:>10.2f}{times['rowset']:>11.2f}"
+                  f"{times['default'] / times['rowset']:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+
+log = logging.getLogger(__name__)
+
+
+INSERT_AUDIT_SQL = """
+    INSERT INTO audit_logs (timestamp, user_email, action, details, ip_address, status, resource_type, resource_id)
+    VALUES %s
+"""
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+
+class _Control:
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class AuditWriter:
+    """Background writer that batches audit events into multi-row INSERTs.
+
+    Events are queued by ``submit()`` and flushed by a daemon thread once
+    ``batch_size`` events are pending or ``flush_interval`` seconds have
+    passed, whichever comes first. When the queue is full the
+    ``overflow`` policy decides what happens:
+
+    * ``block``       - wait up to ``block_timeout`` seconds, then drop
+    * ``drop_newest`` - drop the event being submitted
+    * ``drop_oldest`` - evict the oldest queued event to make room
+    """
+
+    def __init__(self, connection_factory, max_queue=10000, batch_size=200,
+                 flush_interval=1.0, overflow="drop_oldest", block_timeout=0.05,
+                 max_retries=3):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown audit overflow policy: {overflow}")
+        self._connection_factory = connection_factory
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._counters = {"queued": 0, "flushed": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def submit(self, event):
+        """Queue one audit row; returns False if the event was dropped"""
+        if self._closed:
+            self._count("dropped")
+            return False
+        try:
+            if self.overflow == "block":
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            if self.overflow != "drop_oldest":
+                self._count("dropped")
+                return False
+            self._count("dropped")
+            if not self._replace_oldest_row(event):
+                return False
+        self._count("queued")
+        return True
+
+    def _replace_oldest_row(self, event):
+        """Drop the oldest queued audit row and queue ``event`` in its place.
+
+        Flush/stop markers are skipped, so they keep their position. Returns
+        False when the queue holds nothing but markers.
+        """
+        with self._queue.mutex:
+            items = self._queue.queue
+            for index, item in enumerate(items):
+                if not isinstance(item, _Control):
+                    del items[index]
+                    items.append(event)
+                    return True
+        return False
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued before this call has been written"""
+        control = _Control()
+        self._queue.put(control, timeout=timeout)
+        return control.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if self._closed:
+            return
+        self._closed = True
+        control = _Control(stop=True)
+        try:
+            self._queue.put(control, timeout=timeout)
+        except queue.Full:
+            return
+        control.done.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["pending"] = self._queue.qsize()
+        stats["capacity"] = self._queue.maxsize
+        stats["overflow_policy"] = self.overflow
+        return stats
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _Control):
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                item.done.set()
+                if item.stop:
+                    return
+                continue
+
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, batch):
+        if not batch:
+            return
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                db = self._connection_factory()
+                try:
+                    cursor = db.cursor()
+                    execute_values(cursor, INSERT_AUDIT_SQL, batch, page_size=len(batch))
+                    db.commit()
+                    cursor.close()
+                finally:
+                    db.close()
+                self._count("flushed", len(batch))
+                self._count("batches")
+                return
+            except Exception as e:
+                log.error("Error writing audit batch (attempt %d/%d): %s", attempt, self.max_retries, e)
+                if attempt < self.max_retries:
+                    time.sleep(min(0.1 * 2 ** attempt, 2.0))
+        self._count("failed", len(batch))
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer(connection_factory):
+    """Return this process's writer, starting its thread on first use"""
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _writer is not None and _writer_pid == pid:
+        return _writer
+    with _writer_lock:
+        if _writer is None or _writer_pid != pid:
+            # Threads do not survive fork(), so each worker needs its own
+            _writer = AuditWriter(
+                connection_factory,
+                max_queue=int(os.getenv("AUDIT_QUEUE_SIZE", 10000)),
+                batch_size=int(os.getenv("AUDIT_BATCH_SIZE", 200)),
+                flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", 1.0)),
+                overflow=os.getenv("AUDIT_OVERFLOW_POLICY", "drop_oldest"),
+                block_timeout=float(os.getenv("AUDIT_BLOCK_TIMEOUT", 0.05)),
+            )
+            _writer_pid = pid
+            atexit.register(_writer.close)
+    return _writer
+
+
+def audit_stats():
+    if _writer is None or _writer_pid != os.getpid():
+        return None
+    return _writer.stats()
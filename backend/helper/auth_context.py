@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+
+from flask import g, request
+
+from helper.cache_backend import get_cache_backend
+from helper.generate_token import decode_token
+
+
+_UNSET = object()
+
+
+def _claims(name, token):
+    """Decode ``token`` on first use in this request and keep the result on flask.g"""
+    claims = g.get(name, _UNSET)
+    if claims is _UNSET:
+        claims = decode_token(token) if token else None
+        setattr(g, name, claims)
+    return claims
+
+
+def access_claims():
+    """Claims of the ``access_token`` cookie, or None when absent or invalid"""
+    return _claims('access_claims', request.cookies.get('access_token'))
+
+
+def bearer_claims():
+    """Claims of the ``Authorization: Bearer`` token, or None when absent or invalid"""
+    auth_header = request.headers.get('Authorization')
+    token = auth_header.split(' ')[1] if auth_header and auth_header.startswith('Bearer ') else None
+    return _claims('bearer_claims', token)
+
+
+class RoleCache:
+    """Short-TTL cache of role/status/permissions per login_users email.
+
+    Entries live in the configured cache backend (``helper.cache_backend``).
+    Mutating routes call ``invalidate(email)`` after commit; with the
+    ``shared`` or ``redis`` backend every worker sees the change at once,
+    with ``local`` only this worker does and the others after the TTL.
+    """
+
+    NAMESPACE = "roles"
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _count(self, event, count=1):
+        with self._lock:
+            self._stats[event] += count
+
+    def lookup(self, cursor, email):
+        """Return {'role', 'status', 'permissions'} for email, or None if unknown"""
+        backend = get_cache_backend()
+        if self.ttl > 0:
+            payload = backend.get(self.NAMESPACE, email)
+            if payload is not None:
+                self._count("hits")
+                return json.loads(payload)
+        self._count("misses")
+        cursor.execute("SELECT role, status, permissions FROM login_users WHERE email = %s", (email,))
+        row = cursor.fetchone()
+        record = dict(row) if row is not None else None
+        if self.ttl > 0:
+            backend.set(self.NAMESPACE, email, json.dumps(record, default=str).encode('utf-8'), self.ttl)
+        return record
+
+    def role_for(self, cursor, email):
+        record = self.lookup(cursor, email)
+        return record['role'] if record else None
+
+    def invalidate(self, *emails):
+        backend = get_cache_backend()
+        for email in emails:
+            backend.delete(self.NAMESPACE, email)
+        self._count("invalidations", len(emails))
+
+    def clear(self):
+        get_cache_backend().invalidate(self.NAMESPACE)
+        self._count("invalidations")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["backend"] = get_cache_backend().name
+        return stats
+
+
+_role_cache = None
+_role_cache_lock = threading.Lock()
+
+
+def get_role_cache():
+    global _role_cache
+    if _role_cache is None:
+        with _role_cache_lock:
+            if _role_cache is None:
+                _role_cache = RoleCache(ttl=float(os.getenv("AUTH_ROLE_CACHE_TTL", 30)))
+    return _role_cache
+
+
+def role_cache_stats():
+    return _role_cache.stats() if _role_cache is not None else None
@@ -0,0 +1,306 @@
+from helper.seat_inventory import (
+    REDEEM_HOLD_CTE, gather_seats, seat_summary, take_seats_cte
+)
+
+
+PAYMENT_COLUMNS = ('payment_id', 'booking_id', 'user_email', 'amount', 'payment_method',
+                   'payment_status', 'payment_date')
+
+FLIGHT_COLUMNS = ('flight_id', 'departure_city_code', 'arrival_city_code', 'departure_datetime')
+
+# Seats are taken first (see helper.seat_inventory): a bucket or the
+# flights row is decremented under a row lock that re-checks the seat count
+# once granted. Booking and payment rows are only written when the
+# decrement succeeded, all in one round trip.
+BOOK_SQL = """
+    WITH {take_seats}, booking AS (
+        INSERT INTO bookings (user_name, user_email, flight_id, city_origin, city_destination, price, booking_date, status, num_seats)
+        SELECT %(user_name)s, %(user_email)s, flight_id, departure_city_code, arrival_city_code, %(amount)s, NOW(), 'confirmed', seats
+        FROM seat
+        RETURNING *
+    ), payment AS (
+        INSERT INTO flight_payments (booking_id, user_email, amount, payment_method, payment_status, payment_date)
+        SELECT booking_id, %(payer_email)s, %(amount)s, %(payment_method)s, 'completed', NOW()
+        FROM booking
+        RETURNING *
+    )
+    SELECT booking.*, {payment_columns}, {flight_columns}
+    FROM seat, booking, payment
+"""
+
+
+def _book_sql(take_seats):
+    return BOOK_SQL.format(
+        take_seats=take_seats,
+        payment_columns=", ".join(f"payment.{c} AS payment__{c}" for c in PAYMENT_COLUMNS),
+        flight_columns=", ".join(f"seat.{c} AS flight__{c}" for c in FLIGHT_COLUMNS),
+    )
+
+
+BOOK_SQL_SKIP_LOCKED = _book_sql(take_seats_cte(wait=False))
+BOOK_SQL_WAIT = _book_sql(take_seats_cte(wait=True))
+BOOK_HOLD_SQL = _book_sql(REDEEM_HOLD_CTE)
+
+
+class BookingFailed(Exception):
+    """A booking was refused; ``reason`` is a stable machine-readable code"""
+
+    def __init__(self, reason, message, http_status=400, **details):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.http_status = http_status
+        self.details = details
+
+    def to_dict(self):
+        return {"message": self.message, "reason": self.reason, **self.details}
+
+
+class CascadeIncomplete(Exception):
+    """Cancelling a flight's bookings stopped part way; ``totals`` were committed"""
+
+    def __init__(self, totals):
+        super().__init__("Booking cancellation cascade stopped part way")
+        self.totals = totals
+
+
+def parse_seat_count(value):
+    try:
+        seats = int(value)
+    except (TypeError, ValueError):
+        raise BookingFailed("invalid_seat_count", "num_seats must be a whole number")
+    if seats < 1:
+        raise BookingFailed("invalid_seat_count", "num_seats must be at least 1")
+    return seats
+
+
+def _split(row):
+    booking, payment, flight = {}, {}, {}
+    for key, value in row.items():
+        if key.startswith('payment__'):
+            payment[key[len('payment__'):]] = value
+        elif key.startswith('flight__'):
+            flight[key[len('flight__'):]] = value
+        else:
+            booking[key] = value
+    return booking, payment, flight
+
+
+def _refusal(seats, available):
+    if available <= 0:
+        return BookingFailed("sold_out", "Flight is sold out", 409, seats_available=0, seats_requested=seats)
+    return BookingFailed("insufficient_seats", "Not enough seats available", 409,
+                         seats_available=available, seats_requested=seats)
+
+
+def take_seats(cursor, statement_skip_locked, statement_wait, params, release_expired=None):
+    """Run a statement built on ``take_seats_cte`` and return its row.
+
+    The first attempt skips locked buckets. Only when nothing was written
+    does this work out why: expired holds on the flight are released, and
+    for bucketed flights the statement is retried waiting on bucket locks.
+    A request larger than every bucket first has only its shortfall moved
+    onto the flights row (``gather_seats``), as does a failed retry before
+    the last attempt; the other buckets keep serving bookings in parallel.
+    Raises ``BookingFailed`` when the seats really are not there.
+
+    ``release_expired(flight_id)`` must release the flight's expired holds
+    in a transaction of its own and return the affected rows (see
+    ``HoldSweeper.release_flight``); doing it in the caller's transaction
+    would be undone whenever the booking is refused. Without it, expired
+    holds are left to the sweeper.
+    """
+    flight_id, seats = params["flight_id"], params["seats"]
+    cursor.execute(statement_skip_locked, params)
+    row = cursor.fetchone()
+    if row is not None:
+        return row
+
+    summary = seat_summary(cursor, flight_id)
+    if summary is None:
+        raise BookingFailed("flight_not_found", "Flight not found", 404)
+    if summary[3] == 'cancelled':
+        raise BookingFailed("flight_cancelled", "Flight has been cancelled", 409)
+    if release_expired is not None and release_expired(flight_id):
+        summary = seat_summary(cursor, flight_id)
+    on_flight, in_buckets, largest_bucket, _ = summary
+    if on_flight + in_buckets < seats:
+        raise _refusal(seats, on_flight + in_buckets)
+
+    if in_buckets and largest_bucket < seats:
+        gather_seats(cursor, flight_id, seats)
+    cursor.execute(statement_wait, params)
+    row = cursor.fetchone()
+    if row is None and in_buckets:
+        gather_seats(cursor, flight_id, seats)
+        cursor.execute(statement_wait, params)
+        row = cursor.fetchone()
+    if row is None:
+        on_flight, in_buckets, _, _ = seat_summary(cursor, flight_id)
+        raise _refusal(seats, on_flight + in_buckets)
+    return row
+
+
+def explain_hold_failure(cursor, hold_token, holder_email, flight_id):
+    cursor.execute("SELECT flight_id, user_email, expires_at <= NOW() AS expired FROM seat_holds WHERE hold_token = %s",
+                   (hold_token,))
+    row = cursor.fetchone()
+    if row is None or row['user_email'] != holder_email:
+        return BookingFailed("hold_not_found", "Seat hold not found or already used", 404)
+    if row['flight_id'] != flight_id:
+        return BookingFailed("hold_flight_mismatch", "Seat hold is for a different flight", 409,
+                             hold_flight_id=row['flight_id'])
+    if row['expired']:
+        return BookingFailed("hold_expired", "Seat hold has expired", 410)
+    summary = seat_summary(cursor, flight_id)
+    if summary is not None and summary[3] == 'cancelled':
+        return BookingFailed("flight_cancelled", "Flight has been cancelled", 409)
+    return BookingFailed("hold_not_found", "Seat hold not found or already used", 404)
+
+
+def book_seats(cursor, flight_id, seats, user_name, user_email, amount, payment_method,
+               payer_email=None, hold_token=None, release_expired=None):
+    """Take seats and record the booking and its payment in one statement.
+
+    With ``hold_token`` the seats come from that hold (owned by
+    ``payer_email``) instead, and ``seats`` is ignored. Returns
+    ``(booking, payment, flight)`` dicts; raises ``BookingFailed`` when
+    nothing was written. ``release_expired`` is passed on to
+    ``take_seats``. The caller owns the transaction.
+    """
+    params = {
+        "flight_id": flight_id,
+        "seats": seats,
+        "user_name": user_name,
+        "user_email": user_email,
+        "payer_email": payer_email or user_email,
+        "amount": amount,
+        "payment_method": payment_method,
+    }
+    if hold_token:
+        params.update({"hold_token": hold_token, "holder_email": params["payer_email"]})
+        cursor.execute(BOOK_HOLD_SQL, params)
+        row = cursor.fetchone()
+        if row is None:
+            raise explain_hold_failure(cursor, hold_token, params["holder_email"], flight_id)
+    else:
+        row = take_seats(cursor, BOOK_SQL_SKIP_LOCKED, BOOK_SQL_WAIT, params, release_expired)
+    return _split(row)
+
+
+# Cancels the bookings selected by {target}: seats go back to the flights
+# row, completed payments become refunds. One statement per call, so a
+# booking is never cancelled without its seats and payment following.
+CANCEL_SQL = """
+    WITH target AS (
+        {target}
+    ), cancelled AS (
+        UPDATE bookings b
+        SET status = 'cancelled'
+        FROM target
+        WHERE b.booking_id = target.booking_id
+        RETURNING b.*
+    ), seats AS (
+        SELECT flight_id, SUM(num_seats)::integer AS seats
+        FROM cancelled
+        GROUP BY flight_id
+    ), released AS (
+        UPDATE flights f
+        SET seats_available = f.seats_available + seats.seats
+        FROM seats
+        WHERE f.flight_id = seats.flight_id
+        RETURNING f.flight_id, f.departure_city_code, f.arrival_city_code, f.departure_datetime
+    ), refunded AS (
+        UPDATE flight_payments p
+        SET payment_status = 'refunded'
+        FROM cancelled
+        WHERE p.booking_id = cancelled.booking_id AND p.payment_status = 'completed'
+        RETURNING p.payment_id, p.amount
+    )
+    {result}
+"""
+
+CANCEL_BOOKING_SQL = CANCEL_SQL.format(
+    target="""
+        SELECT booking_id FROM bookings
+        WHERE booking_id = %(booking_id)s AND status IS DISTINCT FROM 'cancelled'
+        FOR UPDATE
+    """,
+    result="""
+        SELECT cancelled.*,
+               (SELECT COUNT(*) FROM refunded)::integer AS refunded_payments,
+               (SELECT COALESCE(SUM(amount), 0) FROM refunded) AS refunded_amount,
+               released.departure_city_code, released.arrival_city_code, released.departure_datetime
+        FROM cancelled
+        LEFT JOIN released ON released.flight_id = cancelled.flight_id
+    """,
+)
+
+CANCEL_FLIGHT_BATCH_SQL = CANCEL_SQL.format(
+    target="""
+        SELECT booking_id FROM bookings
+        WHERE flight_id = %(flight_id)s AND status IS DISTINCT FROM 'cancelled'
+        ORDER BY booking_id
+        LIMIT %(limit)s
+        FOR UPDATE
+    """,
+    result="""
+        SELECT (SELECT COUNT(*) FROM cancelled)::integer AS bookings,
+               (SELECT COALESCE(SUM(seats), 0) FROM seats)::integer AS seats,
+               (SELECT COUNT(*) FROM refunded)::integer AS payments,
+               (SELECT COALESCE(SUM(amount), 0) FROM refunded) AS refunded_amount
+    """,
+)
+
+_CANCEL_EXTRA_COLUMNS = ('refunded_payments', 'refunded_amount', 'departure_city_code',
+                         'arrival_city_code', 'departure_datetime')
+
+
+def cancel_and_refund_booking(cursor, booking_id):
+    """Cancel one booking, release its seats and refund its payment.
+
+    Returns ``(booking, refund, flight)`` or None when the booking does
+    not exist or was already cancelled. The caller owns the transaction.
+    """
+    cursor.execute(CANCEL_BOOKING_SQL, {"booking_id": booking_id})
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    booking = {k: v for k, v in row.items() if k not in _CANCEL_EXTRA_COLUMNS}
+    refund = {"payments": row['refunded_payments'], "amount": row['refunded_amount']}
+    flight = {
+        "flight_id": row['flight_id'],
+        "departure_city_code": row['departure_city_code'],
+        "arrival_city_code": row['arrival_city_code'],
+        "departure_datetime": row['departure_datetime'],
+    }
+    return booking, refund, flight
+
+
+def cancel_flight_bookings(db, cursor, flight_id, batch_size=500):
+    """Cancel every live booking of a flight, committing one batch at a time.
+
+    Safe to re-run: only bookings that are not cancelled yet are picked up.
+    Returns totals of bookings cancelled, seats released and payments refunded.
+    A failing batch is rolled back and ``CascadeIncomplete`` carries the
+    totals of the batches already committed.
+    """
+    totals = {"bookings": 0, "seats": 0, "payments": 0, "refunded_amount": 0, "batches": 0}
+    try:
+        while True:
+            cursor.execute(CANCEL_FLIGHT_BATCH_SQL, {"flight_id": flight_id, "limit": batch_size})
+            row = cursor.fetchone()
+            db.commit()
+            if not row['bookings']:
+                break
+            totals["batches"] += 1
+            for key in ("bookings", "seats", "payments", "refunded_amount"):
+                totals[key] += row[key]
+            if row['bookings'] < batch_size:
+                break
+    except Exception as e:
+        db.rollback()
+        totals["refunded_amount"] = float(totals["refunded_amount"])
+        raise CascadeIncomplete(totals) from e
+    totals["refunded_amount"] = float(totals["refunded_amount"])
+    return totals
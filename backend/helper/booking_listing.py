@@ -0,0 +1,149 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from helper.rowset import fetch_rowset
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# One row per booking: the latest payment is picked with a lateral subquery
+# so a booking with several payment rows cannot repeat across pages
+BOOKING_LIST_SELECT = """
+    SELECT b.booking_id, b.user_email, b.user_name, b.flight_id,
+           f.departure_city_code, f.arrival_city_code, f.departure_datetime,
+           f.airline, b.status, b.booking_date, b.price,
+           fp.amount as payment_amount, fp.payment_method, fp.payment_status
+    FROM bookings b
+    JOIN flights f ON b.flight_id = f.flight_id
+    LEFT JOIN LATERAL (
+        SELECT p.amount, p.payment_method, p.payment_status
+        FROM flight_payments p
+        WHERE p.booking_id = b.booking_id
+        ORDER BY p.payment_id DESC
+        LIMIT 1
+    ) fp ON TRUE
+"""
+
+class BookingListParamError(ValueError):
+    pass
+
+
+def encode_cursor(booking_date, booking_id):
+    """Opaque keyset position of the last row on a page; ``booking_date`` may be None"""
+    day = booking_date.isoformat() if booking_date is not None else None
+    raw = json.dumps([day, booking_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        booking_date, booking_id = json.loads(raw)
+        if booking_date is not None:
+            booking_date = datetime.fromisoformat(booking_date)
+        return booking_date, int(booking_id)
+    except (ValueError, TypeError):
+        raise BookingListParamError("Invalid cursor")
+
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d')
+    except ValueError:
+        raise BookingListParamError(f"Invalid {name}, expected YYYY-MM-DD")
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise BookingListParamError("limit must be a whole number")
+    if limit < 1:
+        raise BookingListParamError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_booking_filters(args):
+    """Read status/user/origin/destination/from/to from the query string"""
+    filters = {}
+    for name in ('status', 'user', 'origin', 'destination'):
+        value = (args.get(name) or '').strip()
+        if value:
+            filters[name] = value
+    if args.get('from'):
+        filters['date_from'] = _parse_day(args['from'], 'from')
+    if args.get('to'):
+        # "to" is inclusive of the whole day
+        filters['date_to'] = _parse_day(args['to'], 'to') + timedelta(days=1)
+    if args.get('cursor'):
+        filters['after'] = decode_cursor(args['cursor'])
+    return filters
+
+
+def build_bookings_query(filters, limit=None):
+    """Build the keyset query, newest first.
+
+    ``filters['after']`` is a decoded cursor; rows strictly older than it
+    in ``(booking_date, booking_id)`` order are returned. Bookings without
+    a date sort first (``DESC`` puts NULLs first, as the indexes do).
+    """
+    query = BOOKING_LIST_SELECT + " WHERE TRUE"
+    params = []
+
+    if 'status' in filters:
+        query += " AND b.status = %s"
+        params.append(filters['status'])
+
+    if 'user' in filters:
+        query += " AND lower(b.user_email) = lower(%s)"
+        params.append(filters['user'])
+
+    if 'origin' in filters:
+        query += " AND b.city_origin = %s"
+        params.append(filters['origin'])
+
+    if 'destination' in filters:
+        query += " AND b.city_destination = %s"
+        params.append(filters['destination'])
+
+    if 'date_from' in filters:
+        query += " AND b.booking_date >= %s"
+        params.append(filters['date_from'])
+
+    if 'date_to' in filters:
+        query += " AND b.booking_date < %s"
+        params.append(filters['date_to'])
+
+    if 'after' in filters:
+        booking_date, booking_id = filters['after']
+        if booking_date is None:
+            # Still inside the undated rows; every dated row comes after them
+            query += " AND (b.booking_date IS NOT NULL OR b.booking_id < %s)"
+            params.append(booking_id)
+        else:
+            # A NULL date compares as unknown, so undated rows stay behind
+            query += " AND (b.booking_date, b.booking_id) < (%s, %s)"
+            params.extend((booking_date, booking_id))
+
+    query += " ORDER BY b.booking_date DESC, b.booking_id DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, tuple(params)
+
+
+def fetch_bookings_page(cursor, filters, limit):
+    """Return (RowSet, next_cursor) from a plain cursor; next_cursor is None on the last page"""
+    query, params = build_bookings_query(filters, limit + 1)
+    cursor.execute(query, params)
+    rows = fetch_rowset(cursor)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['booking_date'], last['booking_id'])
+    return rows, next_cursor
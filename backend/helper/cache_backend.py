@@ -0,0 +1,455 @@
+"""Pluggable cache storage shared by the in-process caches.
+
+Three backends share one API: byte values under ``(namespace, key)``
+with a TTL, plus ``invalidate(namespace)``, which bumps the namespace's
+version counter so every entry written under the old version becomes
+unreachable at once. They also share one metrics surface: ``stats()``
+and the ``cache_events_total`` counter in /metrics.
+
+* ``local``  - per-process LRU (the default)
+* ``shared`` - fixed-size slots in a POSIX shared-memory segment that
+  every worker on the host maps, so entries are shared and survive worker
+  restarts. Lookups are lock-free (a per-slot sequence counter detects
+  torn reads); writers lock only the slot set they write to.
+* ``redis``  - a local Redis-compatible server (needs the ``redis``
+  package)
+
+``CACHE_BACKEND`` picks one; a backend that cannot start falls back to
+``local`` with an error in the log.
+"""
+import hashlib
+import logging
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+from helper.metrics import get_metrics
+
+
+log = logging.getLogger(__name__)
+
+BACKENDS = ('local', 'shared', 'redis')
+
+EVENTS = ('hits', 'misses', 'sets', 'deletes', 'evictions', 'rejected', 'invalidations', 'errors')
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+class CacheBackend:
+    """Common front: namespacing, versioned invalidation, error isolation and stats.
+
+    Subclasses implement ``_get``, ``_set``, ``_delete``, ``_version`` and
+    ``_bump`` on raw byte keys. A failing backend behaves like a miss.
+    """
+
+    name = None
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = dict.fromkeys(EVENTS, 0)
+
+    def _record(self, namespace, event, count=1):
+        with self._stats_lock:
+            self._stats[event] += count
+        get_metrics().inc("cache_events_total", (namespace, self.name, event), count)
+
+    def _key(self, namespace, version, key):
+        return f"{namespace}\x00{version}\x00{key}".encode('utf-8')
+
+    def get(self, namespace, key):
+        try:
+            value = self._get(self._key(namespace, self._version(namespace), key))
+        except Exception as e:
+            self._record(namespace, 'errors')
+            log.warning("Cache get failed: %s", e, extra={"backend": self.name, "namespace": namespace})
+            return None
+        self._record(namespace, 'hits' if value is not None else 'misses')
+        return value
+
+    def set(self, namespace, key, value, ttl):
+        """Store ``value`` (bytes) for ``ttl`` seconds; False if it was not stored"""
+        try:
+            stored = self._set(self._key(namespace, self._version(namespace), key), value, ttl, namespace)
+        except Exception as e:
+            self._record(namespace, 'errors')
+            log.warning("Cache set failed: %s", e, extra={"backend": self.name, "namespace": namespace})
+            return False
+        self._record(namespace, 'sets' if stored else 'rejected')
+        return stored
+
+    def delete(self, namespace, key):
+        try:
+            self._delete(self._key(namespace, self._version(namespace), key))
+        except Exception as e:
+            self._record(namespace, 'errors')
+            log.warning("Cache delete failed: %s", e, extra={"backend": self.name, "namespace": namespace})
+            return
+        self._record(namespace, 'deletes')
+
+    def invalidate(self, namespace):
+        """Drop every entry of ``namespace``, in every process using this backend"""
+        try:
+            self._bump(namespace)
+        except Exception as e:
+            self._record(namespace, 'errors')
+            log.warning("Cache invalidation failed: %s", e, extra={"backend": self.name, "namespace": namespace})
+            return
+        self._record(namespace, 'invalidations')
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats, backend=self.name)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
+
+
+class LocalLRUCache(CacheBackend):
+    """Per-process LRU with per-entry expiry"""
+
+    name = 'local'
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (value, expires_at, namespace)
+        self._versions = {}
+        self._bytes = 0
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                self._bytes -= len(self._entries.pop(key)[0])
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _set(self, key, value, ttl, namespace):
+        if ttl <= 0 or len(value) > self.max_bytes:
+            return False
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (value, time.monotonic() + ttl, namespace)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (old_value, _, old_namespace) = self._entries.popitem(last=False)
+                self._bytes -= len(old_value)
+                evicted.append(old_namespace)
+        for old_namespace in evicted:
+            self._record(old_namespace, 'evictions')
+        return True
+
+    def _delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= len(entry[0])
+
+    def _version(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def _bump(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update({"entries": len(self._entries), "bytes": self._bytes,
+                          "max_entries": self.max_entries, "max_bytes": self.max_bytes})
+        return stats
+
+
+class SharedMemoryCache(CacheBackend):
+    """Set-associative cache in a named shared-memory segment.
+
+    Layout: a header, ``VERSION_SLOTS`` 64-bit namespace version counters,
+    then ``slots`` slots of ``slot_size`` bytes grouped in sets of
+    ``ways``. A key lives in the set picked by its hash; a full set evicts
+    the slot that expires first. Each slot starts with a sequence number
+    that is odd while a write is in progress, so readers retry (or miss)
+    instead of returning a torn value. Writers of the same set are
+    serialized by a ``lockf`` byte-range lock on ``lock_path`` (between
+    processes) and a thread lock (within one).
+    """
+
+    name = 'shared'
+
+    MAGIC = b'FBC1'
+    HEADER = struct.Struct('<4sIII')            # magic, slots, slot_size, ways
+    HEADER_SIZE = 64
+    VERSION_SLOTS = 256
+    SLOT_HEADER = struct.Struct('<IIQdHHI')     # seq, pad, key hash, expires_at, key len, pad, value len
+    SEQ = struct.Struct('<I')
+    VERSION = struct.Struct('<Q')
+    THREAD_STRIPES = 64
+
+    def __init__(self, segment_name, slots=4096, slot_size=1024, ways=4, lock_path=None):
+        import fcntl  # POSIX only; raises ImportError elsewhere and the caller falls back
+
+        super().__init__()
+        if slots % ways:
+            raise ValueError("CACHE_SHM_SLOTS must be a multiple of CACHE_SHM_WAYS")
+        if slot_size <= self.SLOT_HEADER.size:
+            raise ValueError(f"CACHE_SHM_SLOT_SIZE must be larger than {self.SLOT_HEADER.size}")
+        self._fcntl = fcntl
+        self.segment_name = segment_name
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ways = ways
+        self.sets = slots // ways
+        self._versions_offset = self.HEADER_SIZE
+        self._slots_offset = self.HEADER_SIZE + self.VERSION_SLOTS * self.VERSION.size
+        self._shm = self._open(self._slots_offset + slots * slot_size)
+        self._buf = self._shm.buf
+        self._lock_fd = os.open(lock_path or f"/tmp/{segment_name}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_locks = [threading.Lock() for _ in range(self.THREAD_STRIPES)]
+
+    def _open(self, size):
+        # Not tracked: the segment must outlive the process that created it
+        def attach(create):
+            try:
+                return shared_memory.SharedMemory(self.segment_name, create=create, size=size, track=False)
+            except TypeError:
+                shm = shared_memory.SharedMemory(self.segment_name, create=create, size=size)
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+                return shm
+
+        try:
+            shm = attach(True)
+            self.HEADER.pack_into(shm.buf, 0, self.MAGIC, self.slots, self.slot_size, self.ways)
+            return shm
+        except FileExistsError:
+            shm = attach(False)
+        deadline = time.monotonic() + 1.0
+        while True:
+            header = self.HEADER.unpack_from(shm.buf, 0)
+            if header[0] == self.MAGIC or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)    # the creating process has not written the header yet
+        if header != (self.MAGIC, self.slots, self.slot_size, self.ways) or shm.size < size:
+            shm.close()
+            raise ValueError(f"Shared cache segment {self.segment_name!r} exists with a different layout; "
+                             f"remove /dev/shm/{self.segment_name} after stopping every worker")
+        return shm
+
+    def _locked(self, lock_index):
+        backend = self
+
+        class _Lock:
+            def __enter__(self):
+                self.thread_lock = backend._thread_locks[lock_index % backend.THREAD_STRIPES]
+                self.thread_lock.acquire()
+                try:
+                    backend._fcntl.lockf(backend._lock_fd, backend._fcntl.LOCK_EX, 1, lock_index, os.SEEK_SET)
+                except Exception:
+                    self.thread_lock.release()
+                    raise
+
+            def __exit__(self, *exc):
+                try:
+                    backend._fcntl.lockf(backend._lock_fd, backend._fcntl.LOCK_UN, 1, lock_index, os.SEEK_SET)
+                finally:
+                    self.thread_lock.release()
+
+        return _Lock()
+
+    def _slot_offsets(self, key_hash):
+        first = (key_hash % self.sets) * self.ways
+        return [self._slots_offset + (first + way) * self.slot_size for way in range(self.ways)]
+
+    def _read(self, offset, key, key_hash):
+        """Value stored at ``offset`` for ``key``, None on a miss or an unstable slot"""
+        buf = self._buf
+        for _ in range(3):
+            seq, _, slot_hash, expires_at, key_len, _, value_len = self.SLOT_HEADER.unpack_from(buf, offset)
+            if seq & 1:
+                continue
+            if slot_hash != key_hash:
+                return None
+            start = offset + self.SLOT_HEADER.size
+            data = bytes(buf[start:start + key_len + value_len])
+            if self.SEQ.unpack_from(buf, offset)[0] != seq:
+                continue
+            if expires_at <= time.time() or data[:key_len] != key:
+                return None
+            return data[key_len:]
+        return None
+
+    def _get(self, key):
+        key_hash = _hash64(key)
+        for offset in self._slot_offsets(key_hash):
+            value = self._read(offset, key, key_hash)
+            if value is not None:
+                return value
+        return None
+
+    def _write(self, offset, key_hash, expires_at, key, value):
+        buf = self._buf
+        seq = self.SEQ.unpack_from(buf, offset)[0]
+        self.SEQ.pack_into(buf, offset, seq + 1)
+        start = offset + self.SLOT_HEADER.size
+        buf[start:start + len(key) + len(value)] = key + value
+        self.SLOT_HEADER.pack_into(buf, offset, seq + 1, 0, key_hash, expires_at, len(key), 0, len(value))
+        self.SEQ.pack_into(buf, offset, seq + 2)
+
+    def _set(self, key, value, ttl, namespace):
+        if ttl <= 0 or len(key) + len(value) > self.slot_size - self.SLOT_HEADER.size:
+            return False
+        key_hash = _hash64(key)
+        offsets = self._slot_offsets(key_hash)
+        now = time.time()
+        evicted = False
+        with self._locked(key_hash % self.sets):
+            target = None
+            oldest = None
+            for offset in offsets:
+                _, _, slot_hash, expires_at, key_len, _, _ = self.SLOT_HEADER.unpack_from(self._buf, offset)
+                start = offset + self.SLOT_HEADER.size
+                if slot_hash == key_hash and bytes(self._buf[start:start + key_len]) == key:
+                    target = offset
+                    break
+                if expires_at <= now:
+                    target = target or offset
+                elif oldest is None or expires_at < oldest[0]:
+                    oldest = (expires_at, offset)
+            if target is None:
+                target = oldest[1]
+                evicted = True
+            self._write(target, key_hash, now + ttl, key, value)
+        if evicted:
+            self._record(namespace, 'evictions')
+        return True
+
+    def _delete(self, key):
+        key_hash = _hash64(key)
+        with self._locked(key_hash % self.sets):
+            for offset in self._slot_offsets(key_hash):
+                if self._read(offset, key, key_hash) is not None:
+                    self._write(offset, 0, 0.0, b'', b'')
+
+    def _version_offset(self, namespace):
+        return self._versions_offset + (_hash64(namespace.encode('utf-8')) % self.VERSION_SLOTS) * self.VERSION.size
+
+    def _version(self, namespace):
+        return self.VERSION.unpack_from(self._buf, self._version_offset(namespace))[0]
+
+    def _bump(self, namespace):
+        offset = self._version_offset(namespace)
+        # Version counters lock past the last slot set
+        with self._locked(self.sets + (offset - self._versions_offset) // self.VERSION.size):
+            self.VERSION.pack_into(self._buf, offset, self.VERSION.unpack_from(self._buf, offset)[0] + 1)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"segment": self.segment_name, "slots": self.slots,
+                      "slot_size": self.slot_size, "ways": self.ways})
+        return stats
+
+
+class RedisCache(CacheBackend):
+    """Client for a local Redis-compatible server; namespace versions are INCR counters"""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='flightbooking:', timeout=0.05):
+        import redis  # optional dependency, only needed for CACHE_BACKEND=redis
+
+        super().__init__()
+        self.url = url
+        self.prefix = prefix.encode('utf-8')
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._client.ping()
+
+    def _get(self, key):
+        return self._client.get(self.prefix + key)
+
+    def _set(self, key, value, ttl, namespace):
+        if ttl <= 0:
+            return False
+        return bool(self._client.set(self.prefix + key, value, px=max(1, int(ttl * 1000))))
+
+    def _delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def _version_key(self, namespace):
+        return self.prefix + b'version:' + namespace.encode('utf-8')
+
+    def _version(self, namespace):
+        return int(self._client.get(self._version_key(namespace)) or 0)
+
+    def _bump(self, namespace):
+        self._client.incr(self._version_key(namespace))
+
+    def stats(self):
+        stats = super().stats()
+        stats["url"] = self.url.split('@')[-1]
+        return stats
+
+
+def create_backend(kind):
+    if kind == 'shared':
+        return SharedMemoryCache(
+            os.getenv("CACHE_SHM_NAME", "flight_booking_cache"),
+            slots=int(os.getenv("CACHE_SHM_SLOTS", 4096)),
+            slot_size=int(os.getenv("CACHE_SHM_SLOT_SIZE", 1024)),
+            ways=int(os.getenv("CACHE_SHM_WAYS", 4)),
+            lock_path=os.getenv("CACHE_SHM_LOCK_FILE") or None,
+        )
+    if kind == 'redis':
+        return RedisCache(
+            os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"),
+            prefix=os.getenv("CACHE_REDIS_PREFIX", "flightbooking:"),
+            timeout=float(os.getenv("CACHE_REDIS_TIMEOUT", 0.05)),
+        )
+    return LocalLRUCache(
+        max_entries=int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", 10000)),
+        max_bytes=int(os.getenv("CACHE_LOCAL_MAX_BYTES", 64 * 1024 * 1024)),
+    )
+
+
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+def get_cache_backend():
+    """Return this process's backend (re-created after fork, e.g. for Redis sockets)"""
+    global _backend, _backend_pid
+    pid = os.getpid()
+    if _backend is not None and _backend_pid == pid:
+        return _backend
+    with _backend_lock:
+        if _backend is None or _backend_pid != pid:
+            kind = os.getenv("CACHE_BACKEND", "local").strip().lower()
+            if kind not in BACKENDS:
+                log.error("Unknown CACHE_BACKEND %r, using local", kind)
+                kind = 'local'
+            try:
+                _backend = create_backend(kind)
+            except Exception as e:
+                log.error("Cache backend %r unavailable, using local: %s", kind, e)
+                _backend = create_backend('local')
+            _backend_pid = pid
+    return _backend
+
+
+def cache_backend_stats():
+    if _backend is None or _backend_pid != os.getpid():
+        return None
+    return _backend.stats()
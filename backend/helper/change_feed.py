@@ -0,0 +1,261 @@
+"""Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+Routes call ``publish(entity, *ids)`` after committing a write. Events are
+queued, batched, and sent with ``pg_notify`` by a background thread.
+Each worker runs that thread, and it LISTENs on the same dedicated
+(unpooled) connection, so publishing never waits on the database.
+
+A notification carries the publisher's id, a per-publisher sequence number
+and a list of ``[entity, id]`` pairs. Each worker applies the events of
+other publishers through the handlers registered with ``subscribe()``. Its
+own events were already applied locally by the route.
+
+A worker whose view may have missed events flushes everything through
+``on_reset``. That happens when:
+
+* its listener reconnects after losing the connection
+* a publisher's sequence number skips
+* a publisher broadcasts a reset because it had to drop queued events
+
+Events carry no per-entity version. They are invalidations only: handlers
+drop cache entries or re-read the named rows, and a publisher sends an
+event only after its write committed. An event that arrives late, twice
+or out of order still leads to a fresh read of what is committed, so a
+version to compare against would never change the outcome. The only risk
+is a lost event, and the sequence numbers catch that.
+"""
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import uuid
+
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "flight_booking_changes"
+
+# pg_notify payloads must stay below 8000 bytes
+MAX_PAYLOAD = 7500
+
+RESET = "*"
+
+
+class ChangeFeed:
+    def __init__(self, connect, channel=CHANNEL, on_reset=None, subscriptions=(), max_queue=10000,
+                 reconnect_delay=1.0):
+        self._connect = connect
+        self.channel = channel
+        self._on_reset = on_reset
+        self.reconnect_delay = reconnect_delay
+        self.origin = uuid.uuid4().hex[:12]
+        self._handlers = dict(subscriptions)
+        self._queue = queue.Queue(max_queue)
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._sequence = 0
+        self._last_seen = {}     # publisher -> last sequence number
+        self._dropped = False
+        self._listened = False
+        self._online = False
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "notifications_sent": 0, "received": 0, "applied": 0,
+                       "dropped": 0, "resets": 0, "reconnects": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def _count(self, event, count=1):
+        with self._lock:
+            self._stats[event] += count
+
+    def subscribe(self, entity, handler):
+        """Call ``handler(ids)`` for every batch of ``entity`` events from other workers"""
+        self._handlers[entity] = handler
+
+    def publish(self, entity, *ids):
+        for id_ in ids:
+            try:
+                self._queue.put_nowait((entity, str(id_)))
+            except queue.Full:
+                # Other workers learn about the loss through a reset broadcast
+                self._dropped = True
+                self._count("dropped")
+                continue
+            self._count("published")
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass    # a wake-up is already pending
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            db = None
+            try:
+                db = self._connect()
+                db.autocommit = True
+                cursor = db.cursor()
+                cursor.execute(f"LISTEN {self.channel}")
+                self._online = True
+                if self._listened:
+                    # Notifications sent while we were away are gone
+                    self._count("reconnects")
+                    self._reset("listener reconnected")
+                self._listened = True
+                delay = self.reconnect_delay
+                self._listen(db, cursor)
+            except Exception as e:
+                self._count("errors")
+                log.warning("Change feed connection lost: %s", e)
+            finally:
+                self._online = False
+                if db is not None:
+                    try:
+                        db.close()
+                    except Exception:
+                        pass
+            self._stop.wait(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _listen(self, db, cursor):
+        while not self._stop.is_set():
+            if self._dropped:
+                self._dropped = False
+                self._notify(cursor, [[RESET, ""]])
+            self._send_pending(cursor)
+            ready, _, _ = select.select([db, self._wake_r], [], [], 5.0)
+            if self._wake_r in ready:
+                try:
+                    while os.read(self._wake_r, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            if db in ready:
+                db.poll()
+                while db.notifies:
+                    self._receive(db.notifies.pop(0).payload)
+
+    def _send_pending(self, cursor):
+        batch, size = [], 0
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            event_size = len(event[0]) + len(event[1]) + 8
+            if batch and size + event_size > MAX_PAYLOAD:
+                self._notify(cursor, batch)
+                batch, size = [], 0
+            batch.append(list(event))
+            size += event_size
+        if batch:
+            self._notify(cursor, batch)
+
+    def _notify(self, cursor, events):
+        self._sequence += 1
+        payload = json.dumps({"o": self.origin, "s": self._sequence, "e": events}, separators=(',', ':'))
+        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+        self._count("notifications_sent")
+
+    def _receive(self, payload):
+        try:
+            message = json.loads(payload)
+            origin, sequence = message["o"], message["s"]
+            events = [(entity, id_) for entity, id_ in message["e"]]
+        except (ValueError, KeyError, TypeError):
+            self._count("errors")
+            log.warning("Ignoring malformed change notification", extra={"payload": payload[:200]})
+            return
+        if origin == self.origin:
+            return
+        self._count("received")
+        last = self._last_seen.get(origin)
+        self._last_seen[origin] = sequence
+        if any(entity == RESET for entity, _ in events):
+            self._reset("publisher dropped events")
+            return
+        if last is not None and sequence != last + 1:
+            self._reset("missed notifications")
+            return
+
+        by_entity = {}
+        for entity, id_ in events:
+            by_entity.setdefault(entity, []).append(id_)
+        for entity, ids in by_entity.items():
+            handler = self._handlers.get(entity)
+            if handler is None:
+                continue
+            try:
+                handler(ids)
+                self._count("applied", len(ids))
+            except Exception as e:
+                self._count("errors")
+                log.error("Error applying %s change notification: %s", entity, e)
+
+    def _reset(self, reason):
+        self._count("resets")
+        log.info("Flushing caches: %s", reason)
+        if self._on_reset is not None:
+            try:
+                self._on_reset()
+            except Exception as e:
+                self._count("errors")
+                log.error("Error flushing caches: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=self._queue.qsize(), connected=self._online,
+                        publishers_seen=len(self._last_seen))
+
+    def close(self):
+        self._stop.set()
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass
+
+
+_feed = None
+_feed_pid = None
+_feed_lock = threading.Lock()
+
+
+def change_feed_enabled():
+    return os.getenv("CHANGE_FEED", "on").lower() not in ("0", "off", "false", "no")
+
+
+def get_change_feed(connect, on_reset=None, subscriptions=()):
+    """Return this process's feed, starting its listener on first use (and after fork)"""
+    global _feed, _feed_pid
+    if not change_feed_enabled():
+        return None
+    pid = os.getpid()
+    if _feed is not None and _feed_pid == pid:
+        return _feed
+    with _feed_lock:
+        if _feed is None or _feed_pid != pid:
+            _feed = ChangeFeed(
+                connect,
+                on_reset=on_reset,
+                subscriptions=subscriptions,
+                max_queue=int(os.getenv("CHANGE_FEED_MAX_QUEUE", 10000)),
+                reconnect_delay=float(os.getenv("CHANGE_FEED_RECONNECT_DELAY", 1)),
+            )
+            _feed_pid = pid
+    return _feed
+
+
+def publish(entity, *ids):
+    """Queue change events if this process's feed is running"""
+    if ids and _feed is not None and _feed_pid == os.getpid():
+        _feed.publish(entity, *ids)
+
+
+def change_feed_stats():
+    if _feed is None or _feed_pid != os.getpid():
+        return None
+    return _feed.stats()
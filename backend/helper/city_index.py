@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from psycopg2.extras import RealDictCursor
+
+
+log = logging.getLogger(__name__)
+
+
+POPULARITY_QUERY = """
+    SELECT city, SUM(weight) AS popularity FROM (
+        SELECT city_origin AS city, COUNT(*) * 10 AS weight FROM bookings GROUP BY city_origin
+        UNION ALL
+        SELECT city_destination, COUNT(*) * 10 FROM bookings GROUP BY city_destination
+        UNION ALL
+        SELECT departure_city_code, COUNT(*) FROM flights GROUP BY departure_city_code
+        UNION ALL
+        SELECT arrival_city_code, COUNT(*) FROM flights GROUP BY arrival_city_code
+    ) t
+    WHERE city IS NOT NULL
+    GROUP BY city
+"""
+
+
+def normalize(text):
+    """Case- and accent-insensitive form used for matching ("São Tomé" -> "sao tome")"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold().strip()
+
+
+class CityIndex:
+    """In-memory autocomplete index over the cities table.
+
+    Matches are ranked by tier - whole-name prefix, then word prefix
+    ("york" -> "New York"), then plain substring - and within a tier by
+    route popularity (bookings weigh more than scheduled flights).
+    """
+
+    def __init__(self, connection_factory, refresh_interval=300.0):
+        self._connection_factory = connection_factory
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._loaded_at = None
+        self._cities = []      # [(normalized name, city_name, country, popularity)]
+        self._prefixes = []    # sorted [(normalized key, tier, city position)]
+        self._stats = {"loads": 0, "lookups": 0, "load_seconds": 0.0}
+
+    def load(self):
+        started = time.monotonic()
+        db = self._connection_factory()
+        try:
+            cursor = db.cursor(cursor_factory=RealDictCursor)
+            cursor.execute("SELECT DISTINCT city_name, country FROM cities WHERE city_name IS NOT NULL")
+            rows = cursor.fetchall()
+            try:
+                cursor.execute(POPULARITY_QUERY)
+                popularity = {row['city']: int(row['popularity']) for row in cursor.fetchall()}
+            except Exception as e:
+                db.rollback()
+                log.warning("Error loading city popularity: %s", e)
+                popularity = {}
+            cursor.close()
+        finally:
+            db.close()
+
+        cities = [
+            (normalize(row['city_name']), row['city_name'], row['country'], popularity.get(row['city_name'], 0))
+            for row in rows
+        ]
+        prefixes = []
+        for position, (norm, _, _, _) in enumerate(cities):
+            prefixes.append((norm, 0, position))
+            words = norm.replace('-', ' ').split()
+            for word in words[1:]:
+                prefixes.append((word, 1, position))
+        prefixes.sort()
+
+        with self._lock:
+            self._cities, self._prefixes = cities, prefixes
+            self._loaded_at = time.monotonic()
+            self._stats["loads"] += 1
+            self._stats["load_seconds"] = round(time.monotonic() - started, 4)
+
+    def is_loaded(self):
+        return self._loaded_at is not None
+
+    @property
+    def version(self):
+        """Number of loads so far; cached search responses are keyed on it"""
+        return self._stats["loads"]
+
+    def reload_async(self):
+        if self._reloading:
+            return
+        self._reloading = True
+        threading.Thread(target=self._background_reload, name="city-index", daemon=True).start()
+
+    def _background_reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            log.error("Error reloading city index: %s", e)
+        finally:
+            self._reloading = False
+
+    def ensure_fresh(self):
+        if not self.is_loaded():
+            self.load()
+        elif self.refresh_interval and time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.reload_async()
+
+    def search(self, query, limit=10):
+        self.ensure_fresh()
+        needle = normalize(query)
+        if not needle:
+            return []
+        with self._lock:
+            cities, prefixes = self._cities, self._prefixes
+            self._stats["lookups"] += 1
+
+        best = {}
+        for i in range(bisect_left(prefixes, (needle,)), len(prefixes)):
+            key, tier, position = prefixes[i]
+            if not key.startswith(needle):
+                break
+            if tier < best.get(position, 3):
+                best[position] = tier
+        if len(best) < limit:
+            # Substring fallback only when prefixes cannot fill the page
+            for position, city in enumerate(cities):
+                if position not in best and needle in city[0]:
+                    best[position] = 2
+
+        ranked = sorted(best, key=lambda p: (best[p], -cities[p][3], cities[p][1]))
+        results, seen = [], set()
+        for position in ranked:
+            _, name, country, _ = cities[position]
+            if (name, country) in seen:
+                continue
+            seen.add((name, country))
+            results.append({"city": name, "country": country})
+            if len(results) == limit:
+                break
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cities"] = len(self._cities)
+            stats["age_seconds"] = round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None
+        return stats
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_city_index(connection_factory):
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CityIndex(
+                    connection_factory,
+                    refresh_interval=float(os.getenv("CITY_INDEX_REFRESH_INTERVAL", 300)),
+                )
+    return _index
+
+
+def city_index_stats():
+    return _index.stats() if _index is not None else None
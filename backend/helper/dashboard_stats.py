@@ -0,0 +1,109 @@
+"""Trigger-maintained summary tables behind /admin/dashboard/stats.
+
+Every write to ``bookings`` or ``flights`` adjusts the summary rows in the
+same transaction, so the dashboard reads a handful of small tables instead
+of aggregating the base tables. Rows are spread over 16 shards (chosen by
+backend pid) so concurrent bookings do not all queue on the same counter
+row. The tables and triggers are created by migration 5 in
+``helper.migrations``.
+
+Run ``python -m helper.dashboard_stats`` from backend/ to rebuild every
+summary from scratch (e.g. from cron, or after bulk SQL fixes).
+"""
+import os
+
+REBUILD_SQL = """
+    LOCK TABLE bookings, flights IN SHARE MODE;
+    TRUNCATE dashboard_counters, dashboard_route_counts, dashboard_monthly_revenue, dashboard_flight_status;
+
+    INSERT INTO dashboard_counters (name, shard, value)
+    SELECT 'total_flights', 0, COUNT(*) FROM flights
+    UNION ALL SELECT 'total_bookings', 0, COUNT(*) FROM bookings
+    UNION ALL SELECT 'cancelled_bookings', 0, COUNT(*) FROM bookings WHERE status = 'cancelled'
+    UNION ALL SELECT 'confirmed_revenue', 0, COALESCE(SUM(price), 0) FROM bookings WHERE status = 'confirmed';
+
+    INSERT INTO dashboard_route_counts (city_origin, city_destination, shard, bookings)
+    SELECT COALESCE(city_origin, ''), COALESCE(city_destination, ''), 0, COUNT(*)
+    FROM bookings GROUP BY 1, 2;
+
+    INSERT INTO dashboard_monthly_revenue (month, shard, bookings, revenue)
+    SELECT date_trunc('month', booking_date)::date, 0, COUNT(*), COALESCE(SUM(price), 0)
+    FROM bookings WHERE status = 'confirmed' GROUP BY 1;
+
+    INSERT INTO dashboard_flight_status (flight_status, shard, flights)
+    SELECT COALESCE(flight_status, ''), 0, COUNT(*) FROM flights GROUP BY 1;
+"""
+
+
+def rebuild_dashboard_stats(cursor):
+    """Recompute every summary row from bookings/flights (caller commits)"""
+    cursor.execute(REBUILD_SQL)
+
+
+def read_dashboard_stats(cursor):
+    """Return the /admin/dashboard/stats payload from the summary tables"""
+    cursor.execute("SELECT name, SUM(value) AS value FROM dashboard_counters GROUP BY name")
+    counters = {row['name']: row['value'] for row in cursor.fetchall()}
+
+    cursor.execute("SELECT COUNT(*) as count FROM flights WHERE departure_datetime > NOW() AND flight_status = 'active'")
+    upcoming_flights = cursor.fetchone()['count']
+
+    cursor.execute("""
+        SELECT NULLIF(city_origin, '') AS city_origin, NULLIF(city_destination, '') AS city_destination,
+               SUM(bookings)::bigint AS count
+        FROM dashboard_route_counts
+        GROUP BY city_origin, city_destination
+        HAVING SUM(bookings) > 0
+        ORDER BY count DESC
+        LIMIT 10
+    """)
+    bookings_per_route = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT TO_CHAR(month, 'Mon YYYY') as month, SUM(revenue) as revenue
+        FROM dashboard_monthly_revenue
+        GROUP BY dashboard_monthly_revenue.month
+        HAVING SUM(bookings) > 0
+        ORDER BY dashboard_monthly_revenue.month
+        LIMIT 12
+    """)
+    revenue_per_month = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT NULLIF(flight_status, '') AS flight_status, SUM(flights)::bigint AS count
+        FROM dashboard_flight_status
+        GROUP BY flight_status
+        HAVING SUM(flights) > 0
+    """)
+    flight_status_dist = cursor.fetchall()
+
+    return {
+        "totalFlights": int(counters.get('total_flights', 0)),
+        "totalBookings": int(counters.get('total_bookings', 0)),
+        "totalRevenue": float(counters.get('confirmed_revenue', 0)),
+        "cancelledBookings": int(counters.get('cancelled_bookings', 0)),
+        "upcomingFlights": upcoming_flights,
+        "bookingsPerRoute": bookings_per_route,
+        "revenuePerMonth": revenue_per_month,
+        "flightStatusDistribution": flight_status_dist
+    }
+
+
+if __name__ == '__main__':
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    db = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        dbname=os.getenv('DB_NAME')
+    )
+    try:
+        cursor = db.cursor()
+        rebuild_dashboard_stats(cursor)
+        db.commit()
+        print("Dashboard statistics rebuilt")
+    finally:
+        db.close()
@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from helper.metrics import TimedConnection
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection could be checked out within the timeout"""
+
+
+class PooledConnection:
+    """Proxy around a psycopg2 connection; close() hands it back to the pool"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise PoolError("connection already returned to the pool")
+        return getattr(conn, name)
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.putconn(conn)
+
+    def discard(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.putconn(conn, discard=True)
+
+    def __del__(self):
+        # A handler that forgot to close() must not leak its pool slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-safe, bounded psycopg2 connection pool with checkout timeouts.
+
+    Idle connections are validated with ``SELECT 1`` before being handed out
+    again once they have been idle longer than ``validate_after`` seconds.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=5.0, validate_after=30.0, **conn_kwargs):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError("invalid pool size: min=%s max=%s" % (minconn, maxconn))
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self._conn_kwargs = conn_kwargs
+        self._cond = threading.Condition()
+        self._idle = []          # [(conn, returned_at)], most recently used last
+        self._in_use = set()
+        self._connecting = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "failed_validations": 0,
+            "wait_seconds_total": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._conn_kwargs)
+        self._stats["created"] += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.validate_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            self._stats["failed_validations"] += 1
+            return False
+
+    def _close_quietly(self, conn):
+        self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use.add(conn)
+                    break
+                if len(self._in_use) + self._connecting < self.maxconn:
+                    conn, returned_at = None, None
+                    # Reserve the slot, then connect outside the lock
+                    self._connecting += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        "timed out after %.1fs waiting for a database connection "
+                        "(pool size %d)" % (timeout, self.maxconn)
+                    )
+                self._cond.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            finally:
+                with self._cond:
+                    self._connecting -= 1
+                    if conn is None:
+                        self._cond.notify()
+                    else:
+                        self._in_use.add(conn)
+        elif not self._is_healthy(conn, time.monotonic() - returned_at):
+            with self._cond:
+                self._in_use.discard(conn)
+            self._close_quietly(conn)
+            return self.getconn(max(0.0, deadline - time.monotonic()))
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+        return PooledConnection(self, conn)
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            # Never hand out a connection that is still inside a transaction
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use.discard(conn)
+            if discard or conn.closed or self._closed:
+                keep = False
+            else:
+                keep = True
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if not keep:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "min": self.minconn,
+                "max": self.maxconn,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+            })
+        stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 6)
+        stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 6)
+        return stats
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's pool, creating it on first use (and after fork)"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            # Connections inherited from a parent process must not be reused
+            _pool = ConnectionPool(
+                minconn=int(os.getenv('DB_POOL_MIN', 1)),
+                maxconn=int(os.getenv('DB_POOL_MAX', 10)),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+                validate_after=float(os.getenv('DB_POOL_VALIDATE_AFTER', 30)),
+                host=os.getenv('DB_HOST', 'localhost'),
+                user=os.getenv('DB_USER'),
+                password=os.getenv('DB_PASSWORD'),
+                dbname=os.getenv('DB_NAME'),
+                connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', 10)),
+                connection_factory=TimedConnection,
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    return _pool.stats()
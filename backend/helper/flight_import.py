@@ -0,0 +1,362 @@
+"""Bulk flight import from CSV or NDJSON uploads.
+
+Each record uses the field names of the create-flight payload
+(``departure_city``, ``arrival_city``, ``airline``, ...). Cities and
+airlines are resolved against maps loaded once per import, and every other
+value is checked against the type and length of its ``flights`` column,
+so a bad row is reported instead of failing the load. Valid rows are
+streamed with COPY into a temporary staging table while the upload is
+still being read, then merged into ``flights`` in one statement.
+"""
+import csv
+import io
+import json
+import os
+import re
+from datetime import datetime
+
+from helper.geo import route_estimate
+
+
+FORMATS = ('csv', 'ndjson')
+
+REQUIRED_FIELDS = (
+    'flight_id', 'trip_type', 'airline', 'departure_city', 'arrival_city',
+    'departure_datetime', 'price', 'cabin_class', 'seats_available', 'flight_status',
+)
+
+# Optional record fields copied to the flights column of the same name
+OPTIONAL_FIELDS = (
+    'return_datetime', 'is_directs', 'transits', 'gate', 'terminal',
+    'baggage_allowance', 'flight_description', 'airline_logo',
+)
+
+FLIGHT_COLUMNS = (
+    'flight_id', 'trip_type', 'airline', 'airline_id', 'origin_country', 'destination_country',
+    'departure_city_code', 'arrival_city_code', 'is_directs', 'transits', 'departure_datetime',
+    'return_datetime', 'price', 'cabin_class', 'seats_available', 'flight_duration',
+    'flight_distance', 'flight_status', 'gate', 'terminal', 'baggage_allowance',
+    'flight_description', 'airline_logo',
+)
+
+# Imports run one at a time so two uploads cannot both insert a flight_id
+IMPORT_LOCK_KEY = 0xF1_1A0D
+
+STAGING_SQL = (
+    "CREATE TEMP TABLE flight_import_staging (LIKE flights INCLUDING DEFAULTS) ON COMMIT DROP",
+    "ALTER TABLE flight_import_staging ADD COLUMN source_line INTEGER",
+)
+
+COPY_SQL = "COPY flight_import_staging ({columns}) FROM STDIN WITH (FORMAT csv)".format(
+    columns=", ".join(FLIGHT_COLUMNS + ('source_line',)))
+
+CONFLICTS_SQL = """
+    SELECT s.source_line, s.flight_id
+    FROM flight_import_staging s
+    WHERE EXISTS (SELECT 1 FROM flights f WHERE f.flight_id = s.flight_id)
+    ORDER BY s.source_line
+"""
+
+MERGE_SQL = """
+    INSERT INTO flights ({columns})
+    SELECT {columns}
+    FROM flight_import_staging s
+    WHERE NOT EXISTS (SELECT 1 FROM flights f WHERE f.flight_id = s.flight_id)
+    ORDER BY s.source_line
+    RETURNING flight_id, departure_city_code, arrival_city_code, departure_datetime
+""".format(columns=", ".join(FLIGHT_COLUMNS))
+
+_TRUE = ('true', 't', 'yes', 'y', '1')
+_FALSE = ('false', 'f', 'no', 'n', '0')
+
+
+class ImportFormatError(ValueError):
+    """The upload as a whole cannot be imported"""
+
+
+def detect_format(requested, filename=None, content_type=None):
+    if requested:
+        fmt = requested.strip().lower()
+        if fmt not in FORMATS:
+            raise ImportFormatError(f"format must be one of: {', '.join(FORMATS)}")
+        return fmt
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    raise ImportFormatError("Cannot tell the upload format; pass format=csv or format=ndjson")
+
+
+def read_records(stream, fmt):
+    """Return an iterator of ``(line, record, error)`` over a binary stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text, restkey='__extra__')
+        if not reader.fieldnames:
+            raise ImportFormatError("CSV upload has no header row")
+        return _csv_records(reader)
+    return _ndjson_records(text)
+
+
+def _csv_records(reader):
+    for record in reader:
+        if '__extra__' in record:
+            yield reader.line_num, record, "Row has more fields than the header"
+        else:
+            yield reader.line_num, record, None
+
+
+def _ndjson_records(text):
+    for line, raw in enumerate(text, 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            yield line, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line, None, "Each line must be a JSON object"
+        else:
+            yield line, record, None
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _convert(value, data_type, max_length):
+    """Coerce ``value`` to what COPY expects for a column, or raise ValueError"""
+    if data_type in ('integer', 'smallint', 'bigint'):
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError("must be a whole number")
+        return int(value)
+    if data_type in ('numeric', 'real', 'double precision'):
+        return float(value)
+    if data_type == 'boolean':
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        raise ValueError("must be true or false")
+    if data_type.startswith('timestamp') or data_type == 'date':
+        return datetime.fromisoformat(str(value).strip())
+    text = value if isinstance(value, str) else json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+    text = text.strip()
+    if max_length is not None and len(text) > max_length:
+        raise ValueError(f"must be at most {max_length} characters")
+    return text
+
+
+def _csv_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _CopySource:
+    """Read-only file over an iterator of CSV lines, consumed by COPY as it reads"""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ''
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size is None or size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class FlightImporter:
+    """Validate and load one upload; the caller owns the transaction.
+
+    ``errors`` collects ``{"line", "flight_id", "errors"}`` entries for
+    rejected rows, at most ``max_errors`` of them (``rejected`` keeps the
+    full count).
+    """
+
+    def __init__(self, cursor, max_rows=None, max_errors=None):
+        self.cursor = cursor
+        self.max_rows = max_rows or int(os.getenv("FLIGHT_IMPORT_MAX_ROWS", 50000))
+        self.max_errors = max_errors or int(os.getenv("FLIGHT_IMPORT_MAX_ERRORS", 1000))
+        self.rows = 0
+        self.valid = 0
+        self.rejected = 0
+        self.errors = []
+        self._seen = set()
+        self._copied_lines = []
+        self._fatal = None
+        self._load_references()
+
+    def _load_references(self):
+        self.cursor.execute("""
+            SELECT DISTINCT ON (city_name) city_name, country, longitude::float AS longitude, latitude::float AS latitude
+            FROM cities WHERE city_name IS NOT NULL
+            ORDER BY city_name, city_id
+        """)
+        self.cities = {row['city_name']: row for row in self.cursor.fetchall()}
+        self.cursor.execute("""
+            SELECT DISTINCT ON (airline_name) airline_name, airline_id
+            FROM airlines WHERE airline_name IS NOT NULL
+            ORDER BY airline_name, airline_id
+        """)
+        self.airlines = {row['airline_name']: row['airline_id'] for row in self.cursor.fetchall()}
+        self.cursor.execute("""
+            SELECT column_name, data_type, character_maximum_length
+            FROM information_schema.columns
+            WHERE table_name = 'flights' AND table_schema = current_schema()
+        """)
+        self.columns = {row['column_name']: (row['data_type'], row['character_maximum_length'])
+                        for row in self.cursor.fetchall()}
+
+    def _reject(self, line, record, messages):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            flight_id = record.get('flight_id') if isinstance(record, dict) else None
+            self.errors.append({"line": line, "flight_id": flight_id, "errors": messages})
+
+    def _column(self, name, value, problems, field=None):
+        data_type, max_length = self.columns.get(name, ('text', None))
+        try:
+            return _convert(value, data_type, max_length)
+        except (TypeError, ValueError) as e:
+            problems.append(f"{field or name}: {e}")
+            return None
+
+    def validate(self, record):
+        """Return (flight column values, problems) for one record"""
+        problems = []
+        missing = [field for field in REQUIRED_FIELDS if _blank(record.get(field))]
+        if missing:
+            return None, [f"Missing required field(s): {', '.join(missing)}"]
+
+        departure = self.cities.get(str(record['departure_city']).strip())
+        arrival = self.cities.get(str(record['arrival_city']).strip())
+        airline_id = self.airlines.get(str(record['airline']).strip())
+        if departure is None:
+            problems.append("Departure City not found")
+        if arrival is None:
+            problems.append("Invalid arrival city name")
+        if airline_id is None:
+            problems.append("Invalid airline")
+
+        values = {'airline_id': airline_id}
+        for field in ('flight_id', 'trip_type', 'airline', 'departure_datetime', 'price',
+                      'cabin_class', 'seats_available', 'flight_status'):
+            values[field] = self._column(field, record[field], problems)
+        for field in OPTIONAL_FIELDS:
+            value = record.get(field)
+            values[field] = None if _blank(value) else self._column(field, value, problems)
+        if _blank(record.get('is_directs')):
+            values['is_directs'] = True
+        for field in ('price', 'seats_available'):
+            if isinstance(values[field], (int, float)) and values[field] < 0:
+                problems.append(f"{field} must not be negative")
+        if values['flight_id'] in self._seen:
+            problems.append("Flight ID appears earlier in this upload")
+        if problems:
+            return None, problems
+
+        self._seen.add(values['flight_id'])
+        estimate = route_estimate(departure['longitude'], departure['latitude'],
+                                  arrival['longitude'], arrival['latitude'])
+        values['flight_distance'], values['flight_duration'] = estimate or (1000.0, 2.0)
+        values.update({
+            'origin_country': departure['country'],
+            'destination_country': arrival['country'],
+            'departure_city_code': departure['city_name'],
+            'arrival_city_code': arrival['city_name'],
+        })
+        return [values[column] for column in FLIGHT_COLUMNS], []
+
+    def _staged_lines(self, records):
+        # Problems with the upload as a whole end the stream; run() raises them
+        # after COPY so the database sees a clean end of input
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        records = iter(records)
+        while True:
+            try:
+                line, record, error = next(records)
+            except StopIteration:
+                return
+            except (UnicodeDecodeError, csv.Error) as e:
+                self._fatal = f"Upload could not be read after row {self.rows}: {e}"
+                return
+            self.rows += 1
+            if self.rows > self.max_rows:
+                self._fatal = f"Upload has more than {self.max_rows} rows"
+                return
+            if error:
+                self._reject(line, record, [error])
+                continue
+            values, problems = self.validate(record)
+            if problems:
+                self._reject(line, record, problems)
+                continue
+            self.valid += 1
+            self._copied_lines.append(line)
+            writer.writerow([_csv_value(value) for value in values] + [line])
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+
+    def describe_copy_error(self, error):
+        """Point a database error raised by COPY at the upload line it came from"""
+        message = (error.diag.message_primary if getattr(error, 'diag', None) else None) or str(error)
+        context = (getattr(error, 'diag', None) and error.diag.context) or ''
+        match = re.search(r'line (\d+)', context)
+        if match and 1 <= int(match.group(1)) <= len(self._copied_lines):
+            return f"Line {self._copied_lines[int(match.group(1)) - 1]}: {message}"
+        return message
+
+    def stage(self, records):
+        """COPY every valid record into the staging table.
+
+        Rows whose flight_id already exists in flights are reported as
+        rejected. Raises ``ImportFormatError`` for an unreadable upload.
+        """
+        self.cursor.execute("SELECT pg_advisory_xact_lock(%s)", (IMPORT_LOCK_KEY,))
+        for ddl in STAGING_SQL:
+            self.cursor.execute(ddl)
+        self.cursor.copy_expert(COPY_SQL, _CopySource(self._staged_lines(records)))
+        if self._fatal:
+            raise ImportFormatError(self._fatal)
+
+        self.cursor.execute(CONFLICTS_SQL)
+        for row in self.cursor.fetchall():
+            self.valid -= 1
+            self._reject(row['source_line'], row, ["Flight ID already exists"])
+
+    def merge(self):
+        """Insert the staged flights; returns the inserted flight rows"""
+        self.cursor.execute(MERGE_SQL)
+        return self.cursor.fetchall()
+
+    def report(self, imported):
+        return {
+            "rows": self.rows,
+            "valid": self.valid,
+            "imported": imported,
+            "rejected": self.rejected,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "errors_truncated": self.rejected > len(self.errors),
+        }
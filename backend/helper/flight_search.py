@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+from helper.seat_inventory import SEATS_AVAILABLE_SQL
+
+
+
+SEARCHABLE_STATUSES = ('active', 'Scheduled')
+
+SEARCH_SELECT = """
+    SELECT f.flight_id, f.trip_type, f.airline, f.departure_city_code, f.arrival_city_code,
+           f.departure_datetime, f.return_datetime as arrival_datetime, f.price, f.cabin_class,
+           {seats} as seats_available,
+           f.flight_status, f.flight_duration, f.flight_distance, f.gate, f.terminal,
+           f.origin_country, f.destination_country,
+           (SELECT dc.country FROM cities dc WHERE dc.city_name = f.departure_city_code LIMIT 1) as departure_country,
+           (SELECT ac.country FROM cities ac WHERE ac.city_name = f.arrival_city_code LIMIT 1) as arrival_country
+    FROM flights f
+    WHERE {seats} > 0 AND f.flight_status IN %s
+""".replace("{seats}", SEATS_AVAILABLE_SQL)
+
+# Served by the text_pattern_ops expression index (equality and prefix) and,
+# when pg_trgm is installed, the trigram index (substring fallback)
+_CITY_LOOKUPS = (
+    ("SELECT DISTINCT city_name FROM cities WHERE lower(city_name) = %s", "{}"),
+    ("SELECT DISTINCT city_name FROM cities WHERE lower(city_name) LIKE %s", "{}%"),
+    ("SELECT DISTINCT city_name FROM cities WHERE lower(city_name) LIKE %s", "%{}%"),
+)
+
+class SearchParamError(ValueError):
+    pass
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def resolve_city_names(cursor, term):
+    """Resolve a free-text origin/destination to the exact values stored in flights.
+
+    Tries an exact (case-insensitive) city name first, then a prefix match and
+    only then a substring match, stopping at the first tier that matches.
+    A three-letter term is also kept verbatim so IATA codes stored in the
+    ``*_city_code`` columns still match.
+    """
+    term = term.strip()
+    names = set()
+    if len(term) == 3 and term.isalpha():
+        names.update((term, term.upper()))
+    lowered = term.lower()
+    for i, (sql, pattern) in enumerate(_CITY_LOOKUPS):
+        cursor.execute(sql, (pattern.format(lowered if i == 0 else _escape_like(lowered)),))
+        rows = cursor.fetchall()
+        if rows:
+            names.update(row['city_name'] if isinstance(row, dict) else row[0] for row in rows)
+            break
+    return sorted(names)
+
+
+def parse_search_date(value):
+    """Return the half-open [start, end) range covering one calendar day"""
+    try:
+        start = datetime.strptime(value.strip(), '%Y-%m-%d')
+    except ValueError:
+        raise SearchParamError("Invalid date, expected YYYY-MM-DD")
+    return start, start + timedelta(days=1)
+
+
+def parse_passengers(value):
+    try:
+        passengers = int(value)
+    except (TypeError, ValueError):
+        raise SearchParamError("passengers must be a whole number")
+    if passengers < 1:
+        raise SearchParamError("passengers must be at least 1")
+    return passengers
+
+
+def build_search_query(origins=None, destinations=None, day_range=None,
+                       trip_type=None, cabin=None, passengers=1):
+    """Build a sargable search over flights.
+
+    ``origins``/``destinations`` are lists of exact values resolved with
+    ``resolve_city_names``; ``None`` means "any".
+    """
+    query = SEARCH_SELECT
+    params = [SEARCHABLE_STATUSES]
+
+    if origins is not None:
+        query += " AND f.departure_city_code = ANY(%s)"
+        params.append(list(origins))
+
+    if destinations is not None:
+        query += " AND f.arrival_city_code = ANY(%s)"
+        params.append(list(destinations))
+
+    if day_range is not None:
+        query += " AND f.departure_datetime >= %s AND f.departure_datetime < %s"
+        params.extend(day_range)
+
+    if trip_type:
+        query += " AND lower(f.trip_type) = lower(%s)"
+        params.append(trip_type)
+
+    if cabin:
+        query += " AND lower(f.cabin_class) = lower(%s)"
+        params.append(cabin)
+
+    if passengers and passengers > 1:
+        query += f" AND {SEATS_AVAILABLE_SQL} >= %s"
+        params.append(passengers)
+
+    query += " ORDER BY f.departure_datetime ASC"
+    return query, tuple(params)
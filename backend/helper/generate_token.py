@@ -1,6 +1,23 @@
 import jwt
 import datetime
 import os
+import threading
+
+_keys = {}
+_keys_lock = threading.Lock()
+
+
+def _secret(is_refresh=False):
+    """Signing key material, read from the environment once and cached"""
+    name = "JWT_REFRESH_KEY" if is_refresh else "JWT_KEY"
+    secret = _keys.get(name)
+    if secret is None:
+        with _keys_lock:
+            secret = os.getenv(name)
+            if secret:
+                _keys[name] = secret
+    return secret
+
 
 def generate_access_token(email,role='user'):
     payload = {
@@ -9,7 +26,7 @@ def generate_access_token(email,role='user'):
         'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRES_MINUTES", 15))),
         'iat': datetime.datetime.utcnow()
     }
-    token = jwt.encode(payload, os.getenv("JWT_KEY"), algorithm='HS256')
+    token = jwt.encode(payload, _secret(), algorithm='HS256')
     return token
 
 
@@ -20,12 +37,12 @@ def generate_refresh_token(email,role='user'):
         'exp': datetime.datetime.utcnow() + datetime.timedelta(days=int(os.getenv("REFRESH_TOKEN_EXPIRES_DAYS", 7))),
         'iat': datetime.datetime.utcnow()
     }
-    token = jwt.encode(payload, os.getenv("JWT_REFRESH_KEY"), algorithm='HS256')
+    token = jwt.encode(payload, _secret(is_refresh=True), algorithm='HS256')
     return token
 
 
 def decode_token(token, is_refresh=False):
-    secret = os.getenv("JWT_REFRESH_KEY") if is_refresh else os.getenv("JWT_KEY")
+    secret = _secret(is_refresh)
     try:
         payload = jwt.decode(token, secret, algorithms=['HS256'])
         return payload
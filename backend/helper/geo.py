@@ -0,0 +1,120 @@
+"""Flight distance and duration estimated from city coordinates.
+
+Distance is the geodesic on the WGS-84 ellipsoid (Vincenty's inverse
+formula), falling back to the haversine great circle for the near-antipodal
+pairs where Vincenty does not converge. Duration is a block-time model:
+a fixed allowance for taxi, climb and approach plus the flown distance
+(great circle plus an airway detour) at a cruise speed that grows with
+stage length, since short hops are flown by slower aircraft and never
+reach full cruise.
+
+Estimates are memoized per city pair, in either direction.
+"""
+import math
+from functools import lru_cache
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+# Airways and departure/arrival procedures add to the great-circle track
+ROUTE_DETOUR_FACTOR = 1.05
+# Taxi out and in, climb and approach (hours)
+GROUND_AND_CLIMB_HOURS = 0.5
+
+# (stage length below km, average speed km/h), first match wins
+CRUISE_SPEEDS = (
+    (500, 480.0),
+    (1500, 700.0),
+    (4000, 800.0),
+    (float('inf'), 870.0),
+)
+
+ROUTE_CACHE_SIZE = 4096
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    h = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def vincenty_km(lon1, lat1, lon2, lat2):
+    """Ellipsoidal distance in km, or None if the iteration does not converge"""
+    if lon1 == lon2 and lat1 == lat2:
+        return 0.0
+    u1 = math.atan((1 - WGS84_F) * math.tan(math.radians(lat1)))
+    u2 = math.atan((1 - WGS84_F) * math.tan(math.radians(lat2)))
+    big_l = math.radians(lon2 - lon1)
+    sin_u1, cos_u1 = math.sin(u1), math.cos(u1)
+    sin_u2, cos_u2 = math.sin(u2), math.cos(u2)
+
+    lam = big_l
+    for _ in range(VINCENTY_MAX_ITERATIONS):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+        sin_sigma = math.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+        if sin_sigma == 0:
+            return 0.0
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        # Both points on the equator
+        cos_2sigma_m = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha if cos2_alpha else 0.0
+        c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        previous = lam
+        lam = big_l + (1 - c) * WGS84_F * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        if abs(lam - previous) < VINCENTY_TOLERANCE:
+            break
+    else:
+        return None
+
+    u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = b * sin_sigma * (cos_2sigma_m + b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    return WGS84_B * a * (sigma - delta_sigma) / 1000
+
+
+def distance_km(lon1, lat1, lon2, lat2):
+    distance = vincenty_km(lon1, lat1, lon2, lat2)
+    return haversine_km(lon1, lat1, lon2, lat2) if distance is None else distance
+
+
+def block_hours(distance):
+    """Gate-to-gate hours for a great-circle distance in km"""
+    speed = next(speed for limit, speed in CRUISE_SPEEDS if distance < limit)
+    return GROUND_AND_CLIMB_HOURS + distance * ROUTE_DETOUR_FACTOR / speed
+
+
+@lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def _route_estimate(a, b):
+    distance = distance_km(*a, *b)
+    return round(distance, 2), round(block_hours(distance), 2)
+
+
+def route_estimate(lon1, lat1, lon2, lat2):
+    """Return (distance_km, duration_hours) between two points, or None without coordinates"""
+    if None in (lon1, lat1, lon2, lat2):
+        return None
+    # Six decimals is ~0.1 m; order the pair so A->B and B->A share a cache entry
+    a = (round(float(lon1), 6), round(float(lat1), 6))
+    b = (round(float(lon2), 6), round(float(lat2), 6))
+    return _route_estimate(*sorted((a, b)))
+
+
+def route_cache_stats():
+    info = _route_estimate.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
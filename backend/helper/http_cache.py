@@ -0,0 +1,187 @@
+"""Precompressed, ETagged responses for the catalog endpoints.
+
+``cached_representation`` memoizes a GET view's 200 response per
+``(name, data version, query string)``. An entry keeps:
+
+* the body
+* its gzip (and, with the ``brotli`` package, br) encodings, compressed
+  once when the entry is created
+* a strong ETag: a hash of the body, with a per-encoding suffix
+
+A cached request therefore costs a lookup: the encoding is picked from
+``Accept-Encoding``, and a matching ``If-None-Match`` gets a bodiless 304.
+ETags hash the content rather than the per-process version counter, so
+every worker gives identical data the same tag.
+
+Bodies under ``min_size`` bytes are sent uncompressed. Entries expire
+after ``ttl`` seconds (never for static data) or when ``invalidate(name)``
+bumps the data version.
+"""
+import functools
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+class Representation:
+    """One response body and its precompressed encodings"""
+
+    __slots__ = ("etag", "bodies", "expires_at")
+
+    def __init__(self, payload, min_size, expires_at=None):
+        self.etag = hashlib.sha256(payload).hexdigest()[:32]
+        self.expires_at = expires_at
+        self.bodies = {'identity': payload}
+        if len(payload) >= min_size:
+            encoded = {'gzip': gzip.compress(payload, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                encoded['br'] = brotli.compress(payload, quality=11)
+            for encoding, body in encoded.items():
+                if len(body) < len(payload):
+                    self.bodies[encoding] = body
+
+    def tag(self, encoding):
+        return f'"{self.etag}"' if encoding == 'identity' else f'"{self.etag}-{encoding}"'
+
+    def matches(self, if_none_match):
+        """True when If-None-Match names this body in any encoding (or is *)"""
+        if if_none_match.star_tag:
+            return True
+        return any(tag.split('-', 1)[0] == self.etag for tag in if_none_match.as_set(include_weak=True))
+
+    def select(self, accept_encodings):
+        """Best available encoding the client accepts; br, then gzip, on equal quality"""
+        best, best_quality = 'identity', 0
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies:
+                quality = accept_encodings.quality(encoding)
+                if quality > best_quality:
+                    best, best_quality = encoding, quality
+        if best_quality and best_quality >= accept_encodings.quality('identity'):
+            return best
+        return 'identity'
+
+
+class ResponseCache:
+    def __init__(self, max_entries=512, min_size=1024, max_age=0):
+        self.max_entries = max_entries
+        self.min_size = min_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "compressed": 0, "bytes_saved": 0}
+
+    def version(self, name):
+        return self._versions.get(name, 0)
+
+    def invalidate(self, name):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            representation = self._entries.get(key)
+            if representation is not None and (representation.expires_at is None
+                                               or representation.expires_at > time.monotonic()):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return representation
+            self._entries.pop(key, None)
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key, payload, ttl=None):
+        representation = Representation(payload, self.min_size,
+                                         time.monotonic() + ttl if ttl else None)
+        with self._lock:
+            self._entries[key] = representation
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return representation
+
+    def respond(self, representation):
+        """200 in the negotiated encoding, or 304 when the client's copy is current"""
+        headers = {
+            "Vary": "Accept-Encoding",
+            "Cache-Control": f"public, max-age={self.max_age}" if self.max_age else "public, no-cache",
+        }
+        if representation.matches(request.if_none_match):
+            with self._lock:
+                self._stats["not_modified"] += 1
+            encoding = representation.select(request.accept_encodings)
+            headers["ETag"] = representation.tag(encoding)
+            return current_app.response_class(status=304, headers=headers)
+
+        encoding = representation.select(request.accept_encodings)
+        body = representation.bodies[encoding]
+        headers["ETag"] = representation.tag(encoding)
+        if encoding != 'identity':
+            headers["Content-Encoding"] = encoding
+            with self._lock:
+                self._stats["compressed"] += 1
+                self._stats["bytes_saved"] += len(representation.bodies['identity']) - len(body)
+        return current_app.response_class(body, status=200, headers=headers, mimetype=current_app.json.mimetype)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), brotli=brotli is not None)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    max_entries=int(os.getenv("HTTP_CACHE_MAX_ENTRIES", 512)),
+                    min_size=int(os.getenv("HTTP_COMPRESS_MIN_BYTES", 1024)),
+                    max_age=int(os.getenv("HTTP_CACHE_MAX_AGE", 0)),
+                )
+    return _cache
+
+
+def response_cache_stats():
+    return _cache.stats() if _cache is not None else None
+
+
+def cached_representation(name, ttl=None, version=None):
+    """Serve a JSON GET view from ResponseCache.
+
+    ``version()`` returns the data version of the view's source (default:
+    the cache's own counter for ``name``, bumped by ``invalidate(name)``).
+    Responses other than a plain 200 are passed through uncached.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            data_version = version() if version is not None else cache.version(name)
+            key = (name, data_version, tuple(sorted(request.args.items(multi=True))))
+            representation = cache.get(key)
+            if representation is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed or response.headers.get("Content-Encoding"):
+                    return response
+                representation = cache.put(key, response.get_data(), ttl)
+            return cache.respond(representation)
+        return wrapper
+    return decorator
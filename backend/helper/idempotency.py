@@ -0,0 +1,103 @@
+"""Idempotency-Key support for endpoints that write bookings.
+
+The key is claimed with an INSERT in the same transaction as the work it
+guards. A concurrent duplicate therefore blocks on the primary key until
+the first request commits, and then replays its stored response. If the
+first request rolls back, the duplicate takes the key and runs. Only
+successful responses are stored, so a refused or failed request can be
+retried with the same key.
+"""
+import hashlib
+import json
+import os
+import random
+
+MAX_KEY_LENGTH = 255
+
+# An expired row is taken over as if it did not exist
+CLAIM_SQL = """
+    INSERT INTO idempotency_keys (scope, endpoint, idempotency_key, request_hash, expires_at)
+    VALUES (%(scope)s, %(endpoint)s, %(key)s, %(request_hash)s, NOW() + make_interval(secs => %(ttl)s))
+    ON CONFLICT (scope, endpoint, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, expires_at = EXCLUDED.expires_at,
+            status_code = NULL, response = NULL
+        WHERE idempotency_keys.expires_at <= NOW()
+    RETURNING 1
+"""
+
+PURGE_SQL = """
+    DELETE FROM idempotency_keys
+    WHERE ctid IN (
+        SELECT ctid FROM idempotency_keys
+        WHERE expires_at <= NOW()
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+"""
+
+
+class IdempotencyError(Exception):
+    """The key cannot be used for this request"""
+
+    def __init__(self, message, http_status=422):
+        super().__init__(message)
+        self.message = message
+        self.http_status = http_status
+
+
+class Replay:
+    """A stored response to send back instead of running the request again"""
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+
+def request_fingerprint(endpoint, payload):
+    canonical = json.dumps([endpoint, payload], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).digest()
+
+
+def claim_key(cursor, scope, endpoint, key, payload):
+    """Claim ``key`` inside the caller's transaction.
+
+    Returns None when the caller should run the request (and later call
+    ``store_response`` before committing), or a ``Replay``. Raises
+    ``IdempotencyError`` if the key was used for a different payload.
+    """
+    key = (key or '').strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters", 400)
+    request_hash = request_fingerprint(endpoint, payload)
+    cursor.execute(CLAIM_SQL, {
+        "scope": scope, "endpoint": endpoint, "key": key, "request_hash": request_hash,
+        "ttl": float(os.getenv("IDEMPOTENCY_TTL", 86400)),
+    })
+    claimed = cursor.fetchone() is not None
+
+    if random.random() < float(os.getenv("IDEMPOTENCY_PURGE_PROBABILITY", 0.01)):
+        cursor.execute(PURGE_SQL, (int(os.getenv("IDEMPOTENCY_PURGE_BATCH", 500)),))
+    if claimed:
+        return None
+
+    cursor.execute("""
+        SELECT request_hash, status_code, response FROM idempotency_keys
+        WHERE scope = %s AND endpoint = %s AND idempotency_key = %s
+    """, (scope, endpoint, key))
+    row = cursor.fetchone()
+    if row is None:
+        # Expired and purged between the two statements
+        raise IdempotencyError("Idempotency-Key is being recycled, retry the request", 409)
+    if not isinstance(row, dict):
+        row = dict(zip(('request_hash', 'status_code', 'response'), row))
+    if bytes(row['request_hash']) != request_hash:
+        raise IdempotencyError("Idempotency-Key was already used with a different request")
+    return Replay(row['status_code'], row['response'])
+
+
+def store_response(cursor, scope, endpoint, key, status_code, body):
+    """Record the response of a claimed key; commit together with the work"""
+    cursor.execute("""
+        UPDATE idempotency_keys SET status_code = %s, response = %s
+        WHERE scope = %s AND endpoint = %s AND idempotency_key = %s
+    """, (status_code, body, scope, endpoint, key.strip()))
@@ -0,0 +1,128 @@
+"""Flask JSON provider backed by orjson.
+
+``FastJSONProvider`` encodes responses with orjson. It writes the same
+JSON as Flask's default provider:
+
+* Decimals become strings.
+* Dates and datetimes are written in HTTP date format, with naive values
+  taken as UTC.
+* ``RowSet`` query results become lists of objects.
+
+Set ``JSON_DATETIME_FORMAT=iso`` to write ISO 8601 instead. orjson can
+then encode datetimes itself, which is faster.
+
+Keys are written in query/insertion order rather than sorted. Anything
+orjson rejects (e.g. integers wider than 64 bits) goes through the
+default encoder. Without orjson installed the provider is the default
+one, plus ``RowSet`` support.
+
+``JSON_PROVIDER=default`` selects ``RowSetJSONProvider`` instead: Flask's
+own encoder, which still has to handle the ``RowSet`` payloads routes
+return. Build either one with ``make_json_provider``.
+"""
+import dataclasses
+import decimal
+import uuid
+from datetime import date, datetime, time, timezone
+
+from flask.json.provider import DefaultJSONProvider
+
+from helper.rowset import RowSet
+
+try:
+    import orjson
+except ImportError:  # optional: the default encoder is used instead
+    orjson = None
+
+
+_DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTHS = (None, "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def http_date(value):
+    """werkzeug.http.http_date, without its per-call overhead"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        hour, minute, second = value.hour, value.minute, value.second
+    else:
+        hour = minute = second = 0
+    return (f"{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month]} {value.year:04d} "
+            f"{hour:02d}:{minute:02d}:{second:02d} GMT")
+
+
+def _default_http(o):
+    if isinstance(o, RowSet):
+        return o.as_dicts()
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if isinstance(o, time):
+        return o.isoformat()
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _default_iso(o):
+    if isinstance(o, (date, time)):
+        return o.isoformat()
+    return _default_http(o)
+
+
+class RowSetJSONProvider(DefaultJSONProvider):
+    """Flask's default provider, plus ``RowSet`` support"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, RowSet):
+            return o.as_dicts()
+        return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    sort_keys = False
+
+    def __init__(self, app, datetime_format="http"):
+        super().__init__(app)
+        self.datetime_format = datetime_format
+        self.default = _default_iso if datetime_format == "iso" else _default_http
+        self._options = 0
+        if orjson is not None:
+            self._options = orjson.OPT_NON_STR_KEYS
+            if datetime_format != "iso":
+                self._options |= orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps_bytes(self, obj, indent=False):
+        if orjson is not None:
+            options = self._options
+            if indent:
+                options |= orjson.OPT_INDENT_2
+            if self.sort_keys:
+                options |= orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(obj, default=self.default, option=options)
+            except TypeError:
+                # JSONEncodeError (a TypeError) also covers values orjson has no encoding for
+                pass
+        return super().dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() - {"indent"}:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, indent=bool(kwargs.get("indent"))).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b"\n", mimetype=self.mimetype)
+
+
+def make_json_provider(app, name="fast", datetime_format="http"):
+    """The provider selected by JSON_PROVIDER / JSON_DATETIME_FORMAT"""
+    if name == "fast":
+        return FastJSONProvider(app, datetime_format=datetime_format)
+    return RowSetJSONProvider(app)
@@ -0,0 +1,193 @@
+"""Structured, leveled logging that never blocks a request on stdout.
+
+``configure_logging()`` puts a single queue handler on the root logger.
+Records are redacted and formatted in the calling thread, dropped (and
+counted) when the queue is full, and written by a background listener
+thread. Per-request lines go to the ``app.requests`` logger, which keeps
+only a ``LOG_REQUEST_SAMPLE_RATE`` fraction of successful requests.
+
+Pass structured fields with ``extra``:
+
+    log.info("Booking refused", extra={"flight_id": flight_id, "reason": e.reason})
+
+Settings (read when logging is configured): LOG_LEVEL, LOG_FORMAT
+(``json`` or ``text``), LOG_QUEUE_SIZE, LOG_REQUEST_SAMPLE_RATE.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+
+REQUEST_LOGGER = "app.requests"
+
+REDACTED = "[REDACTED]"
+
+# Field names whose values are never written out
+SENSITIVE_KEYS = re.compile(r"token|cookie|authorization|password|secret|api[_-]?key|idempotency", re.IGNORECASE)
+
+# JWTs and bearer credentials that end up inside free text
+SENSITIVE_TEXT = (
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+"), REDACTED),
+    (re.compile(r"(?i)(bearer\s+)[\w.~+/-]+=*"), r"\1" + REDACTED),
+    (re.compile(r"(?i)((?:access|refresh)_token=)[^;,\s]+"), r"\1" + REDACTED),
+)
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def redact(value):
+    """Copy of ``value`` with sensitive keys and embedded tokens masked"""
+    if isinstance(value, dict):
+        return {k: REDACTED if SENSITIVE_KEYS.search(str(k)) else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    if isinstance(value, str):
+        for pattern, replacement in SENSITIVE_TEXT:
+            value = pattern.sub(replacement, value)
+    return value
+
+
+def _fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES and not k.startswith('_')}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class RequestSampler(logging.Filter):
+    """Keep ``rate`` of the INFO-and-below records; warnings and errors always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops instead of waiting, and restarts its listener after fork()"""
+
+    def __init__(self, target, max_queue):
+        self._target = target
+        self._max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pid = None
+        self._listener = None
+        self.queued = 0
+        self.dropped = 0
+        super().__init__(queue.Queue(max_queue))
+        self._start()
+
+    def _start(self):
+        # The parent's listener thread did not survive fork(); its queue and
+        # lock may be in any state, so the child gets fresh ones
+        self.queue = queue.Queue(self._max_queue)
+        self._listener = logging.handlers.QueueListener(self.queue, self._target, respect_handler_level=True)
+        self._listener.start()
+        self._pid = os.getpid()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        for key, value in _fields(record).items():
+            setattr(record, key, REDACTED if SENSITIVE_KEYS.search(key) else redact(value))
+        if record.args:
+            record.args = redact(record.args)
+        # Formats the line in the calling thread; the listener only writes it
+        record = super().prepare(record)
+        record.msg = redact(record.msg)
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+        try:
+            self.queue.put_nowait(record)
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+
+_handler = None
+_sampler = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging():
+    """Install the queue handler on the root logger (once per process)"""
+    global _handler, _sampler
+    with _configure_lock:
+        if _handler is not None:
+            return _handler
+        formatter = JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter()
+        target = logging.StreamHandler(sys.stdout)
+        target.setFormatter(logging.Formatter("%(message)s"))
+        _handler = NonBlockingQueueHandler(target, int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+        _handler.setFormatter(formatter)
+
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+        _sampler = RequestSampler(float(os.getenv("LOG_REQUEST_SAMPLE_RATE", 0.01)))
+        logging.getLogger(REQUEST_LOGGER).addFilter(_sampler)
+        # Flush what is still queued when the process exits
+        atexit.register(_handler.close)
+        return _handler
+
+
+def logging_stats():
+    if _handler is None:
+        return None
+    return {
+        "queued": _handler.queued,
+        "dropped": _handler.dropped,
+        "pending": _handler.queue.qsize(),
+        "requests_sampled_out": _sampler.sampled_out,
+        "request_sample_rate": _sampler.rate,
+    }
@@ -0,0 +1,301 @@
+"""Request, database and bcrypt metrics in the Prometheus text format.
+
+Each process keeps its counters, gauges and histograms in memory; an
+observation is a dict update under one lock. With ``METRICS_DIR`` set, a
+background thread also writes the process's values to
+``METRICS_DIR/metrics-<pid>.json`` every ``METRICS_FLUSH_INTERVAL``
+seconds, and ``render_metrics()`` sums the files of every worker. So a
+scrape that lands on any gunicorn worker reports the whole server.
+Counters and histograms of exited workers keep counting toward the
+totals; their gauges are dropped. Empty the directory when the server is
+(re)started, as with any multi-process Prometheus setup.
+
+Without ``METRICS_DIR`` each process only reports itself.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from psycopg2 import extensions
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help, label names, histogram buckets)
+METRICS = {
+    "http_requests_total": (
+        "counter", "HTTP requests by route, method and status", ("endpoint", "method", "status"), None),
+    "http_requests_in_flight": (
+        "gauge", "HTTP requests being handled", ("endpoint",), None),
+    "http_request_duration_seconds": (
+        "histogram", "HTTP request latency", ("endpoint", "method"), LATENCY_BUCKETS),
+    "http_request_db_seconds": (
+        "histogram", "Time a request spent in database calls", ("endpoint",), LATENCY_BUCKETS),
+    "http_request_bcrypt_seconds": (
+        "histogram", "Time a request spent hashing or checking passwords", ("endpoint",), LATENCY_BUCKETS),
+    "db_query_duration_seconds": (
+        "histogram", "Duration of individual database calls, including background jobs", (), LATENCY_BUCKETS),
+    "password_hashing_seconds": (
+        "histogram", "bcrypt hash and check duration, including queueing", ("operation",), LATENCY_BUCKETS),
+    "cache_events_total": (
+        "counter", "Cache hits, misses, writes, evictions and errors", ("namespace", "backend", "event"), None),
+}
+
+# Per-thread totals of the request being handled
+_request = threading.local()
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = {}     # (name, labels) -> value
+        self._gauges = {}       # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+            if os.path.exists(self._path):
+                # Left behind by an earlier process with the same pid
+                os.replace(self._path, os.path.join(directory, f"archived-{os.getpid()}-{time.time_ns()}.json"))
+            threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+            atexit.register(self.flush)
+
+    def inc(self, name, labels=(), amount=1.0):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def add(self, name, labels=(), amount=1.0):
+        key = (name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0.0) + amount
+
+    def observe(self, name, value, labels=()):
+        buckets = METRICS[name][3]
+        index = bisect_left(buckets, value)
+        key = (name, labels)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "gauges": [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+                "histograms": [[name, list(labels), list(series)] for (name, labels), series in self._histograms.items()],
+            }
+
+    def flush(self):
+        if not self._path:
+            return
+        tmp = f"{self._path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, self._path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def collect(self):
+        """Snapshots of this process and, with a directory, of every other worker"""
+        snapshots = [self.snapshot()]
+        if not self.directory:
+            return snapshots
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            if path == self._path:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if os.path.basename(path).startswith("archived-") or not _alive(snapshot.get("pid")):
+                snapshot["gauges"] = []
+            snapshots.append(snapshot)
+        return snapshots
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, TypeError):
+        return pid is not None
+    return True
+
+
+_registry = None
+_registry_pid = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return this process's registry; a forked worker starts from zero"""
+    global _registry, _registry_pid
+    pid = os.getpid()
+    if _registry is not None and _registry_pid == pid:
+        return _registry
+    with _registry_lock:
+        if _registry is None or _registry_pid != pid:
+            _registry = MetricsRegistry(
+                directory=os.getenv("METRICS_DIR") or None,
+                flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", 5)),
+            )
+            _registry_pid = pid
+    return _registry
+
+
+def request_started(endpoint):
+    _request.db_seconds = 0.0
+    _request.bcrypt_seconds = 0.0
+    _request.active = True
+    get_metrics().add("http_requests_in_flight", (endpoint,), 1)
+
+
+def request_finished(endpoint, method, status, seconds):
+    _request.active = False
+    metrics = get_metrics()
+    metrics.add("http_requests_in_flight", (endpoint,), -1)
+    metrics.inc("http_requests_total", (endpoint, method, str(status)))
+    metrics.observe("http_request_duration_seconds", seconds, (endpoint, method))
+    if _request.db_seconds:
+        metrics.observe("http_request_db_seconds", _request.db_seconds, (endpoint,))
+    if _request.bcrypt_seconds:
+        metrics.observe("http_request_bcrypt_seconds", _request.bcrypt_seconds, (endpoint,))
+
+
+def record_db_time(seconds):
+    get_metrics().observe("db_query_duration_seconds", seconds)
+    if getattr(_request, 'active', False):
+        _request.db_seconds += seconds
+
+
+def record_bcrypt_time(operation, seconds):
+    get_metrics().observe("password_hashing_seconds", seconds, (operation,))
+    if getattr(_request, 'active', False):
+        _request.bcrypt_seconds += seconds
+
+
+class _TimedCursorMixin:
+    """Adds the time spent in each database call to the metrics"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_db_time(time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_db_time(time.perf_counter() - started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_db_time(time.perf_counter() - started)
+
+    # A named (server-side) cursor does its work when rows are fetched
+    def fetchmany(self, size=None):
+        if self.name is None:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        finally:
+            record_db_time(time.perf_counter() - started)
+
+
+_timed_cursor_classes = {}
+
+
+def _timed_cursor_class(base):
+    cls = _timed_cursor_classes.get(base)
+    if cls is None:
+        cls = _timed_cursor_classes[base] = type(f"Timed{base.__name__}", (_TimedCursorMixin, base), {})
+    return cls
+
+
+class TimedConnection(extensions.connection):
+    """psycopg2 connection whose cursors report their database time"""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_metrics():
+    """Prometheus text exposition of every worker's metrics"""
+    counters, gauges, histograms = {}, {}, {}
+    for snapshot in get_metrics().collect():
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, value in snapshot["gauges"]:
+            key = (name, tuple(labels))
+            gauges[key] = gauges.get(key, 0.0) + value
+        for name, labels, series in snapshot["histograms"]:
+            key = (name, tuple(labels))
+            total = histograms.get(key)
+            histograms[key] = series if total is None else [a + b for a, b in zip(total, series)]
+
+    lines = []
+    for name, (kind, help_text, label_names, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), series[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float('inf') else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(label_names, labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(label_names, labels)} {_number(round(series[-1], 6))}")
+                lines.append(f"{name}_count{_labels(label_names, labels)} {cumulative}")
+        else:
+            values = counters if kind == "counter" else gauges
+            for (series_name, labels), value in sorted(values.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_labels(label_names, labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+from helper.metrics import record_bcrypt_time
+
+
+class HasherBusy(Exception):
+    """The hashing pool is saturated; the caller should answer 503"""
+
+    def __init__(self, message="Password hashing capacity exhausted", retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool with bounded admission.
+
+    At most ``max_pending`` operations may be queued or running. A request
+    that cannot get a slot within ``admission_timeout`` seconds is rejected
+    with ``HasherBusy`` instead of piling up behind a login storm. With
+    ``pool_size=0`` hashing runs inline in the calling thread.
+
+    Workers are started with ``forkserver`` by default: forking a threaded
+    gunicorn worker could copy a lock (logging, the DB pool) held by
+    another thread into the child.
+    """
+
+    def __init__(self, pool_size=2, max_pending=32, admission_timeout=0.05,
+                 timeout=10.0, rounds=12, start_method='forkserver', retry_after=1):
+        self.pool_size = pool_size
+        self.max_pending = max_pending
+        self.admission_timeout = admission_timeout
+        self.timeout = timeout
+        self.rounds = rounds
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        if pool_size > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=pool_size,
+                mp_context=multiprocessing.get_context(start_method),
+            )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {
+            "hash_count": 0, "hash_seconds_total": 0.0, "hash_seconds_max": 0.0,
+            "check_count": 0, "check_seconds_total": 0.0, "check_seconds_max": 0.0,
+            "rejected": 0, "timeouts": 0, "max_queue_depth": 0,
+        }
+
+    def _run(self, op, fn, *args):
+        if not self._slots.acquire(timeout=self.admission_timeout):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise HasherBusy(retry_after=self.retry_after)
+        started = time.monotonic()
+        with self._lock:
+            self._pending += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._pending)
+        if self._executor is None:
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+                self._record(op, started)
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # A caller that gives up does not stop the worker; the slot stays
+        # taken until the bcrypt call really finishes, so max_pending holds.
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise HasherBusy("Password hashing timed out", retry_after=self.retry_after)
+        finally:
+            self._record(op, started)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _record(self, op, started):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._stats[f"{op}_count"] += 1
+            self._stats[f"{op}_seconds_total"] += elapsed
+            self._stats[f"{op}_seconds_max"] = max(self._stats[f"{op}_seconds_max"], elapsed)
+        record_bcrypt_time(op, elapsed)
+
+    def hash(self, password):
+        return self._run("hash", _hashpw, password.encode('utf-8'), self.rounds)
+
+    def check(self, password, hashed):
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return self._run("check", _checkpw, password.encode('utf-8'), hashed)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"queue_depth": self._pending, "max_pending": self.max_pending,
+                          "pool_size": self.pool_size, "rounds": self.rounds})
+        for op in ("hash", "check"):
+            count = stats[f"{op}_count"]
+            stats[f"{op}_seconds_avg"] = round(stats[f"{op}_seconds_total"] / count, 4) if count else None
+            stats[f"{op}_seconds_total"] = round(stats[f"{op}_seconds_total"], 4)
+            stats[f"{op}_seconds_max"] = round(stats[f"{op}_seconds_max"], 4)
+        return stats
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher = None
+_hasher_pid = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher():
+    """Return this process's hasher; worker processes are never shared across fork"""
+    global _hasher, _hasher_pid
+    pid = os.getpid()
+    if _hasher is not None and _hasher_pid == pid:
+        return _hasher
+    with _hasher_lock:
+        if _hasher is None or _hasher_pid != pid:
+            _hasher = PasswordHasher(
+                pool_size=int(os.getenv("BCRYPT_POOL_SIZE", 2)),
+                max_pending=int(os.getenv("BCRYPT_MAX_PENDING", 32)),
+                admission_timeout=float(os.getenv("BCRYPT_ADMISSION_TIMEOUT", 0.05)),
+                timeout=float(os.getenv("BCRYPT_TIMEOUT", 10)),
+                rounds=int(os.getenv("BCRYPT_ROUNDS", 12)),
+                start_method=os.getenv("BCRYPT_POOL_START_METHOD", "forkserver"),
+                retry_after=int(os.getenv("BCRYPT_RETRY_AFTER", 1)),
+            )
+            _hasher_pid = pid
+    return _hasher
+
+
+def password_hash(password):
+    return get_hasher().hash(password)
+
+
+def password_matches(password, hashed):
+    return get_hasher().check(password, hashed)
+
+
+def hasher_stats():
+    if _hasher is None or _hasher_pid != os.getpid():
+        return None
+    return _hasher.stats()
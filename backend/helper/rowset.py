@@ -0,0 +1,37 @@
+class RowSet:
+    """Query rows kept as tuples, plus their column names.
+
+    Serializes to the same JSON as a list of ``RealDictRow`` (a list of
+    objects), but psycopg2 never builds a Python dict for each row.
+    Indexing a row gives a dict, for the few places that read single rows.
+    """
+
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, columns, rows):
+        self.columns = list(columns)
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RowSet(self.columns, self.rows[index])
+        return dict(zip(self.columns, self.rows[index]))
+
+    def __iter__(self):
+        columns = self.columns
+        return (dict(zip(columns, row)) for row in self.rows)
+
+    def as_dicts(self):
+        return list(self)
+
+
+def fetch_rowset(cursor):
+    """``fetchall()`` of a plain (tuple) cursor as a RowSet"""
+    rows = cursor.fetchall()
+    return RowSet([column.name for column in cursor.description], rows)
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import product
+
+
+class SearchResultCache:
+    """TTL + LRU cache of serialized /flights/search responses.
+
+    Entries are tagged with the ``(departure, arrival, day)`` combinations
+    they were computed from, where ``None`` stands for "any". A write to a
+    flight calls ``invalidate(departure, arrival, day)``, which drops only
+    the entries whose tags cover that route and day.
+
+    Results computed concurrently with a write must not be cached stale:
+    callers take ``epoch()`` before querying and pass it to ``put()``,
+    which refuses the entry if a matching invalidation happened meanwhile.
+    """
+
+    def __init__(self, max_entries=2048, max_bytes=32 * 1024 * 1024, ttl=30.0,
+                 max_tags=64, log_size=4096):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_tags = max_tags
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (payload, expires_at, tags)
+        self._tags = {}                 # tag -> set(keys)
+        self._bytes = 0
+        self._epoch = 0
+        self._log = deque(maxlen=log_size)  # (epoch, departure, arrival, day)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                       "invalidations": 0, "rejected": 0}
+
+    @staticmethod
+    def make_key(origin, destination, date, trip_type, cabin, passengers):
+        norm = lambda value: (value or '').strip().lower()
+        return (norm(origin), norm(destination), norm(date), norm(trip_type), norm(cabin), int(passengers))
+
+    def epoch(self):
+        with self._lock:
+            return self._epoch
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[1] <= now:
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def _make_tags(self, origins, destinations, day):
+        origins = [None] if origins is None else list(origins)
+        destinations = [None] if destinations is None else list(destinations)
+        if len(origins) * len(destinations) > self.max_tags:
+            # Too broad to tag precisely; any write on that day invalidates it
+            return [(None, None, day)]
+        return [(o, d, day) for o in origins for d in destinations]
+
+    @staticmethod
+    def _matches(tag, departure, arrival, day):
+        return ((tag[0] is None or tag[0] == departure)
+                and (tag[1] is None or tag[1] == arrival)
+                and (tag[2] is None or tag[2] == day))
+
+    def put(self, key, payload, origins, destinations, day, since_epoch):
+        if self.ttl <= 0 or len(payload) > self.max_bytes:
+            return False
+        tags = self._make_tags(origins, destinations, day)
+        with self._lock:
+            if self._epoch != since_epoch:
+                oldest = self._log[0][0] if self._log else self._epoch + 1
+                if oldest > since_epoch + 1 or any(
+                    self._matches(tag, dep, arr, d)
+                    for epoch, dep, arr, d in self._log if epoch > since_epoch
+                    for tag in tags
+                ):
+                    self._stats["rejected"] += 1
+                    return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, time.monotonic() + self.ttl, tags)
+            self._bytes += len(payload)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+        return True
+
+    def _remove(self, key):
+        payload, _, tags = self._entries.pop(key)
+        self._bytes -= len(payload)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, departure, arrival, day):
+        """Drop every entry that could contain a flight on this route and day"""
+        with self._lock:
+            self._epoch += 1
+            self._log.append((self._epoch, departure, arrival, day))
+            for tag in product((departure, None), (arrival, None), (day, None)):
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._log.clear()
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes,
+                          "max_entries": self.max_entries, "max_bytes": self.max_bytes})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """Return the process-wide cache, configured from the environment on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchResultCache(
+                    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 2048)),
+                    max_bytes=int(os.getenv("SEARCH_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+                    ttl=float(os.getenv("SEARCH_CACHE_TTL", 30)),
+                )
+    return _cache
+
+
+def search_cache_stats():
+    return _cache.stats() if _cache is not None else None
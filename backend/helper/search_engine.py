@@ -0,0 +1,314 @@
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from psycopg2.extras import RealDictCursor
+
+from helper.flight_search import SEARCH_SELECT, SEARCHABLE_STATUSES
+from helper.rowset import RowSet
+
+
+log = logging.getLogger(__name__)
+
+
+class _Interner:
+    """Maps repeated strings (cabin class, trip type) to small integer codes"""
+
+    def __init__(self):
+        self.codes = {}
+
+    def code(self, value):
+        key = (value or '').lower()
+        if key not in self.codes:
+            self.codes[key] = len(self.codes)
+        return self.codes[key]
+
+    def lookup(self, value):
+        return self.codes.get((value or '').lower(), -1)
+
+
+class FlightSearchEngine:
+    """In-process snapshot of bookable flights for /flights/search.
+
+    Rows are kept column-wise (one list/array per output column) and
+    indexed by ``(departure_city_code, arrival_city_code, departure day)``.
+    Cabin, trip type and seat filters run against compact integer columns
+    before any row dict is built. ``refresh_flights()`` re-reads individual
+    rows after a write; replaced rows are tombstoned and compacted away once
+    they make up a quarter of the snapshot.
+    """
+
+    def __init__(self, connection_factory, max_age=300.0):
+        self._connection_factory = connection_factory
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = set()
+        self._reloading = False
+        self._dirty = set()
+        self._loaded_at = None
+        self._stats = {"loads": 0, "refreshes": 0, "searches": 0, "load_seconds": 0.0}
+        self._reset()
+
+    def _reset(self):
+        self._columns = None
+        self._data = []            # one list per output column
+        self._alive = bytearray()
+        self._seats = array('i')
+        self._cabin = array('H')
+        self._trip = array('H')
+        self._cabins = _Interner()
+        self._trips = _Interner()
+        self._position = {}        # flight_id -> row position
+        self._routes = {}          # (departure, arrival) -> {day: [positions]}
+        self._dead = 0
+        self._cities = []          # sorted [(lowered name, name)]
+
+    # -- loading -----------------------------------------------------------
+
+    def _fetch(self, flight_ids=None):
+        db = self._connection_factory()
+        try:
+            cursor = db.cursor(cursor_factory=RealDictCursor)
+            query, params = SEARCH_SELECT, [SEARCHABLE_STATUSES]
+            if flight_ids is not None:
+                query += " AND f.flight_id = ANY(%s)"
+                params.append(list(flight_ids))
+            cursor.execute(query, tuple(params))
+            rows = cursor.fetchall()
+            cities = None
+            if flight_ids is None:
+                cursor.execute("SELECT DISTINCT city_name FROM cities WHERE city_name IS NOT NULL")
+                cities = [row['city_name'] for row in cursor.fetchall()]
+            cursor.close()
+            return rows, cities
+        finally:
+            db.close()
+
+    def load(self):
+        started = time.monotonic()
+        rows, cities = self._fetch()
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._append(row)
+            self._cities = sorted((name.lower(), name) for name in cities)
+            self._loaded_at = time.monotonic()
+            self._stats["loads"] += 1
+            self._stats["load_seconds"] = round(time.monotonic() - started, 4)
+
+    def _append(self, row):
+        if self._columns is None:
+            self._columns = list(row.keys())
+            self._data = [[] for _ in self._columns]
+        position = len(self._alive)
+        for column, values in zip(self._columns, self._data):
+            values.append(row[column])
+        self._alive.append(1)
+        self._seats.append(int(row['seats_available'] or 0))
+        self._cabin.append(self._cabins.code(row['cabin_class']))
+        self._trip.append(self._trips.code(row['trip_type']))
+        self._position[row['flight_id']] = position
+
+        departure = row['departure_datetime']
+        day = departure.date() if departure is not None else None
+        bucket = self._routes.setdefault((row['departure_city_code'], row['arrival_city_code']), {})
+        bucket.setdefault(day, []).append(position)
+
+    def _kill(self, flight_id):
+        position = self._position.pop(flight_id, None)
+        if position is not None and self._alive[position]:
+            self._alive[position] = 0
+            self._dead += 1
+
+    def _compact(self):
+        live = [
+            {column: values[i] for column, values in zip(self._columns, self._data)}
+            for i in range(len(self._alive)) if self._alive[i]
+        ]
+        cities = self._cities
+        self._reset()
+        self._cities = cities
+        for row in live:
+            self._append(row)
+
+    def refresh_flights(self, flight_ids):
+        """Re-read the given flights so the snapshot reflects a committed write"""
+        flight_ids = [fid for fid in flight_ids if fid is not None]
+        if not flight_ids or not self.is_loaded():
+            return
+        if self._reloading:
+            # The reload may have read these rows before the write committed
+            self._dirty.update(flight_ids)
+        with self._pending_lock:
+            self._pending.update(flight_ids)
+        # Fetch and apply one refresh at a time, so a fetch that read older
+        # rows can never be applied after one that read newer rows. Whoever
+        # gets the lock next refreshes every id queued so far; ids queued
+        # before a fetch started are covered by it.
+        with self._refresh_lock:
+            with self._pending_lock:
+                flight_ids, self._pending = self._pending, set()
+            if not flight_ids:
+                return
+            rows, _ = self._fetch(flight_ids)
+            with self._lock:
+                for flight_id in flight_ids:
+                    self._kill(flight_id)
+                for row in rows:
+                    self._append(row)
+                self._stats["refreshes"] += 1
+                if self._dead > 64 and self._dead * 4 > len(self._alive):
+                    self._compact()
+
+    def is_loaded(self):
+        return self._loaded_at is not None
+
+    def ensure_fresh(self):
+        """Load on first use; afterwards reload in the background once stale"""
+        if not self.is_loaded():
+            with self._lock:
+                if not self.is_loaded():
+                    self.load()
+            return
+        if self.max_age and time.monotonic() - self._loaded_at > self.max_age:
+            self.reload_async()
+
+    def reload_async(self):
+        """Rebuild the snapshot in a background thread; searches keep using the old one"""
+        if not self.is_loaded() or self._reloading:
+            return
+        self._reloading = True
+        threading.Thread(target=self._background_reload, name="flight-snapshot", daemon=True).start()
+
+    def _background_reload(self):
+        try:
+            self.load()
+        except Exception as e:
+            log.error("Error reloading flight search snapshot: %s", e)
+        finally:
+            self._reloading = False
+        dirty, self._dirty = self._dirty, set()
+        if dirty:
+            try:
+                self.refresh_flights(dirty)
+            except Exception as e:
+                log.error("Error refreshing flight search snapshot: %s", e)
+
+    # -- querying ----------------------------------------------------------
+
+    def resolve_city_names(self, term):
+        """Same tiers as helper.flight_search.resolve_city_names, from memory"""
+        term = term.strip()
+        lowered = term.lower()
+        names = set()
+        if len(term) == 3 and term.isalpha():
+            names.update((term, term.upper()))
+        self.ensure_fresh()
+        with self._lock:
+            cities = self._cities
+        exact, prefix = [], []
+        for i in range(bisect_left(cities, (lowered,)), len(cities)):
+            low, name = cities[i]
+            if not low.startswith(lowered):
+                break
+            (exact if low == lowered else prefix).append(name)
+        if exact or prefix:
+            return sorted(names.union(exact or prefix))
+        return sorted(names.union(name for low, name in cities if lowered in low))
+
+    def search(self, origins=None, destinations=None, day_range=None,
+               trip_type=None, cabin=None, passengers=1):
+        """Return a RowSet shaped exactly like the SQL search, ordered by departure"""
+        self.ensure_fresh()
+        with self._lock:
+            self._stats["searches"] += 1
+            if self._columns is None:
+                return []
+            origins = set(origins) if origins is not None else None
+            destinations = set(destinations) if destinations is not None else None
+            day = day_range[0].date() if day_range is not None else None
+
+            candidates = []
+            if origins is not None and destinations is not None:
+                route_keys = [(o, d) for o in origins for d in destinations]
+            else:
+                route_keys = [
+                    key for key in self._routes
+                    if (origins is None or key[0] in origins)
+                    and (destinations is None or key[1] in destinations)
+                ]
+            for key in route_keys:
+                by_day = self._routes.get(key)
+                if not by_day:
+                    continue
+                if day is not None:
+                    candidates.extend(by_day.get(day, ()))
+                else:
+                    for positions in by_day.values():
+                        candidates.extend(positions)
+
+            alive, seats = self._alive, self._seats
+            need = max(int(passengers or 1), 1)
+            cabin_code = self._cabins.lookup(cabin) if cabin else None
+            trip_code = self._trips.lookup(trip_type) if trip_type else None
+            cabin_col, trip_col = self._cabin, self._trip
+            matches = [
+                i for i in candidates
+                if alive[i] and seats[i] >= need
+                and (cabin_code is None or cabin_col[i] == cabin_code)
+                and (trip_code is None or trip_col[i] == trip_code)
+            ]
+
+            departures = self._data[self._columns.index('departure_datetime')]
+            matches.sort(key=lambda i: departures[i])
+            picked = [[values[i] for i in matches] for values in self._data]
+            return RowSet(self._columns, list(zip(*picked)))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "rows": len(self._alive) - self._dead,
+                "tombstones": self._dead,
+                "routes": len(self._routes),
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            })
+        return stats
+
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+
+def search_engine_enabled():
+    return os.getenv("FLIGHT_SEARCH_ENGINE", "postgres").lower() == "memory"
+
+
+def get_search_engine(connection_factory):
+    """Return this process's engine, or None when FLIGHT_SEARCH_ENGINE != memory"""
+    global _engine, _engine_pid
+    if not search_engine_enabled():
+        return None
+    pid = os.getpid()
+    if _engine is not None and _engine_pid == pid:
+        return _engine
+    with _engine_lock:
+        if _engine is None or _engine_pid != pid:
+            _engine = FlightSearchEngine(
+                connection_factory,
+                max_age=float(os.getenv("FLIGHT_SEARCH_SNAPSHOT_MAX_AGE", 300)),
+            )
+            _engine_pid = pid
+    return _engine
+
+
+def search_engine_stats():
+    if _engine is None or _engine_pid != os.getpid():
+        return None
+    return _engine.stats()
@@ -0,0 +1,217 @@
+import logging
+import os
+import secrets
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+from helper.booking_engine import take_seats
+from helper.seat_inventory import release_expired_holds, take_seats_cte
+
+
+log = logging.getLogger(__name__)
+
+
+HOLD_SQL = """
+    WITH {take_seats}, hold AS (
+        INSERT INTO seat_holds (hold_token, flight_id, user_email, seats, expires_at)
+        SELECT %(hold_token)s, flight_id, %(holder_email)s, %(seats)s, NOW() + make_interval(secs => %(ttl)s)
+        FROM seat
+        RETURNING hold_token, flight_id, seats, created_at, expires_at
+    )
+    SELECT hold.*, seat.departure_city_code, seat.arrival_city_code, seat.departure_datetime
+    FROM hold, seat
+"""
+
+HOLD_SQL_SKIP_LOCKED = HOLD_SQL.format(take_seats=take_seats_cte(wait=False))
+HOLD_SQL_WAIT = HOLD_SQL.format(take_seats=take_seats_cte(wait=True))
+
+# Only one sweeper across all workers does the work at a time
+SWEEP_LOCK_KEY = 0x5EA7_401D
+
+
+def hold_ttl(requested=None):
+    """Clamp a requested TTL (seconds) to SEAT_HOLD_MAX_TTL; default SEAT_HOLD_TTL"""
+    default = float(os.getenv("SEAT_HOLD_TTL", 600))
+    maximum = float(os.getenv("SEAT_HOLD_MAX_TTL", 1800))
+    if requested in (None, ''):
+        return min(default, maximum)
+    try:
+        ttl = float(requested)
+    except (TypeError, ValueError):
+        raise ValueError("ttl must be a number of seconds")
+    if ttl <= 0:
+        raise ValueError("ttl must be positive")
+    return min(ttl, maximum)
+
+
+def create_hold(cursor, flight_id, seats, holder_email, ttl, release_expired=None):
+    """Take ``seats`` seats on a flight for ``ttl`` seconds.
+
+    Returns the hold row (token, flight route columns, expires_at); raises
+    ``BookingFailed`` like a booking would. ``release_expired`` is passed
+    on to ``take_seats``. The caller owns the transaction.
+    """
+    params = {
+        "flight_id": flight_id,
+        "seats": seats,
+        "holder_email": holder_email,
+        "hold_token": secrets.token_urlsafe(24),
+        "ttl": ttl,
+    }
+    return take_seats(cursor, HOLD_SQL_SKIP_LOCKED, HOLD_SQL_WAIT, params, release_expired)
+
+
+class HoldSweeper:
+    """Daemon thread that returns the seats of expired holds.
+
+    Every ``interval`` seconds it releases expired holds in batches of
+    ``batch_size``, oldest first, walking the ``expires_at`` index. An
+    advisory lock keeps concurrent workers from sweeping at the same time.
+    ``on_release`` is called with the affected flight rows after commit.
+
+    ``release_flight`` runs on one dedicated connection from
+    ``release_connect`` (kept out of the request pool), one caller at a
+    time; a caller that waits longer than ``release_wait`` seconds skips
+    the release and leaves it to the sweep.
+    """
+
+    def __init__(self, connection_factory, interval=15.0, batch_size=500, on_release=None,
+                 release_connect=None, release_wait=0.2):
+        self._connection_factory = connection_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self._on_release = on_release
+        self._release_connect = release_connect
+        self.release_wait = release_wait
+        self._release_db = None
+        self._release_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"sweeps": 0, "holds_released": 0, "seats_released": 0, "errors": 0,
+                       "last_sweep_seconds": 0.0, "flight_releases": 0, "flight_releases_skipped": 0}
+        self._thread = threading.Thread(target=self._run, name="seat-hold-sweeper", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                log.error("Error releasing expired seat holds: %s", e)
+
+    def sweep(self):
+        started = time.monotonic()
+        released = []
+        db = self._connection_factory()
+        try:
+            cursor = db.cursor(cursor_factory=RealDictCursor)
+            while True:
+                cursor.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (SWEEP_LOCK_KEY,))
+                if not cursor.fetchone()['locked']:
+                    db.rollback()
+                    break
+                rows = release_expired_holds(cursor, limit=self.batch_size)
+                db.commit()
+                released.extend(rows)
+                if sum(row['holds'] for row in rows) < self.batch_size:
+                    break
+            cursor.close()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._stats["sweeps"] += 1
+            self._stats["holds_released"] += sum(row['holds'] for row in released)
+            self._stats["seats_released"] += sum(row['seats'] for row in released)
+            self._stats["last_sweep_seconds"] = round(time.monotonic() - started, 4)
+        if released and self._on_release is not None:
+            self._on_release(*released)
+        return released
+
+    def release_flight(self, flight_id):
+        """Release one flight's expired holds now, in a transaction of its own.
+
+        Booking paths call this when they run short of seats: their own
+        transaction is rolled back on refusal, which would put the expired
+        holds back. It never takes a connection from the request pool, which
+        every caller is already holding one of. Returns the affected flight
+        rows (empty when none, or when the release was skipped or failed).
+        """
+        if self._release_connect is None or not self._release_lock.acquire(timeout=self.release_wait):
+            with self._lock:
+                self._stats["flight_releases_skipped"] += 1
+            return []
+        try:
+            if self._release_db is None or self._release_db.closed:
+                self._release_db = self._release_connect()
+            db = self._release_db
+            cursor = db.cursor(cursor_factory=RealDictCursor)
+            try:
+                # Never queue behind a booking transaction holding the flights row
+                cursor.execute("SET LOCAL lock_timeout = '1s'")
+                rows = release_expired_holds(cursor, flight_id=flight_id, limit=self.batch_size)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                cursor.close()
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            log.warning("Could not release expired holds of flight %s: %s", flight_id, e)
+            if self._release_db is not None and self._release_db.closed:
+                self._release_db = None
+            return []
+        finally:
+            self._release_lock.release()
+
+        with self._lock:
+            self._stats["flight_releases"] += 1
+            self._stats["holds_released"] += sum(row['holds'] for row in rows)
+            self._stats["seats_released"] += sum(row['seats'] for row in rows)
+        if rows and self._on_release is not None:
+            self._on_release(*rows)
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, interval=self.interval)
+
+    def close(self):
+        self._stop.set()
+
+
+_sweeper = None
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+
+
+def get_hold_sweeper(connection_factory, on_release=None, release_connect=None):
+    """Return this process's sweeper, starting its thread on first use"""
+    global _sweeper, _sweeper_pid
+    pid = os.getpid()
+    if _sweeper is not None and _sweeper_pid == pid:
+        return _sweeper
+    with _sweeper_lock:
+        if _sweeper is None or _sweeper_pid != pid:
+            _sweeper = HoldSweeper(
+                connection_factory,
+                interval=float(os.getenv("SEAT_HOLD_SWEEP_INTERVAL", 15)),
+                batch_size=int(os.getenv("SEAT_HOLD_SWEEP_BATCH", 500)),
+                on_release=on_release,
+                release_connect=release_connect,
+                release_wait=float(os.getenv("SEAT_HOLD_RELEASE_WAIT", 0.2)),
+            )
+            _sweeper_pid = pid
+    return _sweeper
+
+
+def hold_sweeper_stats():
+    if _sweeper is None or _sweeper_pid != os.getpid():
+        return None
+    return _sweeper.stats()
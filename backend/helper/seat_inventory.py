@@ -0,0 +1,266 @@
+"""Seat inventory for flights, optionally split into buckets.
+
+A flight normally keeps its free seats in ``flights.seats_available`` and
+every booking row-locks that flight. A hot flight can instead be split
+into ``seat_buckets`` rows of ``flight_seat_buckets``. Bookings then take
+seats from whichever bucket is not locked (``FOR UPDATE SKIP LOCKED``),
+so concurrent bookings for the same flight proceed in parallel.
+
+For a bucketed flight, the free seat count is ``flights.seats_available``
+(seats handed back, e.g. on cancellation) plus the sum of its buckets.
+Read it through ``SEATS_AVAILABLE_SQL``.
+
+A seat hold (``seat_holds``) takes seats exactly like a booking, so held
+seats are already missing from every reported count. Redeeming a hold
+consumes its row. Expired holds are returned to ``flights.seats_available``
+in batches found through the ``expires_at`` index.
+"""
+
+MAX_BUCKETS = 64
+
+# Total free seats of flights row ``f``; the subquery only runs for bucketed flights
+SEATS_AVAILABLE_SQL = (
+    "(f.seats_available + CASE WHEN f.seat_buckets > 0 THEN COALESCE("
+    "(SELECT SUM(sb.seats) FROM flight_seat_buckets sb WHERE sb.flight_id = f.flight_id), 0)"
+    " ELSE 0 END)::integer"
+)
+
+# CTEs that take %(seats)s seats from flight %(flight_id)s and yield the
+# flight row as ``seat``. A free bucket is tried first; the flights row is
+# only updated (and locked) when no bucket could serve the request.
+# Cancelled flights never give out seats.
+TAKE_SEATS_CTE = """
+    bookable AS (
+        SELECT 1 FROM flights
+        WHERE flight_id = %(flight_id)s AND flight_status IS DISTINCT FROM 'cancelled'
+    ), bucket AS (
+        SELECT flight_id, bucket FROM flight_seat_buckets
+        WHERE flight_id = %(flight_id)s AND seats >= %(seats)s AND EXISTS (SELECT 1 FROM bookable)
+        ORDER BY random()
+        LIMIT 1
+        FOR UPDATE {bucket_lock}
+    ), taken_bucket AS (
+        UPDATE flight_seat_buckets sb
+        SET seats = sb.seats - %(seats)s
+        FROM bucket
+        WHERE sb.flight_id = bucket.flight_id AND sb.bucket = bucket.bucket
+        RETURNING sb.flight_id
+    ), taken_flight AS (
+        UPDATE flights
+        SET seats_available = seats_available - %(seats)s
+        WHERE flight_id = %(flight_id)s AND seats_available >= %(seats)s
+          AND flight_status IS DISTINCT FROM 'cancelled'
+          AND NOT EXISTS (SELECT 1 FROM taken_bucket)
+        RETURNING flight_id
+    ), seat AS (
+        SELECT f.flight_id, f.departure_city_code, f.arrival_city_code, f.departure_datetime,
+               %(seats)s::integer AS seats
+        FROM flights f
+        WHERE f.flight_id = %(flight_id)s
+          AND (EXISTS (SELECT 1 FROM taken_bucket) OR EXISTS (SELECT 1 FROM taken_flight))
+    )
+"""
+
+# Consumes hold %(hold_token)s of %(holder_email)s and yields the flight
+# row as ``seat`` with the number of seats the hold carried. The hold is
+# only deleted while its flight is bookable, so a refused redemption
+# leaves it in place for explain_hold_failure to inspect.
+REDEEM_HOLD_CTE = """
+    held AS (
+        DELETE FROM seat_holds h
+        USING flights f
+        WHERE h.hold_token = %(hold_token)s AND h.user_email = %(holder_email)s
+          AND h.flight_id = %(flight_id)s AND h.expires_at > NOW()
+          AND f.flight_id = h.flight_id AND f.flight_status IS DISTINCT FROM 'cancelled'
+        RETURNING f.flight_id, f.departure_city_code, f.arrival_city_code, f.departure_datetime, h.seats
+    ), seat AS (
+        SELECT flight_id, departure_city_code, arrival_city_code, departure_datetime, seats
+        FROM held
+    )
+"""
+
+RETURN_SEATS_SQL = """
+    {released}, per_flight AS (
+        SELECT flight_id, SUM(seats)::integer AS seats, COUNT(*)::integer AS holds
+        FROM released
+        GROUP BY flight_id
+    ), returned AS (
+        UPDATE flights f
+        SET seats_available = f.seats_available + per_flight.seats
+        FROM per_flight
+        WHERE f.flight_id = per_flight.flight_id
+        RETURNING f.flight_id, f.departure_city_code, f.arrival_city_code, f.departure_datetime
+    )
+    SELECT returned.*, per_flight.seats, per_flight.holds
+    FROM returned
+    JOIN per_flight ON per_flight.flight_id = returned.flight_id
+"""
+
+RELEASE_EXPIRED_SQL = RETURN_SEATS_SQL.replace("{released}", """
+    WITH expired AS (
+        SELECT hold_token FROM seat_holds
+        WHERE expires_at <= NOW() {flight_filter}
+        ORDER BY expires_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ), released AS (
+        DELETE FROM seat_holds h
+        USING expired
+        WHERE h.hold_token = expired.hold_token
+        RETURNING h.flight_id, h.seats
+    )""")
+
+RELEASE_HOLD_SQL = RETURN_SEATS_SQL.replace("{released}", """
+    WITH released AS (
+        DELETE FROM seat_holds
+        WHERE hold_token = %(hold_token)s AND user_email = %(holder_email)s
+        RETURNING flight_id, seats
+    )""")
+
+
+def take_seats_cte(wait=False):
+    """``wait=True`` blocks on locked buckets instead of skipping them"""
+    return TAKE_SEATS_CTE.replace("{bucket_lock}", "" if wait else "SKIP LOCKED")
+
+
+def release_expired_holds(cursor, flight_id=None, limit=500):
+    """Return the seats of up to ``limit`` expired holds to their flights.
+
+    Returns one row per affected flight (flight columns, seats, holds).
+    The caller owns the transaction.
+    """
+    params = {"limit": limit}
+    flight_filter = ""
+    if flight_id is not None:
+        flight_filter = "AND flight_id = %(flight_id)s"
+        params["flight_id"] = flight_id
+    cursor.execute(RELEASE_EXPIRED_SQL.replace("{flight_filter}", flight_filter), params)
+    return cursor.fetchall()
+
+
+def release_hold(cursor, hold_token, holder_email):
+    """Cancel a hold early; returns the flight row it was released to, or None"""
+    cursor.execute(RELEASE_HOLD_SQL, {"hold_token": hold_token, "holder_email": holder_email})
+    return cursor.fetchone()
+
+
+def seat_summary(cursor, flight_id):
+    """Return (on_flight, in_buckets, largest_bucket, flight_status) or None if no such flight"""
+    cursor.execute("""
+        SELECT f.seats_available AS on_flight, f.flight_status,
+               COALESCE(SUM(sb.seats), 0) AS in_buckets, COALESCE(MAX(sb.seats), 0) AS largest_bucket
+        FROM flights f
+        LEFT JOIN flight_seat_buckets sb ON sb.flight_id = f.flight_id
+        WHERE f.flight_id = %s
+        GROUP BY f.flight_id, f.seats_available, f.flight_status
+    """, (flight_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if not isinstance(row, dict):
+        row = dict(zip(('on_flight', 'flight_status', 'in_buckets', 'largest_bucket'), row))
+    return (row['on_flight'] or 0, int(row['in_buckets']), int(row['largest_bucket']), row['flight_status'])
+
+
+def drain_buckets(cursor, flight_id):
+    """Move every bucketed seat back onto the flights row (waits for in-flight bookings)"""
+    cursor.execute("""
+        WITH drained AS (
+            SELECT flight_id, bucket, seats FROM flight_seat_buckets
+            WHERE flight_id = %s
+            ORDER BY bucket
+            FOR UPDATE
+        ), emptied AS (
+            UPDATE flight_seat_buckets sb SET seats = 0
+            FROM drained
+            WHERE sb.flight_id = drained.flight_id AND sb.bucket = drained.bucket AND drained.seats > 0
+            RETURNING drained.seats
+        )
+        UPDATE flights
+        SET seats_available = seats_available + (SELECT COALESCE(SUM(seats), 0) FROM emptied)
+        WHERE flight_id = %s
+    """, (flight_id, flight_id))
+
+
+def plan_shortfall(on_flight, buckets, seats):
+    """Seats to move from each bucket so the flights row can serve ``seats``.
+
+    ``buckets`` is ``[(bucket, seats), ...]``. Fullest buckets are tapped
+    first, so as few as possible are touched; the rest stay bucketed.
+    Returns ``[(bucket, seats_to_move), ...]``, empty when the flights row
+    already has enough or the buckets cannot make up the difference.
+    """
+    shortfall = seats - on_flight
+    if shortfall <= 0 or sum(free for _, free in buckets) < shortfall:
+        return []
+    moves = []
+    for bucket, free in sorted(buckets, key=lambda item: (-item[1], item[0])):
+        if shortfall <= 0:
+            break
+        if free <= 0:
+            continue
+        moved = min(free, shortfall)
+        moves.append((bucket, moved))
+        shortfall -= moved
+    return moves
+
+
+def gather_seats(cursor, flight_id, seats):
+    """Move just enough bucketed seats onto the flights row to serve ``seats``.
+
+    For a request larger than any single bucket. Buckets are locked in
+    bucket order (like ``drain_buckets``); the untouched ones stay
+    available to concurrent bookings. Returns the number of seats moved.
+    """
+    cursor.execute("SELECT bucket, seats FROM flight_seat_buckets WHERE flight_id = %s ORDER BY bucket FOR UPDATE",
+                   (flight_id,))
+    buckets = [(row['bucket'], row['seats']) if isinstance(row, dict) else tuple(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT seats_available FROM flights WHERE flight_id = %s", (flight_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    on_flight = (row['seats_available'] if isinstance(row, dict) else row[0]) or 0
+    moves = plan_shortfall(on_flight, buckets, seats)
+    if not moves:
+        return 0
+    cursor.execute("""
+        UPDATE flight_seat_buckets sb
+        SET seats = sb.seats - m.moved
+        FROM unnest(%s::smallint[], %s::integer[]) AS m(bucket, moved)
+        WHERE sb.flight_id = %s AND sb.bucket = m.bucket
+    """, ([bucket for bucket, _ in moves], [moved for _, moved in moves], flight_id))
+    moved = sum(moved for _, moved in moves)
+    cursor.execute("UPDATE flights SET seats_available = seats_available + %s WHERE flight_id = %s",
+                   (moved, flight_id))
+    return moved
+
+
+def set_seat_buckets(cursor, flight_id, buckets):
+    """Redistribute a flight's free seats over ``buckets`` buckets (0 = unbucketed).
+
+    Returns the flight's total free seats, or None when the flight does
+    not exist. The caller owns the transaction.
+    """
+    buckets = max(0, min(int(buckets), MAX_BUCKETS))
+    cursor.execute("SELECT seats_available FROM flights WHERE flight_id = %s FOR UPDATE", (flight_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    drain_buckets(cursor, flight_id)
+    cursor.execute("DELETE FROM flight_seat_buckets WHERE flight_id = %s", (flight_id,))
+    cursor.execute("SELECT seats_available FROM flights WHERE flight_id = %s", (flight_id,))
+    row = cursor.fetchone()
+    total = (row['seats_available'] if isinstance(row, dict) else row[0]) or 0
+
+    if buckets == 0:
+        cursor.execute("UPDATE flights SET seat_buckets = 0 WHERE flight_id = %s", (flight_id,))
+        return total
+
+    cursor.execute("""
+        INSERT INTO flight_seat_buckets (flight_id, bucket, seats)
+        SELECT %(flight_id)s, b, %(total)s / %(buckets)s + CASE WHEN b < %(total)s %% %(buckets)s THEN 1 ELSE 0 END
+        FROM generate_series(0, %(buckets)s - 1) b
+    """, {"flight_id": flight_id, "total": total, "buckets": buckets})
+    cursor.execute("UPDATE flights SET seats_available = 0, seat_buckets = %s WHERE flight_id = %s",
+                   (buckets, flight_id))
+    return total
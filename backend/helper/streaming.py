@@ -0,0 +1,81 @@
+"""Stream large query results as JSON without holding them in memory.
+
+``stream_query()`` runs the query on a named (server-side) cursor and
+encodes it ``batch_size`` rows at a time. So peak memory is one batch,
+however many rows the query returns. The body is one of:
+
+* a JSON array, the default
+* an object ``{key: [...], **trailer()}`` when ``key`` is given
+* one row per line (NDJSON) with ``fmt='ndjson'``
+"""
+import logging
+import os
+
+from flask import current_app, stream_with_context
+from psycopg2.extras import RealDictCursor
+
+
+log = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def stream_format(args):
+    """``ndjson`` when the request asks for ``?format=ndjson``, else ``json``"""
+    return 'ndjson' if args.get('format') == 'ndjson' else 'json'
+
+
+def stream_query(db, query, params=None, *, name, key=None, transform=None, trailer=None,
+                 fmt='json', batch_size=None):
+    """Execute ``query`` on a server-side cursor of ``db`` and return a streaming response.
+
+    ``transform(row)`` reshapes each row before it is encoded. ``trailer()``
+    is called once every row has been sent, and its keys are added after
+    ``key`` (JSON only). ``db`` is closed when the stream ends. If the query
+    cannot be started, ``db`` is closed and the error raised before the
+    response begins.
+    """
+    batch_size = batch_size or int(os.getenv("STREAM_BATCH_SIZE", 2000))
+    try:
+        cursor = db.cursor(name=name, cursor_factory=RealDictCursor)
+        cursor.itersize = batch_size
+        cursor.execute(query, params)
+    except Exception:
+        db.close()
+        raise
+    dumps = current_app.json.dumps
+
+    def generate():
+        try:
+            if fmt != 'ndjson':
+                yield '{' + dumps(key) + ':[' if key else '['
+            first = True
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                encoded = [dumps(transform(row) if transform else row) for row in rows]
+                if fmt == 'ndjson':
+                    yield '\n'.join(encoded) + '\n'
+                else:
+                    yield ('' if first else ',') + ','.join(encoded)
+                first = False
+            if fmt != 'ndjson':
+                if not key:
+                    yield ']'
+                else:
+                    extra = trailer() if trailer else {}
+                    yield ']' + ''.join(f',{dumps(k)}:{dumps(v)}' for k, v in extra.items()) + '}'
+        except Exception as e:
+            # Too late for an error status; the client sees a truncated body
+            log.error("Streaming %s failed: %s", name, e)
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            db.close()
+
+    mimetype = NDJSON_MIMETYPE if fmt == 'ndjson' else current_app.json.mimetype
+    return current_app.response_class(stream_with_context(generate()), status=200, mimetype=mimetype)
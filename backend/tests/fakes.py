@@ -0,0 +1,79 @@
+"""In-memory stand-ins for psycopg2 connections and cursors"""
+import re
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append((sql, params))
+        if self.connection.fail_on and self.connection.fail_on in sql:
+            raise RuntimeError("statement failed")
+
+    def fetchall(self):
+        return list(self.connection.results.pop(0)) if self.connection.results else []
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, results=(), fail_on=None):
+        self.results = list(results)
+        self.fail_on = fail_on
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = 0
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class BucketStore:
+    """Cursor over one flight's seats that understands gather_seats' statements"""
+
+    def __init__(self, on_flight, buckets):
+        self.on_flight = on_flight
+        self.buckets = dict(buckets)
+        self._result = []
+
+    def execute(self, sql, params):
+        sql = re.sub(r"\s+", " ", sql).strip()
+        if sql.startswith("SELECT bucket, seats FROM flight_seat_buckets"):
+            self._result = [{"bucket": b, "seats": n} for b, n in sorted(self.buckets.items())]
+        elif sql.startswith("SELECT seats_available FROM flights"):
+            self._result = [{"seats_available": self.on_flight}]
+        elif sql.startswith("UPDATE flight_seat_buckets"):
+            buckets, moved, _ = params
+            for bucket, seats in zip(buckets, moved):
+                assert self.buckets[bucket] >= seats
+                self.buckets[bucket] -= seats
+        elif sql.startswith("UPDATE flights"):
+            self.on_flight += params[0]
+        else:
+            raise AssertionError(f"unexpected statement: {sql}")
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def total(self):
+        return self.on_flight + sum(self.buckets.values())
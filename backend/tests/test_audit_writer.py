@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+from helper import audit_writer
+from helper.audit_writer import AuditWriter, _Control
+from fakes import FakeConnection
+
+
+@pytest.fixture
+def written(monkeypatch):
+    batches = []
+    monkeypatch.setattr(audit_writer, "execute_values",
+                        lambda cursor, sql, rows, page_size: batches.append(list(rows)))
+    return batches
+
+
+class StalledDatabase:
+    """Connection factory whose first checkout waits until released"""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.entered.set()
+        self.release.wait(5)
+        return FakeConnection()
+
+
+@pytest.fixture
+def make_writer(written):
+    writers = []
+
+    def make(factory, **kwargs):
+        writer = AuditWriter(factory, flush_interval=3600, **kwargs)
+        writers.append((writer, factory))
+        return writer
+    yield make
+    for writer, factory in writers:
+        if isinstance(factory, StalledDatabase):
+            factory.release.set()
+        writer.close()
+
+
+def stalled_writer(make_writer, overflow, **kwargs):
+    """A writer busy with event 0 whose two-slot queue is then filled"""
+    database = StalledDatabase()
+    writer = make_writer(database, max_queue=2, batch_size=1, overflow=overflow, **kwargs)
+    assert writer.submit(0)
+    assert database.entered.wait(5)
+    assert writer.submit(1) and writer.submit(2)
+    return writer, database
+
+
+def test_events_are_written_in_batches(make_writer, written):
+    writer = make_writer(FakeConnection, batch_size=2)
+    for event in range(3):
+        assert writer.submit(event)
+    assert writer.flush()
+    assert written == [[0, 1], [2]]
+    stats = writer.stats()
+    assert (stats["queued"], stats["flushed"], stats["batches"]) == (3, 3, 2)
+
+
+def test_drop_newest_refuses_the_new_event(make_writer, written):
+    writer, database = stalled_writer(make_writer, "drop_newest")
+    assert not writer.submit(3)
+    database.release.set()
+    assert writer.flush()
+    assert written == [[0], [1], [2]]
+    assert writer.stats()["dropped"] == 1
+
+
+def test_drop_oldest_evicts_the_oldest_queued_event(make_writer, written):
+    writer, database = stalled_writer(make_writer, "drop_oldest")
+    assert writer.submit(3)
+    database.release.set()
+    assert writer.flush()
+    assert written == [[0], [2], [3]]
+    assert writer.stats()["dropped"] == 1
+
+
+def test_drop_oldest_keeps_flush_markers_in_place(make_writer, written):
+    writer, database = stalled_writer(make_writer, "drop_oldest")
+    marker = _Control()
+    with writer._queue.mutex:
+        writer._queue.queue.appendleft(marker)
+    assert writer._replace_oldest_row(3)
+    assert list(writer._queue.queue) == [marker, 2, 3]
+
+
+def test_drop_oldest_gives_up_when_only_markers_are_queued(make_writer, written):
+    writer, database = stalled_writer(make_writer, "drop_oldest")
+    with writer._queue.mutex:
+        writer._queue.queue.clear()
+        writer._queue.queue.extend([_Control(), _Control()])
+    assert not writer._replace_oldest_row(3)
+
+
+def test_block_waits_then_drops(make_writer, written):
+    writer, database = stalled_writer(make_writer, "block", block_timeout=0.01)
+    assert not writer.submit(3)
+    assert writer.stats()["dropped"] == 1
+
+
+def test_failed_batch_is_counted_after_retries(make_writer, written):
+    def broken():
+        raise RuntimeError("database is down")
+    writer = make_writer(broken, max_retries=1)
+    writer.submit(0)
+    assert writer.flush()
+    assert writer.stats()["failed"] == 1
+    assert written == []
+
+
+def test_submit_after_close_is_dropped(make_writer, written):
+    writer = make_writer(FakeConnection)
+    writer.close()
+    assert not writer.submit(0)
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        AuditWriter(FakeConnection, overflow="drop_everything")
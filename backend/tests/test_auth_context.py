@@ -0,0 +1,57 @@
+import pytest
+from flask import Flask
+
+from helper import auth_context
+from helper.auth_context import access_claims, bearer_claims
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    calls = []
+
+    def decode_token(token, is_refresh=False):
+        calls.append(token)
+        return {"email": f"{token}@example.com"} if token != "bad" else None
+    monkeypatch.setattr(auth_context, "decode_token", decode_token)
+    return calls
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def test_nothing_is_decoded_unless_a_route_asks(app, decoded):
+    with app.test_request_context(headers={"Cookie": "access_token=c", "Authorization": "Bearer b"}):
+        pass
+    assert decoded == []
+
+
+def test_each_token_is_decoded_once_per_request(app, decoded):
+    with app.test_request_context(headers={"Cookie": "access_token=c", "Authorization": "Bearer b"}):
+        assert access_claims() == {"email": "c@example.com"}
+        assert access_claims() == {"email": "c@example.com"}
+        assert bearer_claims() == {"email": "b@example.com"}
+        assert bearer_claims() == {"email": "b@example.com"}
+    assert decoded == ["c", "b"]
+
+
+def test_invalid_token_is_remembered_too(app, decoded):
+    with app.test_request_context(headers={"Cookie": "access_token=bad"}):
+        assert access_claims() is None
+        assert access_claims() is None
+    assert decoded == ["bad"]
+
+
+def test_missing_tokens_are_not_decoded(app, decoded):
+    with app.test_request_context(headers={"Authorization": "Basic xyz"}):
+        assert access_claims() is None
+        assert bearer_claims() is None
+    assert decoded == []
+
+
+def test_claims_do_not_leak_between_requests(app, decoded):
+    with app.test_request_context(headers={"Cookie": "access_token=one"}):
+        assert access_claims()["email"] == "one@example.com"
+    with app.test_request_context(headers={"Cookie": "access_token=two"}):
+        assert access_claims()["email"] == "two@example.com"
@@ -0,0 +1,190 @@
+from decimal import Decimal
+
+import pytest
+
+from helper.booking_engine import (
+    BOOK_HOLD_SQL, BOOK_SQL_SKIP_LOCKED, BOOK_SQL_WAIT, BookingFailed, CascadeIncomplete, book_seats,
+    cancel_and_refund_booking, cancel_flight_bookings, parse_seat_count
+)
+from fakes import BucketStore, FakeConnection
+
+FLIGHT = {"flight_id": "FL1", "departure_city_code": "Accra", "arrival_city_code": "London",
+          "departure_datetime": None}
+
+
+class FlightStore(BucketStore):
+    """BucketStore that also answers seat_summary and the booking statements.
+
+    Buckets listed in ``locked`` are skipped by the first (SKIP LOCKED)
+    attempt and granted to the waiting retry.
+    """
+
+    def __init__(self, on_flight, buckets=(), status="active", locked=()):
+        super().__init__(on_flight, buckets)
+        self.status = status
+        self.locked = set(locked)
+        self.statements = []
+
+    def execute(self, sql, params):
+        if sql in (BOOK_SQL_SKIP_LOCKED, BOOK_SQL_WAIT, BOOK_HOLD_SQL):
+            self.statements.append(sql)
+            self._result = []
+            if sql is not BOOK_HOLD_SQL and self.status != "cancelled":
+                self._book(params["seats"], skip_locked=sql is BOOK_SQL_SKIP_LOCKED)
+        elif "AS largest_bucket" in sql:
+            self.statements.append("summary")
+            self._result = [{"on_flight": self.on_flight, "flight_status": self.status,
+                             "in_buckets": sum(self.buckets.values()),
+                             "largest_bucket": max(self.buckets.values(), default=0)}]
+        else:
+            super().execute(sql, params)
+
+    def _book(self, seats, skip_locked):
+        free = [b for b, n in self.buckets.items() if n >= seats and not (skip_locked and b in self.locked)]
+        if free:
+            self.buckets[free[0]] -= seats
+        elif self.on_flight >= seats:
+            self.on_flight -= seats
+        else:
+            return
+        row = {"booking_id": 1, "num_seats": seats, "payment__payment_id": 2, "payment__amount": 90}
+        row.update({f"flight__{key}": value for key, value in FLIGHT.items()})
+        self._result = [row]
+
+
+def book(store, seats, **kwargs):
+    return book_seats(store, "FL1", seats, "Ama", "ama@example.com", 90, "card", **kwargs)
+
+
+def refusal(store, seats, **kwargs):
+    with pytest.raises(BookingFailed) as failed:
+        book(store, seats, **kwargs)
+    return failed.value
+
+
+def test_free_seats_are_booked_in_one_statement():
+    store = FlightStore(on_flight=5)
+    booking, payment, flight = book(store, 2)
+    assert booking == {"booking_id": 1, "num_seats": 2}
+    assert payment == {"payment_id": 2, "amount": 90}
+    assert flight == FLIGHT
+    assert store.statements == [BOOK_SQL_SKIP_LOCKED]
+    assert store.on_flight == 3
+
+
+def test_locked_buckets_are_waited_for_on_retry():
+    store = FlightStore(on_flight=0, buckets={0: 4, 1: 4}, locked={0, 1})
+    book(store, 3)
+    assert store.statements == [BOOK_SQL_SKIP_LOCKED, "summary", BOOK_SQL_WAIT]
+    assert store.total() == 5
+
+
+def test_booking_larger_than_every_bucket_gathers_the_shortfall():
+    store = FlightStore(on_flight=1, buckets={0: 4, 1: 4, 2: 4})
+    book(store, 6)
+    assert store.on_flight == 0
+    assert sorted(store.buckets.values()) == [0, 3, 4]
+
+
+def test_expired_holds_are_released_before_refusing():
+    store = FlightStore(on_flight=1)
+    released = []
+
+    def release_expired(flight_id):
+        released.append(flight_id)
+        store.on_flight += 3
+        return [{"flight_id": flight_id, "seats": 3}]
+    book(store, 4, release_expired=release_expired)
+    assert released == ["FL1"]
+    assert store.on_flight == 0
+
+
+@pytest.mark.parametrize("store, seats, reason, status, details", [
+    (FlightStore(on_flight=2, buckets={0: 1}), 4, "insufficient_seats", 409,
+     {"seats_available": 3, "seats_requested": 4}),
+    (FlightStore(on_flight=0), 1, "sold_out", 409, {"seats_available": 0, "seats_requested": 1}),
+    (FlightStore(on_flight=9, status="cancelled"), 1, "flight_cancelled", 409, {}),
+])
+def test_refusals_explain_why(store, seats, reason, status, details):
+    failed = refusal(store, seats)
+    assert (failed.reason, failed.http_status, failed.details) == (reason, status, details)
+    assert failed.to_dict()["reason"] == reason
+
+
+def test_unknown_flight_is_not_found():
+    store = FlightStore(on_flight=0)
+    store.execute = lambda sql, params: setattr(store, "_result", [])
+    assert refusal(store, 1).reason == "flight_not_found"
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "1.5", None])
+def test_invalid_seat_count_is_refused(value):
+    with pytest.raises(BookingFailed) as failed:
+        parse_seat_count(value)
+    assert failed.value.reason == "invalid_seat_count"
+
+
+@pytest.mark.parametrize("hold, reason", [
+    (None, "hold_not_found"),
+    ({"flight_id": "FL1", "user_email": "kofi@example.com", "expired": False}, "hold_not_found"),
+    ({"flight_id": "FL2", "user_email": "ama@example.com", "expired": False}, "hold_flight_mismatch"),
+    ({"flight_id": "FL1", "user_email": "ama@example.com", "expired": True}, "hold_expired"),
+])
+def test_unredeemable_hold_is_explained(hold, reason):
+    connection = FakeConnection(results=[[], [hold] if hold else []])
+    with pytest.raises(BookingFailed) as failed:
+        book(connection.cursor(), 1, hold_token="tok")
+    assert failed.value.reason == reason
+
+
+def test_hold_on_a_cancelled_flight_is_kept_and_explained():
+    hold = {"flight_id": "FL1", "user_email": "ama@example.com", "expired": False}
+    summary = {"on_flight": 0, "flight_status": "cancelled", "in_buckets": 0, "largest_bucket": 0}
+    connection = FakeConnection(results=[[], [hold], [summary]])
+    with pytest.raises(BookingFailed) as failed:
+        book(connection.cursor(), 1, hold_token="tok")
+    assert failed.value.reason == "flight_cancelled"
+    assert not any(sql.lstrip().startswith("DELETE") for sql, _ in connection.executed[1:])
+
+
+def batch(bookings, seats=0, payments=0, refunded_amount=0):
+    return [{"bookings": bookings, "seats": seats, "payments": payments, "refunded_amount": refunded_amount}]
+
+
+def test_flight_cascade_commits_batch_by_batch():
+    connection = FakeConnection(results=[batch(2, 3, 2, Decimal("40.00")), batch(1, 1, 1, Decimal("10.50"))])
+    totals = cancel_flight_bookings(connection, connection.cursor(), "FL1", batch_size=2)
+    assert totals == {"bookings": 3, "seats": 4, "payments": 3, "refunded_amount": 50.5, "batches": 2}
+    assert connection.commits == 2
+
+
+def test_failed_batch_reports_what_was_committed():
+    connection = FakeConnection(results=[batch(2, 2, 2, Decimal("20"))])
+    cursor = connection.cursor()
+    run = cursor.execute
+
+    def execute(sql, params=None):
+        if connection.executed:
+            raise RuntimeError("lock timeout")
+        run(sql, params)
+    cursor.execute = execute
+    with pytest.raises(CascadeIncomplete) as incomplete:
+        cancel_flight_bookings(connection, cursor, "FL1", batch_size=2)
+    assert incomplete.value.totals == {"bookings": 2, "seats": 2, "payments": 2,
+                                       "refunded_amount": 20.0, "batches": 1}
+    assert (connection.commits, connection.rollbacks) == (1, 1)
+
+
+def test_cancelling_a_cancelled_booking_returns_nothing():
+    connection = FakeConnection(results=[[]])
+    assert cancel_and_refund_booking(connection.cursor(), 7) is None
+
+
+def test_cancelled_booking_comes_back_with_its_refund_and_flight():
+    row = {"booking_id": 7, "flight_id": "FL1", "status": "cancelled", "refunded_payments": 1,
+           "refunded_amount": Decimal("90"), **{k: v for k, v in FLIGHT.items() if k != "flight_id"}}
+    connection = FakeConnection(results=[[row]])
+    booking, refund, flight = cancel_and_refund_booking(connection.cursor(), 7)
+    assert booking == {"booking_id": 7, "flight_id": "FL1", "status": "cancelled"}
+    assert refund == {"payments": 1, "amount": Decimal("90")}
+    assert flight == FLIGHT
@@ -0,0 +1,94 @@
+from collections import namedtuple
+from datetime import datetime
+
+import pytest
+
+from helper.booking_listing import (
+    MAX_PAGE_SIZE, BookingListParamError, build_bookings_query, decode_cursor, encode_cursor,
+    fetch_bookings_page, parse_booking_filters, parse_page_size
+)
+
+Column = namedtuple("Column", "name")
+
+
+class KeysetCursor:
+    """Runs the keyset part of the bookings query over (booking_date, booking_id) rows.
+
+    Mirrors Postgres: ``DESC`` puts NULL dates first and a row comparison
+    against a NULL date is unknown, so it filters the row out.
+    """
+
+    description = [Column("booking_date"), Column("booking_id")]
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params):
+        undated = sorted((r for r in self.rows if r[0] is None), reverse=True)
+        rows = undated + sorted((r for r in self.rows if r[0] is not None), reverse=True)
+        if "IS NOT NULL OR b.booking_id < %s" in query:
+            after_id = params[-2]
+            rows = [r for r in rows if r[0] is not None or r[1] < after_id]
+        elif "(b.booking_date, b.booking_id) < (%s, %s)" in query:
+            after = params[-3:-1]
+            rows = [r for r in rows if r[0] is not None and r < after]
+        self.result = rows[:params[-1]]
+
+    def fetchall(self):
+        return self.result
+
+
+def walk(rows, limit):
+    cursor = KeysetCursor(rows)
+    seen, filters = [], {}
+    while True:
+        page, token = fetch_bookings_page(cursor, filters, limit)
+        seen.extend(row["booking_id"] for row in page)
+        if token is None:
+            return seen
+        filters = parse_booking_filters({"cursor": token})
+
+
+def test_cursor_round_trips():
+    when = datetime(2025, 6, 1, 8, 30)
+    assert decode_cursor(encode_cursor(when, 42)) == (when, 42)
+
+
+def test_cursor_for_a_booking_without_a_date():
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+    query, params = build_bookings_query({"after": (None, 7)})
+    assert "b.booking_date IS NOT NULL OR b.booking_id < %s" in query
+    assert params == (7,)
+
+
+@pytest.mark.parametrize("token", ["not-a-cursor", encode_cursor(datetime(2025, 1, 1), 1)[:-4]])
+def test_garbled_cursor_is_rejected(token):
+    with pytest.raises(BookingListParamError):
+        decode_cursor(token)
+
+
+def test_pages_cover_every_booking_once_including_undated_ones():
+    rows = [(None, 9), (None, 4), (datetime(2025, 6, 2), 5), (datetime(2025, 6, 2), 3),
+            (datetime(2025, 6, 1), 8), (None, 1)]
+    assert walk(rows, 2) == [9, 4, 1, 5, 3, 8]
+    assert walk(rows, 1) == [9, 4, 1, 5, 3, 8]
+
+
+def test_filters_are_parsed_from_the_query_string():
+    filters = parse_booking_filters({"status": " confirmed ", "user": "", "from": "2025-06-01",
+                                     "to": "2025-06-30"})
+    assert filters == {"status": "confirmed", "date_from": datetime(2025, 6, 1),
+                       "date_to": datetime(2025, 7, 1)}
+    with pytest.raises(BookingListParamError):
+        parse_booking_filters({"from": "June"})
+
+
+@pytest.mark.parametrize("value, limit", [(None, 100), ("", 100), ("5", 5), (str(MAX_PAGE_SIZE + 1), MAX_PAGE_SIZE)])
+def test_page_size(value, limit):
+    assert parse_page_size(value) == limit
+
+
+@pytest.mark.parametrize("value", ["0", "ten"])
+def test_invalid_page_size_is_rejected(value):
+    with pytest.raises(BookingListParamError):
+        parse_page_size(value)
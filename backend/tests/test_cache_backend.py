@@ -0,0 +1,143 @@
+import threading
+import time
+import uuid
+from multiprocessing import shared_memory
+
+import pytest
+
+from helper import cache_backend
+from helper.cache_backend import LocalLRUCache, SharedMemoryCache, _hash64, get_cache_backend
+
+
+@pytest.fixture
+def segment(tmp_path):
+    name = f"test_cache_{uuid.uuid4().hex[:12]}"
+    opened = []
+
+    def attach(**kwargs):
+        backend = SharedMemoryCache(name, lock_path=str(tmp_path / "cache.lock"), **kwargs)
+        opened.append(backend)
+        return backend
+    yield attach
+    for backend in opened:
+        backend._shm.close()
+    if opened:
+        shared_memory.SharedMemory(name).unlink()
+
+
+@pytest.fixture(params=["local", "shared"])
+def backend(request, segment):
+    if request.param == "local":
+        return LocalLRUCache(max_entries=100)
+    return segment(slots=64, slot_size=256, ways=4)
+
+
+def test_value_round_trips(backend):
+    assert backend.get("search", "k") is None
+    assert backend.set("search", "k", b"value", ttl=30)
+    assert backend.get("search", "k") == b"value"
+    backend.delete("search", "k")
+    assert backend.get("search", "k") is None
+    stats = backend.stats()
+    assert (stats["hits"], stats["misses"], stats["sets"], stats["deletes"]) == (1, 2, 1, 1)
+
+
+def test_invalidate_drops_only_its_namespace(backend):
+    backend.set("search", "k", b"a", ttl=30)
+    backend.set("cities", "k", b"b", ttl=30)
+    backend.invalidate("search")
+    assert backend.get("search", "k") is None
+    assert backend.get("cities", "k") == b"b"
+
+
+def test_expired_value_is_a_miss(backend):
+    backend.set("search", "k", b"value", ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("search", "k") is None
+
+
+def test_failing_backend_behaves_like_a_miss(backend, monkeypatch):
+    def broken(*args):
+        raise OSError("backend down")
+    monkeypatch.setattr(backend, "_get", broken)
+    assert backend.get("search", "k") is None
+    assert backend.stats()["errors"] == 1
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalLRUCache(max_entries=2)
+    cache.set("search", "a", b"1", ttl=30)
+    cache.set("search", "b", b"2", ttl=30)
+    cache.get("search", "a")
+    cache.set("search", "c", b"3", ttl=30)
+    assert cache.get("search", "b") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_entries_are_seen_by_every_attached_worker(segment):
+    first = segment(slots=64, slot_size=256, ways=4)
+    second = segment(slots=64, slot_size=256, ways=4)
+    first.set("search", "k", b"value", ttl=30)
+    assert second.get("search", "k") == b"value"
+    second.invalidate("search")
+    assert first.get("search", "k") is None
+
+
+def test_slot_being_written_is_never_read(segment):
+    cache = segment(slots=64, slot_size=256, ways=4)
+    cache.set("search", "k", b"value", ttl=30)
+    key = cache._key("search", 0, "k")
+    offset = next(o for o in cache._slot_offsets(_hash64(key)) if cache._read(o, key, _hash64(key)))
+    seq = cache.SEQ.unpack_from(cache._buf, offset)[0]
+    cache.SEQ.pack_into(cache._buf, offset, seq + 1)
+    assert cache.get("search", "k") is None
+    cache.SEQ.pack_into(cache._buf, offset, seq)
+    assert cache.get("search", "k") == b"value"
+
+
+def test_concurrent_reads_see_whole_values_only(segment):
+    cache = segment(slots=64, slot_size=256, ways=4)
+    values = (b"a" * 150, b"b" * 40)
+    stop = threading.Event()
+
+    def write():
+        while not stop.is_set():
+            for value in values:
+                cache.set("search", "k", value, ttl=30)
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        seen = {cache.get("search", "k") for _ in range(5000)}
+    finally:
+        stop.set()
+        writer.join()
+    assert seen <= set(values) | {None}
+
+
+def test_full_set_evicts_the_entry_expiring_first(segment):
+    cache = segment(slots=4, slot_size=256, ways=4)
+    for i in range(4):
+        cache.set("search", str(i), b"v", ttl=10 + i)
+    cache.set("search", "new", b"v", ttl=30)
+    assert cache.get("search", "0") is None
+    assert [cache.get("search", str(i)) for i in (1, 2, 3)] == [b"v"] * 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oversized_value_is_rejected(segment):
+    cache = segment(slots=64, slot_size=128, ways=4)
+    assert not cache.set("search", "k", b"x" * 200, ttl=30)
+    assert cache.stats()["rejected"] == 1
+
+
+def test_segment_with_another_layout_is_refused(segment):
+    segment(slots=64, slot_size=256, ways=4)
+    with pytest.raises(ValueError):
+        segment(slots=64, slot_size=512, ways=4)
+
+
+def test_unavailable_backend_falls_back_to_local(monkeypatch):
+    monkeypatch.setenv("CACHE_BACKEND", "redis")
+    monkeypatch.setenv("CACHE_REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(cache_backend, "_backend", None)
+    assert get_cache_backend().name == "local"
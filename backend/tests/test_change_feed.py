@@ -0,0 +1,112 @@
+import json
+import threading
+
+import pytest
+
+from helper.change_feed import RESET, ChangeFeed
+from fakes import FakeConnection
+
+
+@pytest.fixture
+def make_feed():
+    """Feeds whose listener thread stays parked until the test ends"""
+    release = threading.Event()
+    feeds = []
+
+    def connect():
+        release.wait(5)
+        raise ConnectionError("test over")
+
+    def make(**kwargs):
+        calls = {"resets": 0, "applied": []}
+
+        def on_reset():
+            calls["resets"] += 1
+        feed = ChangeFeed(connect, on_reset=on_reset, reconnect_delay=3600, **kwargs)
+        feed.subscribe("flight", lambda ids: calls["applied"].append(ids))
+        feeds.append(feed)
+        return feed, calls
+    yield make
+    for feed in feeds:
+        feed.close()
+    release.set()
+
+
+def message(origin, sequence, *events):
+    return json.dumps({"o": origin, "s": sequence, "e": [list(event) for event in events]})
+
+
+def test_events_are_grouped_by_entity_and_dispatched(make_feed):
+    feed, calls = make_feed()
+    feed._receive(message("a", 1, ("flight", "FL1"), ("route", "x"), ("flight", "FL2")))
+    assert calls["applied"] == [["FL1", "FL2"]]
+    stats = feed.stats()
+    assert (stats["received"], stats["applied"], stats["resets"]) == (1, 2, 0)
+
+
+def test_own_notifications_are_ignored(make_feed):
+    feed, calls = make_feed()
+    feed._receive(message(feed.origin, 1, ("flight", "FL1")))
+    assert calls["applied"] == []
+    assert feed.stats()["received"] == 0
+
+
+def test_consecutive_sequences_apply_and_a_gap_resets(make_feed):
+    feed, calls = make_feed()
+    feed._receive(message("a", 7, ("flight", "FL1")))
+    feed._receive(message("a", 8, ("flight", "FL2")))
+    feed._receive(message("b", 1, ("flight", "FL3")))
+    assert calls == {"resets": 0, "applied": [["FL1"], ["FL2"], ["FL3"]]}
+
+    feed._receive(message("a", 10, ("flight", "FL4")))
+    assert calls["resets"] == 1
+    assert calls["applied"][-1] == ["FL3"]
+    # the gap is forgiven once reset; the next message applies again
+    feed._receive(message("a", 11, ("flight", "FL5")))
+    assert calls["applied"][-1] == ["FL5"]
+
+
+def test_publisher_reset_flushes_everything(make_feed):
+    feed, calls = make_feed()
+    feed._receive(message("a", 1, (RESET, "")))
+    assert calls == {"resets": 1, "applied": []}
+
+
+@pytest.mark.parametrize("payload", ["not json", '{"o": "a"}', "[1, 2]", '{"o": "a", "s": 1, "e": 5}',
+                                     '{"o": "a", "s": 1, "e": [["flight"]]}'])
+def test_malformed_notification_is_counted_and_skipped(make_feed, payload):
+    feed, calls = make_feed()
+    feed._receive(payload)
+    assert feed.stats()["errors"] == 1
+    assert calls == {"resets": 0, "applied": []}
+
+
+def test_failing_handler_does_not_stop_the_others(make_feed):
+    feed, calls = make_feed()
+
+    def broken(ids):
+        raise RuntimeError("cache down")
+    feed.subscribe("route", broken)
+    feed._receive(message("a", 1, ("route", "x"), ("flight", "FL1")))
+    assert calls["applied"] == [["FL1"]]
+    assert feed.stats()["errors"] == 1
+
+
+def test_pending_events_are_sent_in_numbered_batches_under_the_payload_limit(make_feed):
+    feed, _ = make_feed()
+    long_id = "x" * 1000
+    feed.publish("flight", *[f"{long_id}{i}" for i in range(20)])
+    connection = FakeConnection()
+    feed._send_pending(connection.cursor())
+    payloads = [json.loads(params[1]) for _, params in connection.executed]
+    assert [payload["s"] for payload in payloads] == list(range(1, len(payloads) + 1))
+    assert len(payloads) > 1
+    assert all(len(params[1]) < 8000 for _, params in connection.executed)
+    assert sum(len(payload["e"]) for payload in payloads) == 20
+
+
+def test_full_queue_marks_the_feed_for_a_reset_broadcast(make_feed):
+    feed, _ = make_feed(max_queue=1)
+    feed.publish("flight", "FL1", "FL2")
+    assert feed._dropped
+    assert (feed.stats()["published"], feed.stats()["dropped"]) == (1, 1)
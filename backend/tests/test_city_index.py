@@ -0,0 +1,54 @@
+import pytest
+
+from helper.city_index import CityIndex, normalize
+from fakes import FakeConnection
+
+CITIES = [
+    {"city_name": "New York", "country": "USA"},
+    {"city_name": "York", "country": "UK"},
+    {"city_name": "Yorkton", "country": "Canada"},
+    {"city_name": "São Tomé", "country": "São Tomé and Príncipe"},
+    {"city_name": "Santo Domingo", "country": "Dominican Republic"},
+    {"city_name": "Newark", "country": "USA"},
+]
+
+
+def make_index(popularity=(), fail_popularity=False):
+    connection = FakeConnection(results=[CITIES, list(popularity)],
+                                fail_on="SUM(weight)" if fail_popularity else None)
+    index = CityIndex(lambda: connection, refresh_interval=0)
+    index.load()
+    return index
+
+
+def names(results):
+    return [row["city"] for row in results]
+
+
+def test_names_are_matched_without_case_or_accents():
+    assert normalize("  São Tomé ") == "sao tome"
+    assert names(make_index().search("SAO T")) == ["São Tomé"]
+
+
+def test_whole_name_prefix_ranks_before_word_prefix():
+    assert names(make_index().search("york")) == ["York", "Yorkton", "New York"]
+
+
+def test_popularity_orders_matches_within_a_tier():
+    index = make_index([{"city": "Yorkton", "popularity": 50}, {"city": "York", "popularity": 5}])
+    assert names(index.search("york")) == ["Yorkton", "York", "New York"]
+
+
+def test_substring_fills_the_page_after_prefixes():
+    assert names(make_index().search("ew")) == ["New York", "Newark"]
+    assert names(make_index().search("ork", limit=1)) == ["New York"]
+
+
+def test_missing_popularity_still_loads_the_index():
+    index = make_index(fail_popularity=True)
+    assert names(index.search("new")) == ["New York", "Newark"]
+
+
+@pytest.mark.parametrize("query", ["", "   ", "zzz"])
+def test_blank_or_unknown_query_returns_nothing(query):
+    assert make_index().search(query) == []
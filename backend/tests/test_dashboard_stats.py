@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+from helper.dashboard_stats import read_dashboard_stats
+from fakes import FakeConnection
+
+
+def test_payload_is_read_from_the_summary_tables():
+    routes = [{"city_origin": "Accra", "city_destination": "London", "count": 4}]
+    months = [{"month": "Jun 2025", "revenue": Decimal("120.50")}]
+    statuses = [{"flight_status": "active", "count": 2}]
+    connection = FakeConnection(results=[
+        [{"name": "total_flights", "value": Decimal(2)}, {"name": "total_bookings", "value": Decimal(5)},
+         {"name": "confirmed_revenue", "value": Decimal("120.50")}],
+        [{"count": 1}],
+        routes, months, statuses,
+    ])
+    stats = read_dashboard_stats(connection.cursor())
+
+    assert stats == {
+        "totalFlights": 2, "totalBookings": 5, "totalRevenue": 120.5, "cancelledBookings": 0,
+        "upcomingFlights": 1, "bookingsPerRoute": routes, "revenuePerMonth": months,
+        "flightStatusDistribution": statuses,
+    }
+    assert not any("FROM bookings" in sql for sql, _ in connection.executed)
+
+
+def test_empty_summary_tables_read_as_zero():
+    connection = FakeConnection(results=[[], [{"count": 0}], [], [], []])
+    stats = read_dashboard_stats(connection.cursor())
+    assert (stats["totalFlights"], stats["totalBookings"], stats["totalRevenue"]) == (0, 0, 0.0)
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from helper import db_pool
+from helper.db_pool import ConnectionPool, PoolTimeout
+
+
+class RawConnection:
+    """Just enough of a psycopg2 connection for the pool"""
+
+    def __init__(self):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(RawConnection())
+        return opened[-1]
+    monkeypatch.setattr(db_pool.psycopg2, "connect", connect)
+    return opened
+
+
+def test_closed_connection_goes_back_to_the_pool(connects):
+    pool = ConnectionPool(0, 2)
+    first = pool.getconn()
+    raw = first.raw
+    first.close()
+    assert pool.getconn().raw is raw
+    assert len(connects) == 1
+
+
+def test_closing_twice_returns_the_connection_once(connects):
+    pool = ConnectionPool(0, 2)
+    conn = pool.getconn()
+    conn.close()
+    conn.close()
+    assert pool.stats()["idle"] == 1
+    with pytest.raises(PoolError):
+        conn.get_transaction_status()
+
+
+def test_open_transaction_is_rolled_back_on_return(connects):
+    pool = ConnectionPool(0, 1)
+    conn = pool.getconn()
+    conn.raw.status = extensions.TRANSACTION_STATUS_INTRANS
+    raw = conn.raw
+    conn.close()
+    assert raw.rollbacks == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_discarded_connection_is_closed_not_reused(connects):
+    pool = ConnectionPool(0, 1)
+    conn = pool.getconn()
+    raw = conn.raw
+    conn.discard()
+    assert raw.closed
+    assert pool.getconn().raw is not raw
+
+
+def test_checkout_times_out_when_the_pool_is_exhausted(connects):
+    pool = ConnectionPool(0, 1, timeout=0.05)
+    held = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+    held.close()
+
+
+def test_waiting_checkout_gets_the_returned_connection(connects):
+    pool = ConnectionPool(0, 1, timeout=5)
+    held = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    held.close()
+    waiter.join(5)
+    assert len(got) == 1 and len(connects) == 1
+
+
+def test_invalid_pool_size_is_rejected():
+    with pytest.raises(ValueError):
+        ConnectionPool(3, 2)
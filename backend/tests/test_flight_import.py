@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from helper.flight_import import (
+    FLIGHT_COLUMNS, FlightImporter, ImportFormatError, detect_format, read_records
+)
+
+CITIES = [
+    {"city_name": "Accra", "country": "Ghana", "longitude": -0.1870, "latitude": 5.6037},
+    {"city_name": "London", "country": "UK", "longitude": -0.1276, "latitude": 51.5072},
+]
+AIRLINES = [{"airline_name": "Africa World", "airline_id": 3}]
+COLUMNS = [
+    {"column_name": "flight_id", "data_type": "character varying", "character_maximum_length": 10},
+    {"column_name": "price", "data_type": "numeric", "character_maximum_length": None},
+    {"column_name": "seats_available", "data_type": "integer", "character_maximum_length": None},
+    {"column_name": "departure_datetime", "data_type": "timestamp without time zone",
+     "character_maximum_length": None},
+    {"column_name": "is_directs", "data_type": "boolean", "character_maximum_length": None},
+]
+
+HEADER = ("flight_id,trip_type,airline,departure_city,arrival_city,departure_datetime,"
+          "price,cabin_class,seats_available,flight_status")
+
+
+class ImportCursor:
+    """Answers the reference lookups and keeps what COPY would have loaded"""
+
+    def __init__(self, existing=()):
+        self.existing = set(existing)
+        self.staged = []
+        self._results = [CITIES, AIRLINES, COLUMNS]
+        self._result = []
+
+    def execute(self, sql, params=None):
+        if "FROM flight_import_staging s" in sql and "EXISTS" in sql:
+            self._result = [{"source_line": row["source_line"], "flight_id": row["flight_id"]}
+                            for row in self.staged if row["flight_id"] in self.existing]
+        elif self._results and sql.lstrip().startswith("SELECT") and "pg_advisory" not in sql:
+            self._result = self._results.pop(0)
+        else:
+            self._result = []
+
+    def fetchall(self):
+        return self._result
+
+    def copy_expert(self, sql, source):
+        columns = FLIGHT_COLUMNS + ("source_line",)
+        for values in csv.reader(io.StringIO(source.read())):
+            self.staged.append(dict(zip(columns, values)))
+
+
+def run_import(text, fmt="csv", existing=(), **kwargs):
+    cursor = ImportCursor(existing)
+    importer = FlightImporter(cursor, **kwargs)
+    importer.stage(read_records(io.BytesIO(text.encode("utf-8")), fmt))
+    return importer, cursor.staged
+
+
+def csv_upload(*rows):
+    return "\n".join((HEADER,) + rows) + "\n"
+
+
+VALID = "FL1,one-way,Africa World,Accra,London,2025-06-01T08:00,450.50,economy,120,active"
+
+
+@pytest.mark.parametrize("requested, filename, content_type, fmt", [
+    ("CSV", None, None, "csv"),
+    (None, "flights.jsonl", None, "ndjson"),
+    (None, "upload", "application/x-ndjson", "ndjson"),
+    (None, "flights.csv", None, "csv"),
+])
+def test_format_detection(requested, filename, content_type, fmt):
+    assert detect_format(requested, filename, content_type) == fmt
+
+
+@pytest.mark.parametrize("requested, filename", [("xml", None), (None, "flights.txt")])
+def test_unknown_format_is_refused(requested, filename):
+    with pytest.raises(ImportFormatError):
+        detect_format(requested, filename)
+
+
+def test_valid_csv_row_is_staged_with_route_estimates():
+    importer, staged = run_import("\ufeff" + csv_upload(VALID))
+    assert (importer.rows, importer.valid, importer.rejected) == (1, 1, 0)
+    row = staged[0]
+    assert (row["departure_city_code"], row["destination_country"], row["airline_id"]) == ("Accra", "UK", "3")
+    assert (row["is_directs"], row["source_line"]) == ("t", "2")
+    assert float(row["flight_distance"]) > 5000
+
+
+def test_bad_csv_rows_are_reported_by_line():
+    importer, staged = run_import(csv_upload(
+        VALID,
+        "FL2,one-way,Nowhere Air,Atlantis,London,2025-06-01T08:00,10,economy,5,active",
+        "FL3,one-way,Africa World,Accra,London,tomorrow,-1,economy,2.5,active",
+        "FL4,one-way,Africa World,Accra,London,2025-06-01T08:00,10,economy,5,active,extra",
+        VALID,
+        "FL12345678901,one-way,Africa World,Accra,London,2025-06-01T08:00,10,economy,5,active",
+        ",one-way,Africa World,Accra,London,2025-06-01T08:00,10,economy,5,active",
+    ))
+    assert [row["flight_id"] for row in staged] == ["FL1"]
+    errors = {error["line"]: error["errors"] for error in importer.report(1)["errors"]}
+    assert errors[3] == ["Departure City not found", "Invalid airline"]
+    assert len(errors[4]) == 3 and errors[4][-1] == "price must not be negative"
+    assert errors[5] == ["Row has more fields than the header"]
+    assert errors[6] == ["Flight ID appears earlier in this upload"]
+    assert errors[7] == ["flight_id: must be at most 10 characters"]
+    assert errors[8] == ["Missing required field(s): flight_id"]
+
+
+def test_ndjson_lines_are_validated_independently():
+    record = dict(zip(HEADER.split(","), VALID.split(",")), price=450.5, seats_available=120.0)
+    upload = "\n".join([json.dumps(record), "", "{not json", "[1, 2]"])
+    importer, staged = run_import(upload, "ndjson")
+    assert len(staged) == 1
+    errors = importer.report(1)["errors"]
+    assert [error["line"] for error in errors] == [3, 4]
+    assert errors[0]["errors"][0].startswith("Invalid JSON")
+    assert errors[1]["errors"] == ["Each line must be a JSON object"]
+
+
+def test_existing_flight_ids_are_rejected_after_staging():
+    importer, _ = run_import(csv_upload(VALID), existing={"FL1"})
+    report = importer.report(0)
+    assert (report["valid"], report["rejected"]) == (0, 1)
+    assert report["errors"][0]["errors"] == ["Flight ID already exists"]
+
+
+def test_error_list_is_capped_but_counted():
+    bad = ",one-way,Africa World,Accra,London,2025-06-01T08:00,10,economy,5,active"
+    importer, _ = run_import(csv_upload(bad, bad, bad), max_errors=2)
+    report = importer.report(0)
+    assert (report["rejected"], len(report["errors"]), report["errors_truncated"]) == (3, 2, True)
+
+
+def test_upload_over_the_row_limit_is_refused():
+    with pytest.raises(ImportFormatError):
+        run_import(csv_upload(VALID, VALID.replace("FL1", "FL2")), max_rows=1)
+
+
+def test_csv_without_a_header_is_refused():
+    with pytest.raises(ImportFormatError):
+        read_records(io.BytesIO(b""), "csv")
+
+
+def test_copy_error_points_at_the_upload_line():
+    importer, _ = run_import(csv_upload("", VALID))
+    error = SimpleNamespace(diag=SimpleNamespace(message_primary="value too long",
+                                                 context="COPY flight_import_staging, line 1"))
+    assert importer.describe_copy_error(error) == "Line 3: value too long"
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+from helper.flight_search import (
+    SEARCHABLE_STATUSES, SearchParamError, build_search_query, parse_passengers,
+    parse_search_date, resolve_city_names
+)
+from fakes import FakeConnection
+
+
+def test_search_date_covers_one_whole_day():
+    assert parse_search_date(" 2024-03-31 ") == (datetime(2024, 3, 31), datetime(2024, 4, 1))
+
+
+@pytest.mark.parametrize("value", ["31/03/2024", "2024-02-30", ""])
+def test_invalid_search_date_is_rejected(value):
+    with pytest.raises(SearchParamError):
+        parse_search_date(value)
+
+
+@pytest.mark.parametrize("value", ["0", "-2", "two", None])
+def test_invalid_passenger_count_is_rejected(value):
+    with pytest.raises(SearchParamError):
+        parse_passengers(value)
+
+
+def test_query_filters_on_columns_not_expressions():
+    day = parse_search_date("2024-03-31")
+    query, params = build_search_query(["Accra"], ["London", "LHR"], day, "one-way", "Economy", 3)
+    assert "f.departure_city_code = ANY(%s)" in query
+    assert "f.departure_datetime >= %s AND f.departure_datetime < %s" in query
+    assert "DATE(" not in query.upper()
+    assert params == (SEARCHABLE_STATUSES, ["Accra"], ["London", "LHR"], *day, "one-way", "Economy", 3)
+
+
+def test_unfiltered_query_only_binds_statuses():
+    query, params = build_search_query()
+    assert params == (SEARCHABLE_STATUSES,)
+    assert query.rstrip().endswith("ORDER BY f.departure_datetime ASC")
+
+
+def test_city_lookup_stops_at_the_first_tier_that_matches():
+    connection = FakeConnection(results=[[], [{"city_name": "London"}]])
+    cursor = connection.cursor()
+    assert resolve_city_names(cursor, "Lon") == ["LON", "Lon", "London"]
+    assert [params for _, params in connection.executed] == [("lon",), ("lon%",)]
+
+
+def test_city_lookup_escapes_like_wildcards():
+    connection = FakeConnection(results=[[], [], []])
+    resolve_city_names(connection.cursor(), "a_b%")
+    assert [params for _, params in connection.executed] == [("a_b%",), ("a\\_b\\%%",), ("%a\\_b\\%%",)]
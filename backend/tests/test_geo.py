@@ -0,0 +1,40 @@
+import pytest
+
+from helper.geo import (
+    CRUISE_SPEEDS, GROUND_AND_CLIMB_HOURS, block_hours, distance_km, haversine_km, route_estimate,
+    vincenty_km
+)
+
+# Vincenty's own test line, Flinders Peak to Buninyong: 54972.271 m
+FLINDERS_PEAK = (144 + 25 / 60 + 29.5244 / 3600, -(37 + 57 / 60 + 3.7203 / 3600))
+BUNINYONG = (143 + 55 / 60 + 35.3839 / 3600, -(37 + 39 / 60 + 10.1561 / 3600))
+
+
+def test_vincenty_matches_the_published_geodesic():
+    assert vincenty_km(*FLINDERS_PEAK, *BUNINYONG) == pytest.approx(54.972271, abs=1e-6)
+
+
+def test_near_antipodal_pair_falls_back_to_the_great_circle():
+    assert vincenty_km(0, 0, 179.7, 0.5) is None
+    assert distance_km(0, 0, 179.7, 0.5) == haversine_km(0, 0, 179.7, 0.5)
+
+
+def test_same_point_is_zero_distance():
+    assert distance_km(-0.4543, 51.47, -0.4543, 51.47) == 0.0
+
+
+def test_longer_stages_fly_faster():
+    assert block_hours(0) == GROUND_AND_CLIMB_HOURS
+    short, long_haul = CRUISE_SPEEDS[0], CRUISE_SPEEDS[-1]
+    assert block_hours(400) - GROUND_AND_CLIMB_HOURS > 400 / short[1]
+    assert block_hours(8000) - GROUND_AND_CLIMB_HOURS > 8000 / long_haul[1]
+    assert block_hours(8000) / 8000 < block_hours(400) / 400
+
+
+def test_route_estimate_is_shared_by_both_directions():
+    jfk, lhr = (-73.7781, 40.6413), (-0.4543, 51.47)
+    assert route_estimate(*jfk, *lhr) == route_estimate(*lhr, *jfk) == (5554.91, 7.2)
+
+
+def test_route_estimate_needs_every_coordinate():
+    assert route_estimate(None, 51.47, -73.7781, 40.6413) is None
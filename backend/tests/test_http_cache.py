@@ -0,0 +1,82 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify, request
+
+from helper import http_cache
+from helper.http_cache import ResponseCache, cached_representation
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(min_size=100)
+    monkeypatch.setattr(http_cache, "_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def client(cache):
+    app = Flask(__name__)
+    calls = []
+
+    @app.route("/cities")
+    @cached_representation("cities")
+    def cities():
+        calls.append(request.args.get("q"))
+        if request.args.get("q") == "missing":
+            return jsonify({"message": "not found"}), 404
+        return jsonify([{"city": "Accra", "country": "Ghana"}] * 50)
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_view_runs_once_per_query_and_version(client, cache):
+    client.get("/cities")
+    client.get("/cities")
+    client.get("/cities?q=acc")
+    assert client.calls == [None, "acc"]
+    cache.invalidate("cities")
+    client.get("/cities")
+    assert client.calls == [None, "acc", None]
+
+
+def test_body_is_sent_in_the_accepted_encoding(client):
+    plain = client.get("/cities", headers={"Accept-Encoding": "identity"})
+    packed = client.get("/cities", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(packed.get_data()) == plain.get_data()
+    assert packed.headers["ETag"] != plain.headers["ETag"]
+    assert packed.headers["Vary"] == "Accept-Encoding"
+
+
+def test_gzip_refused_by_quality_falls_back_to_identity(client):
+    response = client.get("/cities", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_matching_etag_in_any_encoding_gets_304(client):
+    etag = client.get("/cities", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get("/cities", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert response.status_code == 304 and response.get_data() == b""
+    assert response.headers["ETag"] != etag
+    assert client.get("/cities", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_error_responses_are_not_cached(client):
+    assert client.get("/cities?q=missing").status_code == 404
+    assert client.get("/cities?q=missing").status_code == 404
+    assert client.calls == ["missing", "missing"]
+
+
+def test_small_bodies_are_not_compressed():
+    cache = ResponseCache(min_size=1024)
+    assert list(cache.put("key", b"[]").bodies) == ["identity"]
+
+
+def test_expired_entry_is_a_miss():
+    cache = ResponseCache()
+    cache.put("key", b"[]", ttl=-1)
+    assert cache.get("key") is None
@@ -0,0 +1,100 @@
+import pytest
+
+from helper.idempotency import (
+    CLAIM_SQL, PURGE_SQL, IdempotencyError, Replay, claim_key, request_fingerprint, store_response
+)
+
+
+class KeyTable:
+    """Cursor over idempotency_keys; rows live in ``committed`` once the caller commits"""
+
+    def __init__(self):
+        self.committed = {}
+        self.pending = {}
+        self._result = None
+
+    def commit(self):
+        self.committed.update(self.pending)
+        self.pending = {}
+
+    def rollback(self):
+        self.pending = {}
+
+    def execute(self, sql, params):
+        rows = {**self.committed, **self.pending}
+        self._result = None
+        if sql is CLAIM_SQL:
+            key = (params["scope"], params["endpoint"], params["key"])
+            if key not in rows:
+                self.pending[key] = {"request_hash": params["request_hash"], "status_code": None,
+                                     "response": None}
+                self._result = (1,)
+        elif sql is PURGE_SQL:
+            pass
+        elif sql.lstrip().startswith("SELECT request_hash"):
+            row = rows.get(params)
+            self._result = dict(row) if row else None
+        elif sql.lstrip().startswith("UPDATE idempotency_keys"):
+            status_code, body, *key = params
+            row = dict(rows[tuple(key)], status_code=status_code, response=body)
+            self.pending[tuple(key)] = row
+        else:
+            raise AssertionError(f"unexpected statement: {sql}")
+
+    def fetchone(self):
+        return self._result
+
+
+@pytest.fixture(autouse=True)
+def no_purge(monkeypatch):
+    monkeypatch.setenv("IDEMPOTENCY_PURGE_PROBABILITY", "0")
+
+
+PAYLOAD = {"flight_id": "FL1", "num_seats": 2}
+
+
+def test_first_request_runs_and_a_retry_replays_it():
+    table = KeyTable()
+    assert claim_key(table, "ama@example.com", "bookflight", "k1", PAYLOAD) is None
+    store_response(table, "ama@example.com", "bookflight", " k1 ", 201, '{"booking_id": 1}')
+    table.commit()
+
+    replay = claim_key(table, "ama@example.com", "bookflight", "k1", dict(reversed(PAYLOAD.items())))
+    assert isinstance(replay, Replay)
+    assert (replay.status_code, replay.body) == (201, '{"booking_id": 1}')
+
+
+def test_rolled_back_request_frees_the_key():
+    table = KeyTable()
+    assert claim_key(table, "ama@example.com", "bookflight", "k1", PAYLOAD) is None
+    table.rollback()
+    assert claim_key(table, "ama@example.com", "bookflight", "k1", PAYLOAD) is None
+
+
+def test_key_is_scoped_to_the_user_and_endpoint():
+    table = KeyTable()
+    claim_key(table, "ama@example.com", "bookflight", "k1", PAYLOAD)
+    table.commit()
+    assert claim_key(table, "kofi@example.com", "bookflight", "k1", PAYLOAD) is None
+    assert claim_key(table, "ama@example.com", "cancelbooking", "k1", PAYLOAD) is None
+
+
+def test_reusing_a_key_for_another_payload_is_refused():
+    table = KeyTable()
+    claim_key(table, "ama@example.com", "bookflight", "k1", PAYLOAD)
+    table.commit()
+    with pytest.raises(IdempotencyError) as refused:
+        claim_key(table, "ama@example.com", "bookflight", "k1", dict(PAYLOAD, num_seats=3))
+    assert refused.value.http_status == 422
+
+
+@pytest.mark.parametrize("key", ["", "   ", None, "k" * 256])
+def test_malformed_key_is_refused(key):
+    with pytest.raises(IdempotencyError) as refused:
+        claim_key(KeyTable(), "ama@example.com", "bookflight", key, PAYLOAD)
+    assert refused.value.http_status == 400
+
+
+def test_fingerprint_ignores_key_order_but_not_endpoint():
+    assert request_fingerprint("bookflight", {"a": 1, "b": 2}) == request_fingerprint("bookflight", {"b": 2, "a": 1})
+    assert request_fingerprint("bookflight", PAYLOAD) != request_fingerprint("cancelbooking", PAYLOAD)
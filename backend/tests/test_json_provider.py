@@ -0,0 +1,70 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask, jsonify
+
+from helper.json_provider import FastJSONProvider, RowSetJSONProvider, http_date, make_json_provider
+from helper.rowset import RowSet
+
+
+ROWS = RowSet(("flight_id", "price", "departure_datetime"), [
+    ("FL1", Decimal("420.50"), datetime(2025, 3, 1, 9, 30)),
+    ("FL2", None, None),
+])
+
+EXPECTED = [
+    {"flight_id": "FL1", "price": "420.50", "departure_datetime": "Sat, 01 Mar 2025 09:30:00 GMT"},
+    {"flight_id": "FL2", "price": None, "departure_datetime": None},
+]
+
+
+@pytest.fixture(params=["fast", "default"])
+def app(request):
+    app = Flask(__name__)
+    app.json = make_json_provider(app, request.param)
+    return app
+
+
+def test_make_json_provider_picks_class():
+    app = Flask(__name__)
+    assert isinstance(make_json_provider(app, "fast"), FastJSONProvider)
+    assert isinstance(make_json_provider(app, "default"), RowSetJSONProvider)
+
+
+def test_rowset_response_under_both_providers(app):
+    with app.test_request_context():
+        response = jsonify({"flights": ROWS})
+    assert response.status_code == 200
+    assert json.loads(response.get_data()) == {"flights": EXPECTED}
+
+
+def test_rowset_dumps_matches_list_of_dicts(app):
+    with app.app_context():
+        assert json.loads(app.json.dumps(ROWS)) == json.loads(app.json.dumps(ROWS.as_dicts()))
+
+
+def test_unknown_type_still_rejected(app):
+    with app.app_context(), pytest.raises(TypeError):
+        app.json.dumps({"value": object()})
+
+
+def test_iso_datetime_format():
+    app = Flask(__name__)
+    app.json = make_json_provider(app, "fast", datetime_format="iso")
+    with app.app_context():
+        assert json.loads(app.json.dumps(ROWS))[0]["departure_datetime"] == "2025-03-01T09:30:00"
+
+
+def test_http_date_matches_werkzeug():
+    from werkzeug.http import http_date as werkzeug_http_date
+    value = datetime(2024, 2, 29, 23, 59, 1)
+    assert http_date(value) == werkzeug_http_date(value)
+    assert http_date(value.date()) == werkzeug_http_date(value.date())
+
+
+def test_rowset_indexing_and_slicing():
+    assert ROWS[0]["flight_id"] == "FL1"
+    assert len(ROWS[:1]) == 1 and isinstance(ROWS[:1], RowSet)
+    assert not RowSet(("a",), [])
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from helper import metrics
+from helper.metrics import MetricsRegistry, record_db_time, render_metrics, request_finished, request_started
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    registry = MetricsRegistry(directory=str(tmp_path), flush_interval=3600)
+    monkeypatch.setattr(metrics, "_registry", registry)
+    monkeypatch.setattr(metrics, "_registry_pid", os.getpid())
+    return registry
+
+
+def sample(text, line):
+    """Value of one exposition line, or None"""
+    for row in text.splitlines():
+        if row.rsplit(" ", 1)[0] == line:
+            return row.rsplit(" ", 1)[1]
+    return None
+
+
+def exited_pid():
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    return child.pid
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    for seconds in (0.003, 0.02, 0.02, 30):
+        registry.observe("db_query_duration_seconds", seconds)
+    text = render_metrics()
+    assert sample(text, 'db_query_duration_seconds_bucket{le="0.005"}') == "1"
+    assert sample(text, 'db_query_duration_seconds_bucket{le="0.025"}') == "3"
+    assert sample(text, 'db_query_duration_seconds_bucket{le="10"}') == "3"
+    assert sample(text, 'db_query_duration_seconds_bucket{le="+Inf"}') == "4"
+    assert sample(text, "db_query_duration_seconds_count") == "4"
+    assert sample(text, "db_query_duration_seconds_sum") == "30.043"
+
+
+def test_request_totals_include_its_database_time(registry):
+    request_started("bookflight")
+    record_db_time(0.03)
+    record_db_time(0.04)
+    request_finished("bookflight", "POST", 201, 0.2)
+    record_db_time(1.0)
+    text = render_metrics()
+    assert sample(text, 'http_requests_total{endpoint="bookflight",method="POST",status="201"}') == "1"
+    assert sample(text, 'http_requests_in_flight{endpoint="bookflight"}') == "0"
+    assert sample(text, 'http_request_db_seconds_sum{endpoint="bookflight"}') == "0.07"
+    assert sample(text, "db_query_duration_seconds_count") == "3"
+
+
+def test_workers_are_summed_and_exited_gauges_dropped(registry, tmp_path):
+    registry.inc("http_requests_total", ("search", "GET", "200"), 2)
+    registry.add("http_requests_in_flight", ("search",), 1)
+    other = {"pid": exited_pid(),
+             "counters": [["http_requests_total", ["search", "GET", "200"], 3]],
+             "gauges": [["http_requests_in_flight", ["search"], 4]],
+             "histograms": []}
+    (tmp_path / "metrics-other.json").write_text(json.dumps(other))
+    (tmp_path / "metrics-broken.json").write_text("{")
+    text = render_metrics()
+    assert sample(text, 'http_requests_total{endpoint="search",method="GET",status="200"}') == "5"
+    assert sample(text, 'http_requests_in_flight{endpoint="search"}') == "1"
+
+
+def test_flush_writes_this_workers_snapshot(registry, tmp_path):
+    registry.inc("cache_events_total", ("search", "local", "hit"))
+    registry.flush()
+    snapshot = json.loads((tmp_path / f"metrics-{os.getpid()}.json").read_text())
+    assert snapshot["counters"] == [["cache_events_total", ["search", "local", "hit"], 1.0]]
+
+
+def test_label_values_are_escaped(registry):
+    registry.inc("cache_events_total", ('a"b', "local", "x\ny"))
+    assert 'namespace="a\\"b"' in render_metrics()
+    assert 'event="x\\ny"' in render_metrics()
@@ -0,0 +1,71 @@
+import pytest
+
+from helper import migrations
+from helper.migrations import (
+    DASHBOARD_TRIGGERS_SQL, MIGRATIONS, apply_migration, migrate, migration_status, schema_version
+)
+from fakes import FakeConnection
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    ran = []
+
+    def step(version):
+        def apply(cursor):
+            if version == 3:
+                raise RuntimeError("syntax error")
+            ran.append(version)
+        return apply
+    monkeypatch.setattr(migrations, "MIGRATIONS", tuple((v, f"step_{v}", step(v)) for v in (1, 2, 3)))
+    return ran
+
+
+def recorded(connection):
+    return [params[0] for sql, params in connection.executed if "INSERT INTO schema_migrations" in sql]
+
+
+def test_only_pending_migrations_run_each_in_its_own_commit(applied, monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:2])
+    connection = FakeConnection(results=[[{"migrated": True}], [{"version": 1}]])
+    assert migrate(connection, log=lambda message: None) == [2]
+    assert applied == [2]
+    assert recorded(connection) == [2]
+    # version table, migration 2, unlock
+    assert connection.commits == 3
+
+
+def test_failed_migration_keeps_earlier_ones_and_releases_the_lock(applied):
+    connection = FakeConnection(results=[[{"migrated": False}]])
+    with pytest.raises(RuntimeError):
+        migrate(connection, log=lambda message: None)
+    assert applied == [1, 2]
+    assert recorded(connection) == [1, 2]
+    assert "pg_advisory_unlock" in connection.executed[-1][0]
+
+
+def test_unmigrated_database_is_version_zero():
+    connection = FakeConnection(results=[[{"migrated": False}]])
+    assert schema_version(connection.cursor()) == 0
+    connection = FakeConnection(results=[[{"migrated": False}]])
+    status = migration_status(connection.cursor())
+    assert [applied_at for _, _, applied_at in status] == [None] * len(MIGRATIONS)
+
+
+def test_search_indexes_survive_a_missing_pg_trgm():
+    connection = FakeConnection(fail_on="pg_trgm")
+    apply_migration(connection.cursor(), 3)
+    statements = [sql for sql, _ in connection.executed]
+    assert statements[-1] == "ROLLBACK TO SAVEPOINT trgm"
+
+
+@pytest.mark.parametrize("installed, triggers", [(False, True), (True, False)])
+def test_dashboard_triggers_are_installed_once(installed, triggers):
+    connection = FakeConnection(results=[[(1,)] if installed else []])
+    apply_migration(connection.cursor(), 5)
+    assert (DASHBOARD_TRIGGERS_SQL in [sql for sql, _ in connection.executed]) is triggers
+
+
+def test_unknown_migration_is_refused():
+    with pytest.raises(ValueError):
+        apply_migration(FakeConnection().cursor(), 99)
@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from helper.password_hashing import HasherBusy, PasswordHasher
+
+
+def test_inline_hash_round_trips():
+    hasher = PasswordHasher(pool_size=0, rounds=4)
+    hashed = hasher.hash("s3cret")
+    assert hashed.startswith("$2b$04$")
+    assert hasher.check("s3cret", hashed)
+    assert not hasher.check("wrong", hashed)
+    stats = hasher.stats()
+    assert (stats["hash_count"], stats["check_count"], stats["queue_depth"]) == (1, 2, 0)
+
+
+def test_request_without_a_slot_is_rejected():
+    hasher = PasswordHasher(pool_size=0, max_pending=1, admission_timeout=0.01, retry_after=3)
+    entered, release = threading.Event(), threading.Event()
+
+    def slow():
+        entered.set()
+        release.wait(5)
+    worker = threading.Thread(target=hasher._run, args=("hash", slow))
+    worker.start()
+    entered.wait(5)
+    try:
+        with pytest.raises(HasherBusy) as busy:
+            hasher.hash("s3cret")
+        assert busy.value.retry_after == 3
+        assert hasher.stats()["rejected"] == 1
+    finally:
+        release.set()
+        worker.join()
+
+
+def test_timed_out_call_keeps_its_slot_until_the_work_finishes():
+    hasher = PasswordHasher(pool_size=0, max_pending=1, admission_timeout=0.01, timeout=0.01)
+    hasher._executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    try:
+        with pytest.raises(HasherBusy):
+            hasher._run("hash", release.wait, 5)
+        assert hasher.stats()["timeouts"] == 1
+        with pytest.raises(HasherBusy):
+            hasher._run("hash", lambda: None)
+        release.set()
+        hasher._executor.shutdown(wait=True)
+        assert hasher.stats()["queue_depth"] == 0
+        hasher._executor = None
+        assert hasher._run("hash", lambda: "done") == "done"
+    finally:
+        release.set()
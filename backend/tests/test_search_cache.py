@@ -0,0 +1,70 @@
+import time
+from datetime import date
+
+from helper.search_cache import SearchResultCache
+
+DAY = date(2025, 6, 1)
+
+
+def cached(cache, key, origins, destinations, day):
+    return cache.put(key, b"payload", origins, destinations, day, cache.epoch())
+
+
+def test_keys_ignore_case_and_whitespace():
+    assert (SearchResultCache.make_key(" Accra", "LONDON", "2025-06-01", None, "Economy", "2")
+            == SearchResultCache.make_key("accra", "london ", "2025-06-01", "", "economy", 2))
+
+
+def test_write_drops_only_matching_routes_and_days():
+    cache = SearchResultCache()
+    cached(cache, "accra-london", ["Accra"], ["London"], DAY)
+    cached(cache, "accra-paris", ["Accra"], ["Paris"], DAY)
+    cached(cache, "anywhere", None, None, None)
+
+    cache.invalidate("Accra", "London", DAY)
+    assert cache.get("accra-london") is None
+    assert cache.get("accra-paris") == b"payload"
+    assert cache.get("anywhere") is None
+
+
+def test_result_computed_across_a_matching_write_is_refused():
+    cache = SearchResultCache()
+    since = cache.epoch()
+    cache.invalidate("Accra", "London", DAY)
+    assert not cache.put("stale", b"payload", ["Accra"], ["London"], DAY, since)
+    assert cache.put("unrelated", b"payload", ["Accra"], ["Paris"], DAY, since)
+    assert cache.stats()["rejected"] == 1
+
+
+def test_result_older_than_the_write_log_is_refused():
+    cache = SearchResultCache(log_size=1)
+    since = cache.epoch()
+    cache.invalidate("Accra", "London", DAY)
+    cache.invalidate("Accra", "Rome", DAY)
+    assert not cache.put("unknown", b"payload", ["Accra"], ["Paris"], DAY, since)
+
+
+def test_broad_search_is_tagged_by_day():
+    cache = SearchResultCache(max_tags=1)
+    cached(cache, "broad", ["Accra", "Lagos"], ["London"], DAY)
+    cache.invalidate("Kumasi", "Tamale", DAY)
+    assert cache.get("broad") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SearchResultCache(max_entries=2)
+    cached(cache, "a", ["A"], ["B"], DAY)
+    cached(cache, "b", ["A"], ["C"], DAY)
+    cache.get("a")
+    cached(cache, "c", ["A"], ["D"], DAY)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"payload"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entry_is_a_miss():
+    cache = SearchResultCache(ttl=0.001)
+    cached(cache, "a", ["A"], ["B"], DAY)
+    time.sleep(0.01)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
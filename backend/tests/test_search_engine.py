@@ -0,0 +1,137 @@
+import threading
+import time
+from datetime import datetime
+
+from helper.search_engine import FlightSearchEngine
+
+DEPARTURE = datetime(2025, 6, 1, 8, 0)
+
+
+def flight_row(flight_id, seats, status="active"):
+    return {
+        "flight_id": flight_id, "trip_type": "one-way", "departure_city_code": "Accra",
+        "arrival_city_code": "London", "departure_datetime": DEPARTURE, "cabin_class": "economy",
+        "seats_available": seats, "flight_status": status,
+    }
+
+
+class FakeDatabase:
+    """Stands in for SEARCH_SELECT; the first refresh fetch reads, then stalls"""
+
+    def __init__(self, seats):
+        self.seats = dict(seats)
+        self.active = 0
+        self.max_active = 0
+        self.fetches = []
+        self.stall_first = threading.Event()
+        self._lock = threading.Lock()
+
+    def fetch(self, flight_ids=None):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            first = flight_ids is not None and not self.fetches
+            if flight_ids is not None:
+                self.fetches.append(sorted(flight_ids))
+        ids = self.seats if flight_ids is None else flight_ids
+        rows = [flight_row(fid, self.seats[fid]) for fid in ids]
+        if first:
+            self.stall_first.wait(1)
+        with self._lock:
+            self.active -= 1
+        return rows, (["Accra", "London"] if flight_ids is None else None)
+
+
+def make_engine(database):
+    engine = FlightSearchEngine(lambda: None, max_age=0)
+    engine._fetch = database.fetch
+    engine.load()
+    return engine
+
+
+def seats_of(engine, flight_id):
+    rows = engine.search(origins=["Accra"], destinations=["London"])
+    return {row["flight_id"]: row["seats_available"] for row in rows}.get(flight_id)
+
+
+def test_refresh_applies_the_committed_row():
+    database = FakeDatabase({"FL1": 10, "FL2": 5})
+    engine = make_engine(database)
+    database.seats["FL1"] = 7
+    engine.refresh_flights(["FL1"])
+    assert seats_of(engine, "FL1") == 7
+    assert seats_of(engine, "FL2") == 5
+
+
+def test_older_fetch_is_never_applied_after_a_newer_one():
+    database = FakeDatabase({"FL1": 10})
+    engine = make_engine(database)
+
+    database.seats["FL1"] = 9
+    slow = threading.Thread(target=engine.refresh_flights, args=(["FL1"],))
+    slow.start()
+    while not database.fetches:
+        time.sleep(0.001)
+
+    # A second write commits while the first refresh holds the stale row
+    database.seats["FL1"] = 8
+    fast = threading.Thread(target=engine.refresh_flights, args=(["FL1"],))
+    fast.start()
+    time.sleep(0.05)
+    database.stall_first.set()
+    slow.join()
+    fast.join()
+
+    assert database.max_active == 1
+    assert seats_of(engine, "FL1") == 8
+
+
+def test_queued_refreshes_are_coalesced():
+    database = FakeDatabase({"FL1": 10, "FL2": 10, "FL3": 10})
+    engine = make_engine(database)
+    database.seats.update({"FL1": 1, "FL2": 2, "FL3": 3})
+
+    first = threading.Thread(target=engine.refresh_flights, args=(["FL1"],))
+    first.start()
+    while not database.fetches:
+        time.sleep(0.001)
+    waiting = [threading.Thread(target=engine.refresh_flights, args=([fid],)) for fid in ("FL2", "FL3")]
+    for thread in waiting:
+        thread.start()
+    time.sleep(0.05)
+    database.stall_first.set()
+    for thread in [first] + waiting:
+        thread.join()
+
+    assert database.fetches[0] == ["FL1"]
+    assert ["FL2", "FL3"] in database.fetches[1:]
+    assert [seats_of(engine, fid) for fid in ("FL1", "FL2", "FL3")] == [1, 2, 3]
+
+
+def test_cancelled_flight_disappears_after_refresh():
+    database = FakeDatabase({"FL1": 10})
+    engine = make_engine(database)
+    original = database.fetch
+    database.fetch = lambda flight_ids=None: ([], None) if flight_ids else original(flight_ids)
+    engine._fetch = database.fetch
+    engine.refresh_flights(["FL1"])
+    assert seats_of(engine, "FL1") is None
+
+
+def test_search_filters_like_the_sql_query():
+    engine = make_engine(FakeDatabase({"FL1": 1, "FL2": 4}))
+    today = (DEPARTURE.replace(hour=0), None)
+    tomorrow = (DEPARTURE.replace(day=2, hour=0), None)
+
+    rows = engine.search(origins=["Accra"], destinations=["London"], day_range=today, passengers=2)
+    assert [row["flight_id"] for row in rows] == ["FL2"]
+    assert len(engine.search(origins=["Accra"], destinations=["London"], day_range=tomorrow)) == 0
+    assert len(engine.search(origins=["Accra"], destinations=["London"], cabin="first")) == 0
+    assert len(engine.search(destinations=["London"], cabin="ECONOMY")) == 2
+
+
+def test_city_names_resolve_through_the_same_tiers():
+    engine = make_engine(FakeDatabase({"FL1": 1}))
+    assert engine.resolve_city_names("london") == ["London"]
+    assert engine.resolve_city_names("Acc") == ["ACC", "Acc", "Accra"]
+    assert engine.resolve_city_names("ndo") == ["London", "NDO", "ndo"]
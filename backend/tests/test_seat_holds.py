@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+from helper.seat_holds import HoldSweeper, hold_ttl
+from fakes import FakeConnection
+
+RELEASED = {"flight_id": "FL1", "departure_city_code": "Accra", "arrival_city_code": "London",
+            "departure_datetime": None, "seats": 3, "holds": 2}
+
+
+def pooled():
+    raise AssertionError("release_flight must not take a pooled connection")
+
+
+@pytest.fixture
+def make_sweeper():
+    sweepers = []
+
+    def make(**kwargs):
+        sweeper = HoldSweeper(pooled, interval=3600, **kwargs)
+        sweepers.append(sweeper)
+        return sweeper
+    yield make
+    for sweeper in sweepers:
+        sweeper.close()
+
+
+def test_release_flight_commits_on_dedicated_connection(make_sweeper):
+    connection = FakeConnection(results=[[RELEASED]])
+    notified = []
+    sweeper = make_sweeper(release_connect=lambda: connection, on_release=lambda *rows: notified.extend(rows))
+
+    assert sweeper.release_flight("FL1") == [RELEASED]
+    assert connection.commits == 1
+    assert notified == [RELEASED]
+    stats = sweeper.stats()
+    assert (stats["holds_released"], stats["seats_released"], stats["flight_releases"]) == (2, 3, 1)
+
+
+def test_release_flight_reuses_its_connection(make_sweeper):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+    sweeper = make_sweeper(release_connect=connect)
+    sweeper.release_flight("FL1")
+    sweeper.release_flight("FL2")
+    assert len(opened) == 1
+
+
+def test_release_flight_skips_without_dedicated_connection(make_sweeper):
+    sweeper = make_sweeper()
+    assert sweeper.release_flight("FL1") == []
+    assert sweeper.stats()["flight_releases_skipped"] == 1
+
+
+def test_release_flight_skips_when_another_caller_is_releasing(make_sweeper):
+    sweeper = make_sweeper(release_connect=FakeConnection, release_wait=0.01)
+    sweeper._release_lock.acquire()
+    try:
+        assert sweeper.release_flight("FL1") == []
+    finally:
+        sweeper._release_lock.release()
+    assert sweeper.stats()["flight_releases_skipped"] == 1
+
+
+def test_release_flight_failure_rolls_back_and_returns_nothing(make_sweeper):
+    connection = FakeConnection(fail_on="seat_holds")
+    sweeper = make_sweeper(release_connect=lambda: connection)
+    assert sweeper.release_flight("FL1") == []
+    assert connection.rollbacks == 1 and connection.commits == 0
+    assert sweeper.stats()["errors"] == 1
+    assert not sweeper._release_lock.locked()
+
+
+def test_concurrent_releases_share_one_connection(make_sweeper):
+    opened = []
+    sweeper = make_sweeper(release_connect=lambda: opened.append(FakeConnection()) or opened[-1],
+                           release_wait=5)
+    threads = [threading.Thread(target=sweeper.release_flight, args=("FL1",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(opened) == 1
+    assert sweeper.stats()["flight_releases"] == 8
+
+
+def test_hold_ttl_clamps(monkeypatch):
+    monkeypatch.setenv("SEAT_HOLD_TTL", "600")
+    monkeypatch.setenv("SEAT_HOLD_MAX_TTL", "1800")
+    assert hold_ttl() == 600
+    assert hold_ttl("5000") == 1800
+    with pytest.raises(ValueError):
+        hold_ttl("-1")
+    with pytest.raises(ValueError):
+        hold_ttl("soon")
+
+
+def test_sweep_releases_in_batches_until_a_short_one():
+    full = [dict(RELEASED, holds=3, seats=3)]
+    connection = FakeConnection(results=[[{"locked": True}], full, [{"locked": True}], [RELEASED]])
+    notified = []
+    sweeper = HoldSweeper(lambda: connection, interval=3600, batch_size=3,
+                          on_release=lambda *rows: notified.extend(rows))
+    try:
+        assert sweeper.sweep() == full + [RELEASED]
+    finally:
+        sweeper.close()
+    assert connection.commits == 2
+    assert notified == full + [RELEASED]
+    assert sweeper.stats()["holds_released"] == 5
+
+
+def test_sweep_backs_off_while_another_worker_sweeps():
+    connection = FakeConnection(results=[[{"locked": False}]])
+    sweeper = HoldSweeper(lambda: connection, interval=3600)
+    try:
+        assert sweeper.sweep() == []
+    finally:
+        sweeper.close()
+    assert (connection.commits, connection.rollbacks, connection.closed) == (0, 1, 1)
@@ -0,0 +1,38 @@
+from helper.seat_inventory import gather_seats, plan_shortfall
+from fakes import BucketStore
+
+
+def test_plan_taps_fullest_buckets_for_the_shortfall_only():
+    assert plan_shortfall(1, [(0, 3), (1, 5), (2, 4)], 8) == [(1, 5), (2, 2)]
+
+
+def test_plan_is_empty_when_flights_row_suffices_or_seats_are_missing():
+    assert plan_shortfall(6, [(0, 3)], 6) == []
+    assert plan_shortfall(0, [(0, 3), (1, 2)], 6) == []
+
+
+def test_booking_larger_than_any_bucket_keeps_the_rest_bucketed():
+    store = BucketStore(on_flight=0, buckets={b: 5 for b in range(8)})
+
+    moved = gather_seats(store, "FL1", 12)
+    assert moved == 12
+    assert store.on_flight == 12
+    assert store.total() == 40
+    # two buckets emptied, one tapped, the other five untouched
+    assert sorted(store.buckets.values()) == [0, 0, 3, 5, 5, 5, 5, 5]
+
+    # the booking then takes its seats from the flights row
+    store.on_flight -= 12
+    assert sum(1 for seats in store.buckets.values() if seats > 0) == 6
+
+
+def test_gather_uses_seats_already_on_the_flights_row():
+    store = BucketStore(on_flight=4, buckets={0: 3, 1: 3})
+    assert gather_seats(store, "FL1", 5) == 1
+    assert store.buckets == {0: 2, 1: 3}
+
+
+def test_gather_moves_nothing_when_seats_are_not_there():
+    store = BucketStore(on_flight=0, buckets={0: 2, 1: 2})
+    assert gather_seats(store, "FL1", 5) == 0
+    assert store.buckets == {0: 2, 1: 2}
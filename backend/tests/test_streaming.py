@@ -0,0 +1,96 @@
+import json
+
+import pytest
+from flask import Flask, request
+
+from helper.streaming import NDJSON_MIMETYPE, stream_format, stream_query
+
+
+class ServerCursor:
+    def __init__(self, rows, fail_after=None):
+        self.rows = list(rows)
+        self.fail_after = fail_after
+        self.fetches = 0
+        self.closed = False
+
+    def execute(self, query, params=None):
+        if query == "broken":
+            raise RuntimeError("syntax error")
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        if self.fail_after is not None and self.fetches > self.fail_after:
+            raise RuntimeError("connection lost")
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class StreamingConnection:
+    def __init__(self, rows=(), fail_after=None):
+        self.server_cursor = ServerCursor(rows, fail_after)
+        self.closed = False
+
+    def cursor(self, name=None, cursor_factory=None):
+        assert name, "stream_query must use a named cursor"
+        return self.server_cursor
+
+    def close(self):
+        self.closed = True
+
+
+ROWS = [{"id": i} for i in range(5)]
+
+
+@pytest.fixture
+def serve():
+    def serve(connection, query="SELECT", **kwargs):
+        app = Flask(__name__)
+
+        @app.route("/rows")
+        def rows():
+            return stream_query(connection, query, name="rows", batch_size=2,
+                                fmt=stream_format(request.args), **kwargs)
+        return app.test_client()
+    return serve
+
+
+def test_rows_stream_as_one_json_array_in_batches(serve):
+    connection = StreamingConnection(ROWS)
+    response = serve(connection).get("/rows")
+    assert response.is_json and response.get_json() == ROWS
+    assert connection.server_cursor.fetches == 4
+    assert connection.closed and connection.server_cursor.closed
+
+
+def test_keyed_body_carries_the_trailer(serve):
+    client = serve(StreamingConnection(ROWS[:1]), key="flights",
+                   transform=lambda row: {"flight": row["id"]}, trailer=lambda: {"count": 1})
+    assert client.get("/rows").get_json() == {"flights": [{"flight": 0}], "count": 1}
+
+
+def test_empty_result_is_an_empty_array(serve):
+    assert serve(StreamingConnection()).get("/rows").get_json() == []
+
+
+def test_ndjson_sends_one_row_per_line(serve):
+    response = serve(StreamingConnection(ROWS)).get("/rows?format=ndjson")
+    assert response.mimetype == NDJSON_MIMETYPE
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == ROWS
+
+
+def test_query_that_cannot_start_raises_before_the_response(serve):
+    connection = StreamingConnection()
+    client = serve(connection, query="broken")
+    client.application.testing = False
+    assert client.get("/rows").status_code == 500
+    assert connection.closed
+
+
+def test_failure_mid_stream_still_closes_the_connection(serve):
+    connection = StreamingConnection(ROWS, fail_after=1)
+    with pytest.raises(RuntimeError):
+        serve(connection).get("/rows").get_data()
+    assert connection.closed
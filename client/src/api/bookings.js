@@ -0,0 +1,15 @@
+import api from "./axios";
+
+// /admin/bookings is keyset-paginated; follow next_cursor until the last page
+export const fetchAllAdminBookings = async (params = {}) => {
+    const bookings = [];
+    let cursor = null;
+    do {
+        const res = await api.get("/admin/bookings", {
+            params: { ...params, limit: 1000, ...(cursor ? { cursor } : {}) },
+        });
+        bookings.push(...(res.data.bookings || []));
+        cursor = res.data.next_cursor;
+    } while (cursor);
+    return bookings;
+};
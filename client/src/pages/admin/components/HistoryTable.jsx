@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import api from "../../../api/axios";
+import { fetchAllAdminBookings } from "../../../api/bookings";
 
 const HistoryTable = () => {
     const [history, setHistory] = useState([]);
@@ -25,21 +25,12 @@ const HistoryTable = () => {
     const fetchBookingHistory = async () => {
         try {
             console.log('HistoryTable: Fetching booking history from /admin/bookings');
-            const response = await api.get('/admin/bookings');
+            const bookings = await fetchAllAdminBookings();
             
-            console.log('HistoryTable: Response received:', response);
-            console.log('HistoryTable: Raw data received:', response.data);
-            console.log('HistoryTable: Number of bookings:', response.data.bookings ? response.data.bookings.length : 0);
-            
-            // Check if bookings data exists and is an array
-            if (!response.data.bookings || !Array.isArray(response.data.bookings)) {
-                console.warn('HistoryTable: No bookings array found in response');
-                setHistory([]);
-                return;
-            }
+            console.log('HistoryTable: Number of bookings:', bookings.length);
             
             // Transform the data to match the expected format for history
-            const transformedHistory = response.data.bookings.map(booking => {
+            const transformedHistory = bookings.map(booking => {
                 // Safe data extraction with fallbacks
                 const departureCity = booking.departure_city_code || 'Unknown';
                 const arrivalCity = booking.arrival_city_code || 'Unknown';
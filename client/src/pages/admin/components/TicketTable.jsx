@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from "react";
 import api from "../../../api/axios";
+import { fetchAllAdminBookings } from "../../../api/bookings";
 
 const TicketTable = () => {
     const [tickets, setTickets] = useState([]);
@@ -27,21 +28,12 @@ const TicketTable = () => {
     const fetchBookings = async () => {
         try {
             console.log('TicketTable: Fetching bookings from /admin/bookings');
-            const response = await api.get('/admin/bookings');
+            const bookings = await fetchAllAdminBookings();
             
-            console.log('TicketTable: Response received:', response);
-            console.log('TicketTable: Raw data received:', response.data);
-            console.log('TicketTable: Number of bookings:', response.data.bookings ? response.data.bookings.length : 0);
-            
-            // Check if bookings data exists and is an array
-            if (!response.data.bookings || !Array.isArray(response.data.bookings)) {
-                console.warn('TicketTable: No bookings array found in response');
-                setTickets([]);
-                return;
-            }
+            console.log('TicketTable: Number of bookings:', bookings.length);
             
             // Transform the data to match the expected format
-            const transformedBookings = response.data.bookings.map(booking => {
+            const transformedBookings = bookings.map(booking => {
                 // Safe data extraction with fallbacks
                 const departureCity = booking.departure_city_code || 'Unknown';
                 const arrivalCity = booking.arrival_city_code || 'Unknown';